@@ -1,2 +1,3 @@
 from .ast import *
-from .modify import *
\ No newline at end of file
+from .modify import *
+from .arena import Arena
@@ -0,0 +1,415 @@
+"""
+A flat encoding of the AST: instead of one Python object per node, an
+Arena keeps node kinds, tokens and child references in parallel arrays
+and refers to nodes by their index. Views give read-only access to arena
+nodes through the usual ast classes, so the evaluator and the compiler
+can walk an Arena directly.
+"""
+
+from array import array
+import struct
+import sys
+import zlib
+
+from monkey.tokens import token
+from monkey.ast import ast
+
+# Node kinds
+PROGRAM = 0
+IDENTIFIER = 1
+LET = 2
+RETURN = 3
+EXPRESSION_STMT = 4
+INTEGER = 5
+STRING = 6
+PREFIX = 7
+INFIX = 8
+BOOLEAN = 9
+IF = 10
+BLOCK = 11
+CALL = 12
+FUNCTION = 13
+ARRAY = 14
+INDEX = 15
+ASSIGN_INDEX = 16
+HASH = 17
+MACRO = 18
+
+NONE = -1 # missing child, e.g. an if without else or a node that failed to parse
+
+# Where each field of a kind lives: in slot a, b or c, in the token
+# literal, or in the lists array as a (start, count) pair held in two slots
+LAYOUTS = {
+    PROGRAM: (ast.Program, (('statements', 'list_ab'),)),
+    IDENTIFIER: (ast.Identifier, (('value', 'literal'),)),
+    LET: (ast.LetStatement, (('name', 'a'), ('value', 'b'))),
+    RETURN: (ast.ReturnStatement, (('return_value', 'a'),)),
+    EXPRESSION_STMT: (ast.ExpressionStatement, (('expression', 'a'),)),
+    INTEGER: (ast.IntegerLiteral, (('value', 'int'),)),
+    STRING: (ast.StringLiteral, (('value', 'literal'),)),
+    PREFIX: (ast.PrefixExpression, (('operator', 'literal'), ('right', 'a'))),
+    INFIX: (ast.InfixExpression, (('left', 'a'), ('operator', 'literal'), ('right', 'b'))),
+    BOOLEAN: (ast.Boolean, (('value', 'bool'),)),
+    IF: (ast.IfExpression, (('condition', 'a'), ('consequence', 'b'), ('alternative', 'c'))),
+    BLOCK: (ast.BlockStatement, (('statements', 'list_ab'),)),
+    CALL: (ast.CallExpression, (('function', 'a'), ('arguments', 'list_bc'))),
+    FUNCTION: (ast.FunctionLiteral, (('parameters', 'list_ab'), ('body', 'c'))),
+    ARRAY: (ast.ArrayLiteral, (('elements', 'list_ab'),)),
+    INDEX: (ast.IndexExpression, (('left', 'a'), ('index', 'b'))),
+    ASSIGN_INDEX: (ast.AssignIndexStatement, (('left', 'a'), ('index', 'b'), ('value', 'c'))),
+    HASH: (ast.HashLiteral, (('pairs', 'pairs_ab'),)),
+    MACRO: (ast.MacroLiteral, (('parameters', 'list_ab'), ('body', 'c'))),
+}
+
+class Arena:
+    """
+    Nodes are appended children first, so every child index is smaller
+    than its parent's. root is the index of the Program node, once built.
+    """
+
+    kinds = None # array('B') of node kinds
+    token_types = None # array('B') of token types
+    literals = None # array('i') of token literals as indexes into strings, NONE for no token
+    a = None # array('i'), first child or list start
+    b = None # array('i'), second child or list length
+    c = None # array('i'), third child
+    lists = None # array('i') of the children of list fields, hash keys and values alternating
+    strings = None # interned literals
+    string_ids = None # literal -> index in strings
+    root = NONE
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.token_types = array('B')
+        self.literals = array('i')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.lists = array('i')
+        self.strings = []
+        self.string_ids = {}
+        self.root = NONE
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, tok, a=NONE, b=NONE, c=NONE):
+        """
+        Appends a node and returns its index
+        """
+        if tok == None:
+            return self.add_literal(kind, token.ILLEGAL, None, a, b, c)
+        return self.add_literal(kind, tok.Type, tok.Literal, a, b, c)
+
+    def add_literal(self, kind, token_type, literal, a=NONE, b=NONE, c=NONE):
+        """
+        Appends a node whose token is given by its type and literal (None
+        for no token) and returns its index
+        """
+        kinds = self.kinds
+        kinds.append(kind)
+        self.token_types.append(token_type)
+        if literal == None:
+            self.literals.append(NONE)
+        else:
+            i = self.string_ids.get(literal)
+            self.literals.append(self.intern(literal) if i == None else i)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        return len(kinds) - 1
+
+    def add_list(self, children):
+        """
+        Stores a list of child indexes, returning where it starts
+        """
+        start = len(self.lists)
+        self.lists.extend(children)
+        return start
+
+    def intern(self, literal):
+        i = self.string_ids.get(literal)
+        if i == None:
+            i = len(self.strings)
+            self.strings.append(literal)
+            self.string_ids[literal] = i
+        return i
+
+    def token(self, i):
+        literal = self.literals[i]
+        if literal == NONE:
+            return None
+        return token.Token(self.token_types[i], self.strings[literal])
+
+    def literal(self, i):
+        return self.strings[self.literals[i]]
+
+    def children(self, i):
+        """
+        Returns the indexes of the children of node i in field order
+        """
+        out = []
+        a, b, c = self.a[i], self.b[i], self.c[i]
+        # a list field's count may be NONE, the other slots hold children
+        for name, where in LAYOUTS[self.kinds[i]][1]:
+            if where == 'a' or where == 'b' or where == 'c':
+                child = a if where == 'a' else b if where == 'b' else c
+                if child != NONE:
+                    out.append(child)
+            elif where == 'list_ab' and b != NONE:
+                out.extend(self.lists[a:a + b])
+            elif where == 'list_bc' and c != NONE:
+                out.extend(self.lists[b:b + c])
+            elif where == 'pairs_ab':
+                out.extend(self.lists[a:a + 2 * b])
+        return [child for child in out if child != NONE]
+
+    def walk(self, i=None):
+        """
+        Yields node indexes in pre-order without recursing
+        """
+        stack = [self.root if i == None else i]
+        while len(stack) > 0:
+            i = stack.pop()
+            yield i
+            stack.extend(reversed(self.children(i)))
+
+    def view(self, i=None):
+        """
+        Returns a read-only ast node over node i (the root by default)
+        """
+        if i == None:
+            i = self.root
+        if i == NONE:
+            return None
+        return view_classes[self.kinds[i]](self, i)
+
+    def to_node(self, i=None):
+        """
+        Converts node i (the root by default) into an object AST
+        """
+        if i == None:
+            i = self.root
+        if i == NONE:
+            return None
+        kind = self.kinds[i]
+        node_class, fields = LAYOUTS[kind]
+        node = node_class.__new__(node_class)
+        if kind == PROGRAM:
+            node.call_sites = None
+        else:
+            node.token = self.token(i)
+        for name, where in fields:
+            setattr(node, name, self.field(i, where, self.to_node))
+        return node
+
+    def field(self, i, where, convert):
+        """
+        Reads a field of node i stored as where, converting child indexes
+        with convert
+        """
+        if where == 'a':
+            return convert(self.a[i])
+        if where == 'b':
+            return convert(self.b[i])
+        if where == 'c':
+            child = self.c[i]
+            return None if child == NONE else convert(child)
+        if where == 'literal':
+            return self.literal(i)
+        if where == 'int':
+            return number(self.literal(i))
+        if where == 'bool':
+            return self.a[i] == 1
+        if where == 'list_ab' or where == 'list_bc':
+            start, count = (self.a[i], self.b[i]) if where == 'list_ab' else (self.b[i], self.c[i])
+            if count == NONE:
+                return None
+            return [convert(child) for child in self.lists[start:start + count]]
+        # pairs_ab
+        items = self.lists[self.a[i]:self.a[i] + 2 * self.b[i]]
+        return {convert(items[k]): convert(items[k + 1]) for k in range(0, len(items), 2)}
+
+def number(literal):
+    """
+    Decodes the literal of an IntegerLiteral. Macro expansion can leave
+    other numbers in one (e.g. the 2.5 of unquote(5 / 2)), whose literal is
+    kept as str() wrote it.
+    """
+    try:
+        return int(literal)
+    except ValueError:
+        return float(literal)
+
+def from_node(node, arena=None):
+    """
+    Encodes an object AST into an Arena; a Program becomes its root
+    """
+    if arena == None:
+        arena = Arena()
+    i = encode(arena, node)
+    if isinstance(node, ast.Program):
+        arena.root = i
+    return arena
+
+node_kinds = {node_class: kind for kind, (node_class, fields) in LAYOUTS.items()}
+node_kinds[ast.LazyBlockStatement] = BLOCK
+
+def encode(arena, node):
+    if node == None:
+        return NONE
+    kind = node_kinds[type(node)] if type(node) in node_kinds else node.kind
+    fields = LAYOUTS[kind][1]
+    slots = {'a': NONE, 'b': NONE, 'c': NONE}
+    for name, where in fields:
+        value = getattr(node, name)
+        if where in slots:
+            slots[where] = encode(arena, value)
+        elif where == 'bool':
+            slots['a'] = 1 if value else 0
+        elif where == 'list_ab' or where == 'list_bc':
+            first, second = ('a', 'b') if where == 'list_ab' else ('b', 'c')
+            if value == None:
+                slots[first], slots[second] = 0, NONE
+                continue
+            children = [encode(arena, child) for child in value]
+            slots[first] = arena.add_list(children)
+            slots[second] = len(children)
+        elif where == 'pairs_ab':
+            children = []
+            for key, val in value.items():
+                children.append(encode(arena, key))
+                children.append(encode(arena, val))
+            slots['a'] = arena.add_list(children)
+            slots['b'] = len(value)
+    tok = None if kind == PROGRAM else node.token
+    return arena.add(kind, tok, slots['a'], slots['b'], slots['c'])
+
+# Serialized arenas start with MAGIC, FORMAT_VERSION, the root index, the
+# node, list and string counts, the length of the string data and a CRC-32
+# of everything after the header. Then come the node arrays, the lists and
+# the string lengths as little-endian int32, and the UTF-8 string data.
+MAGIC = b'MNKA'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHiIIIII')
+
+def dumps(arena):
+    """
+    Serializes an Arena into bytes
+    """
+    strings = [s.encode('utf-8') for s in arena.strings]
+    lengths = array('i', [len(s) for s in strings])
+    parts = [arena.kinds.tobytes(), arena.token_types.tobytes()]
+    for ints in (arena.literals, arena.a, arena.b, arena.c, arena.lists, lengths):
+        if sys.byteorder == 'big':
+            ints = array('i', ints)
+            ints.byteswap()
+        parts.append(ints.tobytes())
+    text = b''.join(strings)
+    parts.append(text)
+    body = b''.join(parts)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, arena.root, len(arena), len(arena.lists),
+        len(strings), len(text), zlib.crc32(body))
+    return header + body
+
+def loads(data):
+    """
+    Reads an Arena serialized by dumps. Returns (Arena, None), or (None,
+    error message) for data that is not a complete serialized arena.
+    """
+    if len(data) < HEADER.size:
+        return None, 'truncated header'
+    magic, version, root, nodes, lists, strings, text, crc = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        return None, 'not a serialized arena'
+    if version != FORMAT_VERSION:
+        return None, f'unsupported arena format version {version}'
+    size = HEADER.size + 2 * nodes + 4 * (4 * nodes + lists + strings) + text
+    if len(data) != size:
+        return None, f'wrong size: want={size} got={len(data)}'
+    body = memoryview(data)[HEADER.size:]
+    if zlib.crc32(body) != crc:
+        return None, 'checksum mismatch'
+    arena = Arena()
+    offset = 0
+    def read(typecode, count):
+        nonlocal offset
+        values = array(typecode)
+        end = offset + count * values.itemsize
+        values.frombytes(body[offset:end])
+        if values.itemsize > 1 and sys.byteorder == 'big':
+            values.byteswap()
+        offset = end
+        return values
+    arena.kinds = read('B', nodes)
+    arena.token_types = read('B', nodes)
+    arena.literals = read('i', nodes)
+    arena.a = read('i', nodes)
+    arena.b = read('i', nodes)
+    arena.c = read('i', nodes)
+    arena.lists = read('i', lists)
+    start = offset + 4 * strings
+    for length in read('i', strings):
+        literal = str(body[start:start + length], 'utf-8')
+        arena.string_ids[literal] = len(arena.strings)
+        arena.strings.append(literal)
+        start += length
+    arena.root = root
+    return arena, None
+
+class NodeView:
+    """
+    Base of the read-only views over arena nodes. Each view class also
+    derives from the ast class of its kind, so code dispatching on ast
+    types handles views as it does nodes; fields are read from the arena
+    on access and child nodes come back as views.
+    """
+    __slots__ = ()
+
+    def __init__(self, arena, i):
+        self._arena = arena
+        self._at = i
+
+    def __eq__(self, other):
+        if not isinstance(other, NodeView):
+            return NotImplemented
+        return self._arena is other._arena and self._at == other._at
+
+    def __hash__(self):
+        return hash((id(self._arena), self._at))
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self._at)
+
+def view_property(where):
+    def get(self):
+        return self._arena.field(self._at, where, self._arena.view)
+    return property(get)
+
+def view_class(kind):
+    node_class, fields = LAYOUTS[kind]
+    namespace = {'__slots__': ('_arena', '_at'), 'kind': kind, 'node_class': node_class}
+    namespace['token'] = property(lambda self: self._arena.token(self._at))
+    for name, where in fields:
+        namespace[name] = view_property(where)
+    return type(node_class.__name__ + 'View', (NodeView, node_class), namespace)
+
+view_classes = {kind: view_class(kind) for kind in LAYOUTS}
+
+kind_names = {kind: node_class.__name__ for kind, (node_class, fields) in LAYOUTS.items()}
+
+class Visitor:
+    """
+    Walks an Arena by index: visit(arena, i) calls visit_<AstClassName>
+    if defined, else generic_visit, which visits the children in order
+    """
+
+    def visit(self, arena, i):
+        method = getattr(self, 'visit_' + kind_names[arena.kinds[i]], None)
+        if method == None:
+            return self.generic_visit(arena, i)
+        return method(arena, i)
+
+    def generic_visit(self, arena, i):
+        for child in arena.children(i):
+            self.visit(arena, child)
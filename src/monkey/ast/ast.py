@@ -3,27 +3,66 @@ from monkey.tokens import token
 from collections import OrderedDict
 
 class Node:
+    """
+    Nodes keep their attributes in __slots__ and list them in fields. They
+    compare and hash by identity, so two hash literal keys spelled the same
+    stay two keys; structural_key compares trees by shape.
+    """
+    __slots__ = ()
+    fields = () # names of the attributes making up the node
+
     # this method used only for debugging
     def token_literal(self): pass
     def string(self): pass
 
+    def field_values(self):
+        return tuple(getattr(self, field) for field in self.fields)
+
+    def __repr__(self):
+        args = ", ".join("{}={!r}".format(field, getattr(self, field)) for field in self.fields)
+        return "{}({})".format(type(self).__name__, args)
+
+def structural_key(value):
+    """
+    Returns a hashable key for a tree, or a list or dict of them, that is
+    equal for trees of the same shape, e.g. an expression parsed twice. An
+    eager and a parsed lazy body have the same key. A body not parsed yet
+    is keyed by its token span rather than being parsed.
+    """
+    if isinstance(value, list):
+        return tuple(structural_key(child) for child in value)
+    if isinstance(value, dict):
+        return tuple((structural_key(k), structural_key(v)) for k, v in value.items())
+    if not isinstance(value, Node):
+        return value
+    if isinstance(value, LazyBlockStatement) and not value.is_parsed():
+        return (LazyBlockStatement, value.tokens, value.start, value.end)
+    # arena views stand for the node class they derive from
+    kind = BlockStatement if isinstance(value, BlockStatement) else getattr(value, 'node_class', type(value))
+    return (kind,) + tuple(structural_key(getattr(value, field)) for field in value.fields)
+
 class Statement(Node):
-    node = None
+    __slots__ = ()
     # dummy method
     def statement_node(self): pass
 
 class Expression(Node):
-    node = None
+    __slots__ = ()
     # dummy method
     def expression_node(self): pass
 
 class Program(Node):
-    statements = []
+    fields = ('statements',)
+    __slots__ = (
+        'statements',
+        'call_sites', # callee name -> indexes of statements calling it, if the parser recorded them
+    )
 
-    def __init__(self, statements=None):
+    def __init__(self, statements=None, call_sites=None):
         if statements == None:
             statements = []
         self.statements = statements
+        self.call_sites = call_sites
 
     def token_literal(self):
         if len(self.statements) > 0:
@@ -39,8 +78,10 @@ class Program(Node):
         return out
 
 class Identifier(Expression):
-    token = None # Token
-    value = "" 
+    __slots__ = fields = (
+        'token', # Token
+        'value',
+    )
 
     def __init__(self, token, value):
         self.token = token
@@ -51,11 +92,13 @@ class Identifier(Expression):
     
     def string(self):
         return self.value
-        
+
 class LetStatement(Statement):
-    token = None # Token
-    name = None # Identifier
-    value = None # Expression
+    __slots__ = fields = (
+        'token', # Token
+        'name', # Identifier
+        'value', # Expression
+    )
 
     def __init__(self, token=None, name=None, value=None):
         self.token = token
@@ -73,13 +116,12 @@ class LetStatement(Statement):
             out = out + self.value.string()
         out = out + ";"
         return out
-    
-    def __eq__(self, other):
-        return isinstance(other, LetStatement) and self.__dict__ == other.__dict__
 
 class ReturnStatement(Statement):
-    token = None # Token
-    return_value = None # Expression
+    __slots__ = fields = (
+        'token', # Token
+        'return_value', # Expression
+    )
 
     def __init__(self, token=None, return_value=None):
         self.token = token
@@ -95,13 +137,11 @@ class ReturnStatement(Statement):
         out = out + ";"
         return out
 
-    def __eq__(self, other):
-        return isinstance(other, ReturnStatement) and self.__dict__ == other.__dict__
-    
-
 class ExpressionStatement(Statement):
-    token = None 
-    expression = None # Expression
+    __slots__ = fields = (
+        'token',
+        'expression', # Expression
+    )
 
     def __init__(self, token=None, expression=None):
         self.token = token
@@ -114,16 +154,12 @@ class ExpressionStatement(Statement):
         if self.expression != None:
             return self.expression.string()
         return ""
-    
-    def __hash__(self):
-        return hash(str(self.expression))
-
-    def __eq__(self, other):
-        return isinstance(other, ExpressionStatement) and self.__dict__ == other.__dict__
 
 class IntegerLiteral(Expression):
-    token = None # Token
-    value = 0 # integer
+    __slots__ = fields = (
+        'token', # Token
+        'value', # integer
+    )
 
     def __init__(self, token=None, value=0):
         self.token = token
@@ -135,15 +171,11 @@ class IntegerLiteral(Expression):
     def string(self):
         return str(self.value)
 
-    def __hash__(self):
-        return hash(self.value)
-
-    def __eq__(self, other):
-        return isinstance(other, IntegerLiteral) and self.__dict__ == other.__dict__
-
 class StringLiteral(Expression):
-    token = None # Token
-    value = "" # str
+    __slots__ = fields = (
+        'token', # Token
+        'value', # str
+    )
 
     def __init__(self, token, value=""):
         self.token = token
@@ -156,9 +188,11 @@ class StringLiteral(Expression):
         return self.token.Literal
 
 class PrefixExpression(Expression):
-    token = None # Token
-    operator = ""
-    right = None # Expression
+    __slots__ = fields = (
+        'token', # Token
+        'operator',
+        'right', # Expression
+    )
 
     def __init__(self, token=None, operator="", right=None):
         self.token = token
@@ -172,15 +206,13 @@ class PrefixExpression(Expression):
         out = "(" + self.operator + self.right.string() + ")" 
         return out
 
-    def __eq__(self, other):
-        return isinstance(other, PrefixExpression) and self.__dict__ == other.__dict__
-
-
 class InfixExpression(Expression):
-    token = None # Token
-    left = None # Expression
-    operator = ""
-    right = None # Expression
+    __slots__ = fields = (
+        'token', # Token
+        'left', # Expression
+        'operator',
+        'right', # Expression
+    )
 
     def __init__(self, token=None, operator="", left=None, right=None):
         self.token = token
@@ -195,16 +227,8 @@ class InfixExpression(Expression):
         out = "(" + self.left.string() + " " + self.operator + " " + self.right.string() + ")"
         return out
 
-    def __hash__(self):
-        return hash(self.left)
-
-    def __eq__(self, other):
-        return isinstance(other, InfixExpression) and self.__dict__ == other.__dict__
-    
-
 class Boolean(Expression):
-    token = None
-    value = False
+    __slots__ = fields = ('token', 'value')
 
     def __init__(self, token, value):
         self.token = token
@@ -217,10 +241,12 @@ class Boolean(Expression):
         return self.token.Literal
 
 class IfExpression(Expression):
-    token = None # 'if' token
-    condition = None # Expression
-    consequence = None # BlockStatement
-    alternative = None # BlockStatement
+    __slots__ = fields = (
+        'token', # 'if' token
+        'condition', # Expression
+        'consequence', # BlockStatement
+        'alternative', # BlockStatement
+    )
 
     def __init__(self, token=None, condition=None, consequence=None, alternative=None):
         self.token = token
@@ -236,13 +262,12 @@ class IfExpression(Expression):
         if self.alternative != None:
             out = out + "else " + self.alternative.string()
         return out
-    
-    def __eq__(self, other):
-        return isinstance(other, IfExpression) and self.__dict__ == other.__dict__
 
 class BlockStatement(Statement):
-    token = None 
-    statements = [] # Statement(s)
+    __slots__ = fields = (
+        'token',
+        'statements', # Statement(s)
+    )
 
     def __init__(self, token=None, statements=None):
         self.token = token
@@ -258,15 +283,61 @@ class BlockStatement(Statement):
         for s in self.statements:
             out = out + s.string()
         return out
-    
-    def __eq__(self, other):
-        return isinstance(other, BlockStatement) and self.__dict__ == other.__dict__
 
-class CallExpression(Expression):
+class LazyBlockStatement(BlockStatement):
+    """
+    A function body that has only been brace-matched. It keeps the token
+    span of the body and parses it the first time its statements are
+    needed; errors found then are kept in errors.
+    """
+    # fields are those of BlockStatement, token being the { token
+    __slots__ = (
+        'tokens', # TokenBuffer holding the body
+        'start', # index of the { token in tokens
+        'end', # index of the matching } token in tokens
+        'parse_body', # fn(tokens, start) -> (statements, errors)
+        'errors', # parse errors of the body, once parsed
+        '_statements',
+    )
+
+    def __init__(self, token, tokens, start, end, parse_body):
+        self.token = token
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.parse_body = parse_body
+        self.errors = None
+        self._statements = None
+
+    @property
+    def statements(self):
+        if self._statements == None:
+            self._statements, self.errors = self.parse_body(self.tokens, self.start)
+        return self._statements
+
+    @statements.setter
+    def statements(self, statements):
+        self._statements = statements
+
+    def is_parsed(self):
+        return self._statements != None
+
+    def mentions(self, names):
+        """
+        Reports whether any identifier in the unparsed body is in names
+        """
+        kinds = self.tokens.kinds
+        for i in range(self.start + 1, self.end):
+            if kinds[i] == token.IDENT and self.tokens.literal(i) in names:
+                return True
+        return False
 
-    token = None
-    function = None # Identifier or FunctionLiteral
-    arguments = [] # Expression
+class CallExpression(Expression):
+    __slots__ = fields = (
+        'token',
+        'function', # Identifier or FunctionLiteral
+        'arguments', # Expression
+    )
 
     def __init__(self, token, function=None, arguments=None):
         self.token = token
@@ -287,9 +358,11 @@ class CallExpression(Expression):
         return out
 
 class FunctionLiteral(Expression):
-    token = None # fn
-    parameters = [] # Identifier
-    body = None # BlockStatement
+    __slots__ = fields = (
+        'token', # fn
+        'parameters', # Identifier
+        'body', # BlockStatement
+    )
 
     def __init__(self, token=None, parameters=None, body=None):
         self.token = token
@@ -309,12 +382,11 @@ class FunctionLiteral(Expression):
         out = out + "(" + ", ".join(args) + ")"
         return out
 
-    def __eq__(self, other):
-        return isinstance(other, FunctionLiteral) and self.__dict__ == other.__dict__
-
 class ArrayLiteral(Expression):
-    token = None
-    elements = [] # Expression
+    __slots__ = fields = (
+        'token',
+        'elements', # Expression
+    )
 
     def __init__(self, token=None, elements=None):
         self.token = token
@@ -331,14 +403,13 @@ class ArrayLiteral(Expression):
             elements.append(e.string())
         out = "[" + ", ".join(elements) + "]"
         return out
-    
-    def __eq__(self, other):
-        return isinstance(other, ArrayLiteral) and self.__dict__ == other.__dict__
 
 class IndexExpression(Expression):
-    token = None
-    left = None # Expression
-    index = None # Expression
+    __slots__ = fields = (
+        'token',
+        'left', # Expression
+        'index', # Expression
+    )
 
     def __init__(self, token=None, left=None, index=None):
         self.token = token
@@ -352,12 +423,35 @@ class IndexExpression(Expression):
         out = "(" + self.left.string() + "[" +  self.index.string() + "])"
         return out
 
-    def __eq__(self, other):
-        return isinstance(other, IndexExpression) and self.__dict__ == other.__dict__
+class AssignIndexStatement(Statement):
+    __slots__ = fields = (
+        'token', # = token
+        'left', # Expression being indexed
+        'index', # Expression
+        'value', # Expression
+    )
+
+    def __init__(self, token=None, left=None, index=None, value=None):
+        self.token = token
+        self.left = left
+        self.index = index
+        self.value = value
+
+    def token_literal(self):
+        return self.token.Literal
+
+    def string(self):
+        out = self.left.string() + "[" + self.index.string() + "] = "
+        if self.value != None:
+            out = out + self.value.string()
+        out = out + ";"
+        return out
 
 class HashLiteral(Expression):
-    token = None # { token
-    pairs = OrderedDict() # OrderedDict[Expression]
+    __slots__ = fields = (
+        'token', # { token
+        'pairs', # OrderedDict[Expression]
+    )
 
     def __init__(self, token=None, pairs=None):
         self.token = token
@@ -372,14 +466,13 @@ class HashLiteral(Expression):
             pairs.append(key.string() + ":" + value.string())
         out = "{" + ", ".join(pairs) + "}"
         return out
-    
-    def __eq__(self, other):
-        return isinstance(other, HashLiteral) and self.__dict__ == other.__dict__
 
 class MacroLiteral(Expression):
-    token = None # macro literal
-    parameters = [] # Identifier
-    body = None # BlockStatement
+    __slots__ = fields = (
+        'token', # macro literal
+        'parameters', # Identifier
+        'body', # BlockStatement
+    )
 
     def __init__(self, token=None, parameters=None, body=None):
         self.token = token
@@ -398,6 +491,3 @@ class MacroLiteral(Expression):
         out = "" + self.token_literal()
         out = out + "(" + ", ".join(args) + ")"
         return out
-
-    def __eq__(self, other):
-        return isinstance(other, MacroLiteral) and self.__dict__ == other.__dict__
\ No newline at end of file
@@ -3,47 +3,139 @@ This class has functions to modify AST Nodes for macros
 """
 from monkey import ast
 
-def Modify(node, modifier):
+# How a child field holds its children
+NODE = 0 # a single node, or None
+LIST = 1 # a list of nodes
+PAIRS = 2 # a dict of key node -> value node
+
+# The child fields visited for each node class; classes not listed (and
+# not derived from a listed class) are leaves. Call arguments are left
+# alone, as macro arguments must reach the macro unexpanded.
+child_fields = {
+    ast.Program: (('statements', LIST),),
+    ast.ExpressionStatement: (('expression', NODE),),
+    ast.InfixExpression: (('left', NODE), ('right', NODE)),
+    ast.PrefixExpression: (('right', NODE),),
+    ast.IndexExpression: (('left', NODE), ('index', NODE)),
+    ast.IfExpression: (('condition', NODE), ('consequence', NODE), ('alternative', NODE)),
+    ast.BlockStatement: (('statements', LIST),),
+    ast.ReturnStatement: (('return_value', NODE),),
+    ast.LetStatement: (('value', NODE),),
+    ast.AssignIndexStatement: (('left', NODE), ('index', NODE), ('value', NODE)),
+    ast.FunctionLiteral: (('parameters', LIST), ('body', NODE)),
+    ast.ArrayLiteral: (('elements', LIST),),
+    ast.HashLiteral: (('pairs', PAIRS),),
+}
+
+def fields_of(node_class):
+    """
+    Returns the child fields of node_class, looking through its bases
+    """
+    fields = child_fields.get(node_class)
+    if fields == None:
+        fields = ()
+        for base in node_class.__mro__:
+            if base in child_fields:
+                fields = child_fields[base]
+                break
+        child_fields[node_class] = fields
+    return fields
+
+def Modify(node, modifier, skip=None):
+    """
+    Modifies a given AST Node with the provided modifier function. Children
+    are modified before their parents and every result is written back in
+    place of the node it came from. Subtrees for which skip(node) is true
+    are left as they are, neither visited nor modified.
+    """
+    root = [node]
+    # entries are (container, key, node, children done): the result for
+    # node is stored in container[key], or in attribute key of container
+    stack = [(root, 0, node, False)]
+    while len(stack) > 0:
+        container, key, node, done = stack.pop()
+        if not done:
+            if node == None or (skip != None and skip(node)):
+                continue
+            stack.append((container, key, node, True))
+            push_children(stack, node)
+            continue
+        if isinstance(node, ast.HashLiteral):
+            items = node.pairs
+            node.pairs = {items[i]: items[i + 1] for i in range(0, len(items), 2)}
+        result = modifier(node)
+        if type(key) is int:
+            container[key] = result
+        else:
+            setattr(container, key, result)
+    return root[0]
+
+def push_children(stack, node):
+    """
+    Pushes the children of node, last one first so they are visited in order
+    """
+    for name, kind in reversed(fields_of(type(node))):
+        value = getattr(node, name)
+        if kind == NODE:
+            stack.append((node, name, value, False))
+        elif kind == LIST:
+            if value == None:
+                continue
+            for i in range(len(value) - 1, -1, -1):
+                stack.append((value, i, value[i], False))
+        else:
+            # keys and values are modified in a flat list, which is turned
+            # back into a dict once they are all done
+            items = []
+            for k, v in value.items():
+                items.append(k)
+                items.append(v)
+            setattr(node, name, items)
+            for i in range(len(items) - 1, -1, -1):
+                stack.append((items, i, items[i], False))
+
+def Walk(node, skip=None):
+    """
+    Yields the nodes of a tree in pre-order without recursing, following
+    the same child fields as Modify; subtrees for which skip(node) is true
+    are not entered
+    """
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node == None or (skip != None and skip(node)):
+            continue
+        yield node
+        for name, kind in reversed(fields_of(type(node))):
+            value = getattr(node, name)
+            if kind == NODE:
+                stack.append(value)
+            elif kind == LIST:
+                if value != None:
+                    stack.extend(reversed(value))
+            else:
+                for k, v in reversed(list(value.items())):
+                    stack.append(v)
+                    stack.append(k)
+
+def Copy(node):
     """
-    Modifies a given AST Node with the provided modifier function
+    Returns a deep copy of a tree. Tokens are shared, being immutable, and
+    function bodies that have not been parsed yet share their token span.
     """
+    if isinstance(node, list):
+        return [Copy(child) for child in node]
+    if isinstance(node, dict):
+        return {Copy(k): Copy(v) for k, v in node.items()}
+    if not isinstance(node, ast.Node):
+        return node
+    if isinstance(node, ast.LazyBlockStatement):
+        if not node.is_parsed():
+            return ast.LazyBlockStatement(node.token, node.tokens, node.start, node.end, node.parse_body)
+        return ast.BlockStatement(node.token, Copy(node.statements))
+    copy = type(node).__new__(type(node))
+    for field in node.fields:
+        setattr(copy, field, Copy(getattr(node, field)))
     if isinstance(node, ast.Program):
-        for i, statement in enumerate(node.statements):
-            node.statements[i] = Modify(statement, modifier)
-    elif isinstance(node, ast.ExpressionStatement):
-        node.expression = Modify(node.expression, modifier)
-    elif isinstance(node, ast.InfixExpression): 
-        node.left = Modify(node.left, modifier)
-        node.right = Modify(node.right, modifier)
-    elif isinstance(node, ast.PrefixExpression):
-        node.right = Modify(node.right, modifier)
-    elif isinstance(node, ast.IndexExpression):
-        node.left = Modify(node.left, modifier)
-        node.index = Modify(node.index, modifier)
-    elif isinstance(node, ast.IfExpression):
-        node.condition = Modify(node.condition, modifier)
-        node.consequence = Modify(node.consequence, modifier)
-        if node.alternative != None:
-            node.alternative = Modify(node.alternative, modifier)
-    elif isinstance(node, ast.BlockStatement):
-        for statement in node.statements:
-            statement = Modify(statement, modifier)
-    elif isinstance(node, ast.ReturnStatement):
-        node.return_value = Modify(node.return_value, modifier)
-    elif isinstance(node, ast.LetStatement):
-        node.value = Modify(node.value, modifier)
-    elif isinstance(node, ast.FunctionLiteral):
-        for parameter in node.parameters:
-            parameter = Modify(parameter, modifier)
-        node.body = Modify(node.body, modifier)
-    elif isinstance(node, ast.ArrayLiteral):
-        for element in node.elements:
-            element = Modify(element, modifier)
-    elif isinstance(node, ast.HashLiteral):            
-        new_pairs = {}
-        for key, value in node.pairs.items():
-            new_key = Modify(key, modifier)
-            new_value = Modify(value, modifier)
-            new_pairs[new_key] = new_value
-        node.pairs = new_pairs
-    return modifier(node)
\ No newline at end of file
+        copy.call_sites = None
+    return copy
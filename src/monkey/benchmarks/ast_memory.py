@@ -0,0 +1,77 @@
+"""
+Measures the memory held by the AST of a generated corpus, in bytes per
+node, and the time taken to parse it, for the object AST and for the
+arena encoding.
+
+Run from src/monkey: python benchmarks/ast_memory.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import time
+import tracemalloc
+
+from monkey import ast
+from monkey import lexer
+from monkey import parser
+
+SNIPPET = '''let {name} = fn(x, y) {{ if (x < 10) {{ return x + y * 2; }} else {{ x - y; }} }};
+let {name}table = {{"name": "entry", "values": [1, 2, 3, -x]}};
+{name}table["values"][3] = {name}({name}table["values"][0], !true) != 10;
+'''
+
+def name(i):
+    letters = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return letters
+
+def generate(statements):
+    return ''.join(SNIPPET.format(name='v' + name(i)) for i in range(statements // 3))
+
+def count_nodes(program):
+    count = 0
+    stack = [program]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if isinstance(node, dict):
+            stack.extend(node.keys())
+            stack.extend(node.values())
+            continue
+        if not isinstance(node, ast.Node):
+            continue
+        count += 1
+        for field in type(node).fields:
+            stack.append(getattr(node, field))
+    return count
+
+def measure_size(new_parser, source):
+    # tokenize outside the traced section so only the AST is counted
+    tokens = lexer.tokenize(source)
+    p = new_parser(lexer.BufferLexer(tokens))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    program = p.parse_program()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return program, size
+
+def measure_time(new_parser, source):
+    start = time.perf_counter()
+    new_parser(lexer.new_buffer(source)).parse_program()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    source = generate(statements)
+    for name, new_parser in [('objects', parser.new), ('arena', parser.new_arena)]:
+        program, size = measure_size(new_parser, source)
+        nodes = count_nodes(program) if name == 'objects' else len(program)
+        del program
+        elapsed = measure_time(new_parser, source)
+        print(f'{name:>7}: {nodes} nodes, {size / nodes:.1f} bytes per node, parsed in {elapsed:.2f}s')
@@ -0,0 +1,85 @@
+"""
+Benchmarks filling a dynamic-programming table (minimum path length through
+an n x n grid) with in-place index assignment, `t[k] = v`, against threading
+a copy of the table through `push`.
+
+Run from src/monkey: python benchmarks/dp_table.py [n]
+(the default n = 1000 fills a table of 1M cells)
+"""
+
+import sys
+sys.path.append("../")
+import threading
+import time
+
+from monkey import evaluator
+from monkey import lexer
+from monkey import parser
+from monkey.object import environment
+
+ASSIGN_SOURCE = '''
+let n = {n};
+let t = [];
+let row = fn(i, j) {{
+    if (j < n) {{
+        let k = i * n + j;
+        if (i == 0) {{ t[k] = j; }} else {{
+            if (j == 0) {{ t[k] = i; }} else {{
+                let up = t[k - n];
+                let left = t[k - 1];
+                if (up < left) {{ t[k] = up + 1; }} else {{ t[k] = left + 1; }}
+            }}
+        }}
+        row(i, j + 1);
+    }}
+}};
+let rows = fn(i) {{ if (i < n) {{ row(i, 0); rows(i + 1); }} }};
+rows(0);
+t[n * n - 1];
+'''
+
+PUSH_SOURCE = '''
+let n = {n};
+let row = fn(t, i, j) {{
+    if (j < n) {{
+        let k = i * n + j;
+        let value = if (i == 0) {{ j }} else {{
+            if (j == 0) {{ i }} else {{
+                let up = t[k - n];
+                let left = t[k - 1];
+                if (up < left) {{ up + 1 }} else {{ left + 1 }}
+            }}
+        }};
+        row(push(t, value), i, j + 1);
+    }} else {{ t }}
+}};
+let rows = fn(t, i) {{ if (i < n) {{ rows(row(t, i, 0), i + 1); }} else {{ t }} }};
+let t = rows([], 0);
+t[n * n - 1];
+'''
+
+def run(source, n):
+    program = parser.new(lexer.new(source.format(n=n))).parse_program()
+    env = environment.new_environment()
+    start = time.perf_counter()
+    result = evaluator.Eval(program, env)
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+def main(n):
+    small = min(n, 150)
+    for name, source in [('push', PUSH_SOURCE), ('assign', ASSIGN_SOURCE)]:
+        result, elapsed = run(source, small)
+        print(f'{name:>6}: {small * small:>8} cells in {elapsed:8.3f}s -> {result.inspect()}')
+    result, elapsed = run(ASSIGN_SOURCE, n)
+    print(f'assign: {n * n:>8} cells in {elapsed:8.3f}s -> {result.inspect()}'
+        f' ({n * n / elapsed:,.0f} cells/s)')
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # the tree-walking evaluator recurses once per Monkey call, so give it room
+    sys.setrecursionlimit(1000000)
+    threading.stack_size(512 * 1024 * 1024)
+    worker = threading.Thread(target=main, args=(n,))
+    worker.start()
+    worker.join()
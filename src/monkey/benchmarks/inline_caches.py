@@ -0,0 +1,63 @@
+"""
+Runs programs indexing hashes over and over, with the VM's inline caches on
+and off, and reports the time of a run and the cache hit rate. Only general
+hashes go through the cache; 'shaped' shows the cost of having it.
+
+Run from src/monkey: python benchmarks/inline_caches.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import gc
+import time
+
+from monkey.vm import vm
+
+import opcode_ngrams
+
+WORKLOADS = {
+    # all String keys: hashes with a shape
+    'shaped': '''let {name} = {{"name": "{name}", "size": {i}, "tags": [1, 2]}};
+{name}["size"] + len({name}["tags"]);
+{name}["name"] + "!";
+''',
+    # mixed keys: general hashes
+    'general': '''let {name} = {{"name": "{name}", 7: {i}, true: [1, 2]}};
+{name}[7] + len({name}[true]);
+{name}["name"] + "!";
+''',
+}
+
+def run(bytecode, inline_caches, stats):
+    machine = vm.new(bytecode)
+    machine.inline_caches = inline_caches
+    start = time.perf_counter()
+    err = machine.run()
+    elapsed = time.perf_counter() - start
+    assert err == None, err
+    stats[0] += machine.cache_hits
+    stats[1] += machine.cache_misses
+    return elapsed
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    opcode_ngrams.WORKLOADS.update(WORKLOADS)
+    for workload in WORKLOADS:
+        bytecodes = {on: opcode_ngrams.compile_workload(workload, statements, superinstructions=True)
+            for on in [False, True]}
+        best = {}
+        stats = [0, 0] # hits, misses
+        gc.disable()
+        try:
+            # the first run fills the caches
+            for i in range(31):
+                for on, bytecode in bytecodes.items():
+                    elapsed = run(bytecode, on, stats)
+                    if i > 0:
+                        best[on] = min(best.get(on, elapsed), elapsed)
+        finally:
+            gc.enable()
+        lookups = stats[0] + stats[1]
+        rate = f'{100 * stats[0] / lookups:.1f}% of {lookups} lookups hit' if lookups > 0 else 'no lookups'
+        print(f'{workload:>8}: {best[False]:.4f}s -> {best[True]:.4f}s '
+            f'({100 * (1 - best[True] / best[False]):.1f}% faster), {rate}')
@@ -0,0 +1,56 @@
+"""
+Compares startup time of a generated library of functions, of which the
+program calls only a few, when function bodies are parsed eagerly and when
+they are only brace-matched and parsed on first call.
+
+Run from src/monkey: python benchmarks/lazy_bodies.py [functions]
+"""
+
+import sys
+sys.path.append("../")
+import time
+
+from monkey import lexer
+from monkey import parser
+from monkey.evaluator import evaluator
+
+FUNCTION = '''let {name} = fn(x, y) {{
+    let table = {{"name": "{name}", "values": [x, y, x * y]}};
+    if (x < y) {{
+        return table["values"][2] + len(table["name"]);
+    }} else {{
+        let z = fn(w) {{ w * 2 - y }};
+        return z(x) + table["values"][0];
+    }}
+}};
+'''
+
+def name(i):
+    letters = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return 'fn' + letters
+
+def generate(functions):
+    library = ''.join(FUNCTION.format(name=name(i)) for i in range(functions))
+    calls = ' + '.join(f'{name(i)}({i}, 3)' for i in range(0, functions, functions // 3))
+    return library + calls + ';'
+
+def measure(source, lazy_bodies):
+    start = time.perf_counter()
+    p = parser.new(lexer.new_buffer(source), lazy_bodies=lazy_bodies)
+    program = p.parse_program()
+    parsed = time.perf_counter()
+    result = evaluator.Eval(program, evaluator.new_environment())
+    done = time.perf_counter()
+    return result.inspect(), parsed - start, done - start
+
+if __name__ == '__main__':
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = generate(functions)
+    for lazy_bodies in [False, True]:
+        result, parse_time, total = measure(source, lazy_bodies)
+        mode = 'lazy' if lazy_bodies else 'eager'
+        print(f'{mode:>5}: {functions} functions, parse {parse_time:.3f}s, parse + run {total:.3f}s, result {result}')
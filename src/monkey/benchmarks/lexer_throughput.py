@@ -0,0 +1,47 @@
+"""
+Measures lexing throughput in MB/s of the character-at-a-time Lexer and the
+regex-based RegexLexer on a generated Monkey source.
+
+Run from src/monkey: python benchmarks/lexer_throughput.py [megabytes]
+"""
+
+import sys
+sys.path.append("../")
+import time
+
+from monkey import lexer
+from monkey.tokens import token
+
+SNIPPET = '''let add_{i} = fn(x, y) {{ if (x < {i}) {{ return x + y * 2; }} else {{ x - y; }} }};
+let table_{i} = {{"name": "entry {i}", "values": [1, 2, 3, {i}]}};
+add_{i}(table_{i}["values"][3], -{i}) != 10;
+'''
+
+def generate(megabytes):
+    target = megabytes * 1024 * 1024
+    parts = []
+    size = 0
+    i = 0
+    while size < target:
+        part = SNIPPET.format(i=i)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return ''.join(parts)
+
+def measure(new_lexer, source):
+    start = time.perf_counter()
+    l = new_lexer(source)
+    count = 0
+    while l.next_token().Type != token.EOF:
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count, elapsed
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    source = generate(megabytes)
+    size = len(source) / (1024 * 1024)
+    for name, new_lexer in [('Lexer', lexer.new), ('RegexLexer', lexer.new_regex)]:
+        count, elapsed = measure(new_lexer, source)
+        print(f'{name:>10}: {count} tokens in {elapsed:.2f}s, {size / elapsed:.2f} MB/s')
@@ -0,0 +1,103 @@
+"""
+Runs a corpus of generated workloads on the VM and prints the most frequent
+executed opcode pairs and triples, the candidates for superinstructions.
+OpExtendedArg prefixes are counted as part of the instruction they extend,
+and sequences are only counted if no instruction but the last is a jump,
+since jumps end a fusable sequence.
+
+Run from src/monkey: python benchmarks/opcode_ngrams.py [statements] [top]
+"""
+
+import sys
+sys.path.append("../")
+from collections import Counter
+
+from monkey.code import code
+from monkey.lexer import lexer
+from monkey.parser import parser
+from monkey.compiler import compiler
+from monkey.vm import vm
+
+WORKLOADS = {
+    'arithmetic': '''let {name} = {i} + 2 * 3 - 1;
+if ({name} > 10) {{ {name} - 1 }} else {{ !true }};
+let {name}b = {name} * 2 + 1;
+if ({name}b < 100) {{ {name}b + {name} }} else {{ {name}b - 100 }};
+''',
+    'collections': '''let {name} = {{"name": "{name}", "values": [1, 2, {i}]}};
+let {name}v = {name}["values"];
+{name}v[0] + {name}v[2] * 2;
+{name}v[1] = {name}v[1] + 1;
+len({name}["name"]) + len({name}v);
+''',
+    'strings': '''let {name} = "item" + "{name}";
+if ({name} == "itemxa") {{ {name} + "!" }} else {{ {name} }};
+let {name}n = len({name}) - 1;
+{name}n != 0;
+''',
+}
+
+# opcodes after which an instruction sequence cannot continue
+BARRIERS = {code.OpJump, code.OpJumpNotTruthy, code.OpReturnValue}
+
+def name(i):
+    # identifiers cannot hold digits
+    letters = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return 'x' + letters
+
+def generate(workload, statements):
+    source = WORKLOADS[workload]
+    return ''.join(source.format(name=name(i), i=i) for i in range(statements))
+
+def compile_workload(workload, statements, **options):
+    program = parser.new(lexer.new(generate(workload, statements))).parse_program()
+    comp = compiler.new(**options)
+    err = comp.compile(program)
+    assert err == None, err
+    return comp.bytecode()
+
+def trace(bytecode):
+    """
+    Runs bytecode and returns the opcodes it executed, in order, leaving
+    out OpExtendedArg prefixes
+    """
+    machine = vm.new(bytecode)
+    machine.trace = []
+    err = machine.run()
+    assert err == None, err
+    return [op for op in machine.trace if op != code.OpExtendedArg]
+
+def count_ngrams(ops, n, counts):
+    """
+    Adds the fusable sequences of n opcodes in ops to counts
+    """
+    for i in range(len(ops) - n + 1):
+        gram = tuple(ops[i:i + n])
+        if any(op in BARRIERS for op in gram[:-1]):
+            continue
+        counts[gram] += 1
+    return counts
+
+def opcode_names(gram):
+    return ', '.join(code.definitions[op].name for op in gram)
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    pairs = Counter()
+    triples = Counter()
+    total = 0
+    for workload in WORKLOADS:
+        ops = trace(compile_workload(workload, statements))
+        total += len(ops)
+        count_ngrams(ops, 2, pairs)
+        count_ngrams(ops, 3, triples)
+    print(f'{total} instructions executed')
+    for label, counts in [('pairs', pairs), ('triples', triples)]:
+        print(f'{label}:')
+        for gram, count in counts.most_common(top):
+            print(f'  {count:>7} {100 * count / total:5.1f}%  {opcode_names(gram)}')
@@ -0,0 +1,66 @@
+"""
+Runs programs over and over, as a macro body or a REPL section is, with
+quickening on and off, and compares the time of a run once the generic
+instructions have been specialized. Besides the workloads of
+opcode_ngrams.py, 'sites' is made up of quickenable instructions only.
+
+Run from src/monkey: python benchmarks/quickening.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import gc
+import time
+from collections import Counter
+
+from monkey.vm import vm
+
+import opcode_ngrams
+
+SITES = '''let {name} = [{i}, 2];
+let {name}h = {{"k": "v"}};
+{name}[0] + {name}[1] > {name}[1] + 1;
+{name}h["k"] + {name}h["k"];
+'''
+
+def run(bytecode, quicken, stats):
+    machine = vm.new(bytecode)
+    machine.quicken = quicken
+    start = time.perf_counter()
+    err = machine.run()
+    elapsed = time.perf_counter() - start
+    assert err == None, err
+    stats.update(machine.specializations)
+    return elapsed
+
+def measure(bytecodes, repeat):
+    """
+    Returns the best time of a run for each quicken setting, once the
+    quickened code has warmed up, alternating settings between runs
+    """
+    best = {}
+    stats = Counter()
+    gc.disable()
+    try:
+        # the first run is not counted
+        for i in range(1 + vm.QUICKEN_AFTER + repeat):
+            for quicken, bytecode in bytecodes.items():
+                elapsed = run(bytecode, quicken, stats)
+                if i > vm.QUICKEN_AFTER:
+                    best[quicken] = min(best.get(quicken, elapsed), elapsed)
+    finally:
+        gc.enable()
+    return best, stats
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    opcode_ngrams.WORKLOADS['sites'] = SITES
+    for workload in opcode_ngrams.WORKLOADS:
+        for superinstructions in [False, True]:
+            bytecodes = {quicken: opcode_ngrams.compile_workload(workload, statements,
+                superinstructions=superinstructions) for quicken in [False, True]}
+            best, stats = measure(bytecodes, 30)
+            label = workload + (' (superinstructions)' if superinstructions else '')
+            print(f'{label:>31}: {best[False]:.4f}s -> {best[True]:.4f}s '
+                f'({100 * (1 - best[True] / best[False]):.1f}% faster), '
+                f'{sum(stats.values())} sites specialized')
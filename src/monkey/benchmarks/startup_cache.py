@@ -0,0 +1,63 @@
+"""
+Compares the time to run a generated script using macros with the on-disk
+cache cold (parse, expand and store), warm (load the cached result) and
+disabled, for the interpreter, which caches the expanded AST, and for the
+compiler, which caches .mnkc bytecode.
+
+Run from src/monkey: python benchmarks/startup_cache.py [snippets]
+"""
+
+import sys
+sys.path.append("../")
+import os
+import shutil
+import tempfile
+import time
+
+from monkey import main
+from monkey.common import cache
+
+MACROS = '''let unless = macro(cond, cons, alt) { quote(if (!(unquote(cond))) { unquote(cons) } else { unquote(alt) }) };
+let square = macro(x) { quote(unquote(x) * unquote(x)) };
+'''
+
+SNIPPET = '''let {name} = {{"name": "{name}", "values": [1, 2, square(3 + 4)]}};
+let {name}pick = unless({name}["values"][0] < 2, {name}["values"][0], {name}["values"][1]);
+if ({name}pick > 10) {{ {name}pick - square(2) }} else {{ [{name}pick, {name}] }};
+'''
+
+def name(i):
+    letters = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return 'v' + letters
+
+def generate(snippets):
+    return MACROS + ''.join(SNIPPET.format(name=name(i)) for i in range(snippets))
+
+def measure(path, interpreter, use_cache):
+    start = time.perf_counter()
+    code = main.run_file(path, interpreter, use_cache)
+    assert code == 0
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    snippets = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'script.mk')
+        with open(path, 'w') as f:
+            f.write(generate(snippets))
+        for interpreter in [True, False]:
+            shutil.rmtree(os.path.join(directory, cache.DIRECTORY), ignore_errors=True)
+            uncached = measure(path, interpreter, False)
+            cold = measure(path, interpreter, True)
+            warm = min(measure(path, interpreter, True) for _ in range(3))
+            size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(directory, cache.DIRECTORY)))
+            mode = 'interpreter' if interpreter else 'compiler'
+            print(f'{mode:>11}: {snippets * 3} statements, {size} bytes cached, '
+                f'no cache {uncached:.3f}s, cold {cold:.3f}s, warm {warm:.3f}s')
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,40 @@
+"""
+Compares the workloads of opcode_ngrams.py compiled with and without the
+superinstruction pass: the number of instructions the VM dispatches and the
+time it takes to run them.
+
+Run from src/monkey: python benchmarks/superinstructions.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import time
+
+from monkey.vm import vm
+
+import opcode_ngrams
+
+def measure(bytecode, repeat):
+    best = None
+    for _ in range(repeat):
+        machine = vm.new(bytecode)
+        start = time.perf_counter()
+        err = machine.run()
+        elapsed = time.perf_counter() - start
+        assert err == None, err
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for workload in opcode_ngrams.WORKLOADS:
+        plain = opcode_ngrams.compile_workload(workload, statements)
+        fused = opcode_ngrams.compile_workload(workload, statements, superinstructions=True)
+        plain_count = len(opcode_ngrams.trace(plain))
+        fused_count = len(opcode_ngrams.trace(fused))
+        plain_time = measure(plain, 5)
+        fused_time = measure(fused, 5)
+        print(f'{workload:>11}: dispatches {plain_count} -> {fused_count} '
+            f'({100 * (1 - fused_count / plain_count):.1f}% fewer), '
+            f'{plain_time:.3f}s -> {fused_time:.3f}s ({100 * (1 - fused_time / plain_time):.1f}% faster)')
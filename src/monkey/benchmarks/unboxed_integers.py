@@ -0,0 +1,67 @@
+"""
+Runs the workloads of opcode_ngrams.py plus an arithmetic-only one and
+reports the Integer objects the VM allocates per run, next to the
+instructions it dispatches, and the time a run takes. With integers kept
+unboxed on the stack, Integers are only made for values handed out of the VM.
+
+Run from src/monkey: python benchmarks/unboxed_integers.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import gc
+import time
+
+from monkey.object import object
+from monkey.vm import vm
+
+import opcode_ngrams
+
+SUMS = '''let {name} = {i} * 3 + 7 - 2 * {i};
+let {name}b = ({name} + {i}) * ({name} - 1) - -{name};
+{name}b - {name} * 2 > {i} + 1;
+'''
+
+def count_integers(bytecode):
+    """
+    Runs bytecode and returns the number of Integers created meanwhile
+    """
+    init = object.Integer.__init__
+    count = 0
+    def counting_init(self, value=0):
+        nonlocal count
+        count += 1
+        init(self, value)
+    object.Integer.__init__ = counting_init
+    try:
+        err = vm.new(bytecode).run()
+    finally:
+        object.Integer.__init__ = init
+    assert err == None, err
+    return count
+
+def measure(bytecode, repeat):
+    best = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            machine = vm.new(bytecode)
+            start = time.perf_counter()
+            err = machine.run()
+            elapsed = time.perf_counter() - start
+            assert err == None, err
+            if best == None or elapsed < best:
+                best = elapsed
+    finally:
+        gc.enable()
+    return best
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    opcode_ngrams.WORKLOADS['sums'] = SUMS
+    for workload in opcode_ngrams.WORKLOADS:
+        bytecode = opcode_ngrams.compile_workload(workload, statements, superinstructions=True)
+        dispatches = len(opcode_ngrams.trace(bytecode))
+        integers = count_integers(bytecode)
+        print(f'{workload:>11}: {integers} Integers for {dispatches} dispatches, '
+            f'{measure(bytecode, 10):.3f}s')
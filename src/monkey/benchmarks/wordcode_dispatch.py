@@ -0,0 +1,75 @@
+"""
+Compares VM dispatch cost on the same generated program compiled to
+bytearray instructions and to fixed-width wordcode.
+
+Run from src/monkey: python benchmarks/wordcode_dispatch.py [statements]
+"""
+
+import sys
+sys.path.append("../")
+import time
+
+from monkey.code import code
+from monkey.lexer import lexer
+from monkey.parser import parser
+from monkey.compiler import compiler
+from monkey.vm import vm
+
+STATEMENT = '''let {name} = {i} + 2 * 3 - 1;
+if ({name} > 10) {{ {name} - 1 }} else {{ !true }};
+[{name}, {name} + 1][1];
+'''
+
+def name(i):
+    # identifiers cannot hold digits
+    letters = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        letters = chr(ord('a') + r) + letters
+    return 'x' + letters
+
+def generate(statements):
+    return ''.join(STATEMENT.format(name=name(i), i=i) for i in range(statements))
+
+def count_instructions(instructions):
+    """
+    Counts the instructions, not the bytes or words they take up
+    """
+    count = 0
+    ip = 0
+    while ip < len(instructions):
+        if code.is_wordcode(instructions):
+            ip += 1
+        else:
+            defn, _ = code.lookup(instructions[ip])
+            ip += 1 + sum(defn.operand_widths)
+        count += 1
+    return count
+
+def measure(bytecode, repeat):
+    best = None
+    for _ in range(repeat):
+        machine = vm.new(bytecode)
+        start = time.perf_counter()
+        err = machine.run()
+        elapsed = time.perf_counter() - start
+        assert err == None, err
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    program = parser.new(lexer.new(generate(statements))).parse_program()
+    for wordcode in [False, True]:
+        comp = compiler.new(wordcode)
+        err = comp.compile(program)
+        assert err == None, err
+        bytecode = comp.bytecode()
+        count = count_instructions(bytecode.instructions)
+        size = len(bytecode.instructions) * getattr(bytecode.instructions, 'itemsize', 1)
+        elapsed = measure(bytecode, 5)
+        mode = 'wordcode' if wordcode else 'bytearray'
+        print(f'{mode:>9}: {count} instructions, {size} bytes, '
+            f'{elapsed:.3f}s, {elapsed / count * 1e9:.0f} ns per instruction')
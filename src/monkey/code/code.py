@@ -8,15 +8,24 @@ For the sake of being explicit we define expected types with typing module
 from typing import NamedTuple
 from typing import List
 from enum import Enum, auto
-from ctypes import c_uint16
-import math
+from array import array
 
 from monkey.common import utilities
 
+# Wordcode is the fixed-width alternative to bytearray instructions: each
+# instruction is one unsigned word of an array, the opcode in the low byte
+# and the operand in the OPERAND_BITS above it. Operands that do not fit are
+# carried by OpExtendedArg words, like bytes in the bytearray format.
+WORDCODE_TYPECODE = 'I' if array('I').itemsize >= 4 else 'L'
+OPERAND_BITS = 24
+OPERAND_MASK = (1 << OPERAND_BITS) - 1
+OPCODE_MASK = 0xff
+
 class Instructions:
 
     # instructions are represented as bytearray as they behave like lists
-    # and are amenable to most string operations like indexing
+    # and are amenable to most string operations like indexing, or as a
+    # wordcode array
     instructions: bytearray = None
 
     def __init__(self, instructions=None):
@@ -31,44 +40,51 @@ class Instructions:
 
         where offset is which index the instruction starts in the total bytecode,
         OpCode is the name of the instruciton and the operand is the bytecode for
-        the operands.
+        the operands. The operand shown after OpExtendedArg prefixes includes
+        the bytes they carry. For wordcode the offset counts words.
         """
         out = ''
         i = 0
+        ext = 0
         ins = self.instructions
+        wordcode = is_wordcode(ins)
         while i < len(ins):
-            defn, err = lookup(ins[i])
+            op = opcode_at(ins, i)
+            defn, err = lookup(op)
             if err != None:
                 out += (f'ERROR: {err}\n')
+                i += 1
                 continue
-            operands, read = read_operands(defn, ins[i+1:])
-            out += ('{0:04d} {1}\n'.format(i, self.string_instruction(defn, operands)))     
+            if wordcode:
+                operands, read = read_operands(defn, ins[i:i+1])
+                bits = OPERAND_BITS
+            else:
+                operands, read = read_operands(defn, ins[i+1:])
+                bits = 8 * sum(defn.operand_widths)
+            out += ('{0:04d} {1}\n'.format(i, self.string_instruction(defn, operands, ext, bits)))
+            if op == OpExtendedArg:
+                ext = (ext << bits) | int.from_bytes(operands, byteorder='big')
+            else:
+                ext = 0
             i += 1 + read
         return out
     
-    def string_instruction(self, defn, operands):
+    def string_instruction(self, defn, operands, ext=0, bits=None):
         """
         Returns a formatted string representing the <OpCode> <Operand> or an 
-        error message.
+        error message. bits is how far ext is shifted above the operand.
         """
         operand_count = len(defn.operand_widths)
-        operand = c_uint16(int.from_bytes(operands, byteorder='big')).value
-        if operand_count > 0:
-            # For now, this is a hack to check operand length since len() works
-            # differently for bytearray compared to lists
-            length = len([int.from_bytes(operands, byteorder='big')])
-        else:
-            # in the case of 0 operands, we can just take len of operands
-            length = len(operands)
-
-        if length != operand_count:
-            print('err', defn.name, length, operand_count)
-            return f'ERROR: operand len {length} does not match defined {operand_count}\n'
-
         if operand_count == 0:
             return defn.name
         elif operand_count == 1:
-            return f'{defn.name} {operand}'
+            operand = int.from_bytes(operands, byteorder='big')
+            if bits == None:
+                bits = 8 * defn.operand_widths[0]
+            return f'{defn.name} {(ext << bits) | operand}'
+        elif operand_count == 2:
+            first = defn.operand_widths[0]
+            return f'{defn.name} {bytes_to_int(operands[:first])} {bytes_to_int(operands[first:])}'
 
         return f'ERROR: unhandled operand_count for {operand_count}\n'
 
@@ -117,16 +133,39 @@ class OpCodes(ByteEnum):
     OpCall = auto()
     OpReturnValue = auto()
     OpReturn = auto()
+    OpGetBuiltin = auto()
+    OpSetIndex = auto()
+    OpQuote = auto()
+    OpExtendedArg = auto()
+    # superinstructions, each doing the work of the sequence listed for it
+    # in superinstructions below
+    OpGetGlobalConstant = auto()
+    OpConstantConstant = auto()
+    OpSetGetGlobal = auto()
+    OpConstantIndex = auto()
+    OpConstantAdd = auto()
+    OpConstantSub = auto()
+    OpConstantMul = auto()
+    OpGreaterThanJumpNotTruthy = auto()
+    # specialized instructions the VM rewrites generic ones into once it has
+    # seen their operand types, see specializations below
+    OpAddInt = auto()
+    OpAddStr = auto()
+    OpGreaterThanInt = auto()
+    OpIndexArrayInt = auto()
+    OpIndexHashStr = auto()
 
 class Definition(NamedTuple):
     name: str
     # this represents a list of operands defined by an int indicating how many
-    # bytes each one should be; for e.g. [2] means 1 operand that is 2 bytes
+    # bytes each one should be; for e.g. [2] means 1 operand that is 2 bytes.
+    # Operands too large for their width are carried on by OpExtendedArg
+    # prefixes, so index and count operands are kept to 1 byte.
     operand_widths: List[int]
 
 # Holds the Definitions for all the OpCodes in Monkey
 definitions = {
-    OpConstant: Definition("OpConstant", [2]),
+    OpConstant: Definition("OpConstant", [1]),
     OpAdd: Definition("OpAdd", []),
     OpPop: Definition("OpPop", []),
     OpSub: Definition("OpSub", []),
@@ -139,17 +178,63 @@ definitions = {
     OpGreaterThan: Definition("OpGreaterThan", []),
     OpMinus: Definition("OpMinus", []),
     OpBang: Definition("OpBang", []),
-    OpJumpNotTruthy: Definition("OpJumpNotTruthy", [2]),
-    OpJump: Definition("OpJump", [2]),
+    OpJumpNotTruthy: Definition("OpJumpNotTruthy", [4]),
+    OpJump: Definition("OpJump", [4]),
     OpNull: Definition("OpNull", []),
-    OpGetGlobal: Definition("OpGetGlobal", [2]),
-    OpSetGlobal: Definition("OpSetGlobal", [2]),
-    OpArray: Definition("OpArray", [2]),
-    OpHash: Definition("OpHash", [2]),
+    OpGetGlobal: Definition("OpGetGlobal", [1]),
+    OpSetGlobal: Definition("OpSetGlobal", [1]),
+    OpArray: Definition("OpArray", [1]),
+    OpHash: Definition("OpHash", [1]),
     OpIndex: Definition("OpIndex", []),
-    OpCall: Definition("OpCall", []),
+    OpCall: Definition("OpCall", [1]),
     OpReturnValue: Definition("OpReturnValue", []),
     OpReturn: Definition("OpReturn", []),
+    OpGetBuiltin: Definition("OpGetBuiltin", [1]),
+    OpSetIndex: Definition("OpSetIndex", []),
+    # operand: constant index of the Quote holding the quoted node, whose
+    # unquoted values are on the stack
+    OpQuote: Definition("OpQuote", [1]),
+    # operand: the next byte of the following instruction's operand, above
+    # the bytes it holds itself
+    OpExtendedArg: Definition("OpExtendedArg", [1]),
+    # superinstructions take the operands of their parts in order; they are
+    # never given OpExtendedArg prefixes
+    OpGetGlobalConstant: Definition("OpGetGlobalConstant", [2, 2]),
+    OpConstantConstant: Definition("OpConstantConstant", [2, 2]),
+    OpSetGetGlobal: Definition("OpSetGetGlobal", [2, 2]),
+    OpConstantIndex: Definition("OpConstantIndex", [2]),
+    OpConstantAdd: Definition("OpConstantAdd", [2]),
+    OpConstantSub: Definition("OpConstantSub", [2]),
+    OpConstantMul: Definition("OpConstantMul", [2]),
+    OpGreaterThanJumpNotTruthy: Definition("OpGreaterThanJumpNotTruthy", [4]),
+    OpAddInt: Definition("OpAddInt", []),
+    OpAddStr: Definition("OpAddStr", []),
+    OpGreaterThanInt: Definition("OpGreaterThanInt", []),
+    OpIndexArrayInt: Definition("OpIndexArrayInt", []),
+    OpIndexHashStr: Definition("OpIndexHashStr", []),
+}
+
+# The sequence of instructions each superinstruction replaces. These are the
+# most frequently executed pairs measured by benchmarks/opcode_ngrams.py.
+superinstructions = {
+    OpGetGlobalConstant: (OpGetGlobal, OpConstant),
+    OpConstantConstant: (OpConstant, OpConstant),
+    OpSetGetGlobal: (OpSetGlobal, OpGetGlobal),
+    OpConstantIndex: (OpConstant, OpIndex),
+    OpConstantAdd: (OpConstant, OpAdd),
+    OpConstantSub: (OpConstant, OpSub),
+    OpConstantMul: (OpConstant, OpMul),
+    OpGreaterThanJumpNotTruthy: (OpGreaterThan, OpJumpNotTruthy),
+}
+
+# The generic instruction each specialized one stands in for, and goes back
+# to when its operands are not of the types it expects
+specializations = {
+    OpAddInt: OpAdd,
+    OpAddStr: OpAdd,
+    OpGreaterThanInt: OpGreaterThan,
+    OpIndexArrayInt: OpIndex,
+    OpIndexHashStr: OpIndex,
 }
 
 def lookup(op):
@@ -162,66 +247,155 @@ def lookup(op):
         return None, f'opcode {op} undefined'
     return definitions[op], None
 
-def Make(op, *operands):
+def Make(op, *operands, wordcode=False):
     """
-    Creates and returns a bytecode instruction as a bytearray (OpCode + *Operand(s))
+    Creates and returns a bytecode instruction as a bytearray (OpCode + *Operand(s)).
+    An operand too large for its width is split: its high bytes go in
+    OpExtendedArg prefixes, most significant first.
+
+    Jump operands are 4 bytes wide and never need prefixes, so the compiler
+    can patch jump targets in place.
+
+    With wordcode, the instruction is returned as a wordcode array instead.
     """
     if op not in definitions:
         return [bytes()]
     defn = definitions[op]
-    instruction_len = 1 # opcode counts
-    for w in defn.operand_widths:
-        instruction_len += w
+    widths = defn.operand_widths
+    if wordcode:
+        return make_words(op, widths, operands)
+    prefix = bytearray()
+    if len(widths) == 1 and len(operands) > 0:
+        bits = 8 * widths[0]
+        high = operands[0] >> bits
+        if high > 0:
+            ext = []
+            while high > 0:
+                ext.append(high & 0xff)
+                high >>= 8
+            for b in reversed(ext):
+                prefix += bytes((OpExtendedArg, b))
+            operands = (operands[0] & ((1 << bits) - 1),)
     # instruction byte size is opcode plus operand_widths (if any operands)
-    instruction = bytearray(instruction_len)
+    instruction = bytearray(1 + sum(widths))
     instruction[0] = op
-    if instruction_len >= 1:
-        offset = 1
-        # We can do almost all string operators with bytes w. exceptions:
-        # https://docs.python.org/3.3/library/stdtypes.html#bytes-methods
-        for i, o in enumerate(operands):
-            width = defn.operand_widths[i]
-            if width == 2:
-                instruction[offset:] = put_int_16(instruction[offset:], c_uint16(o).value)
-            offset += width
-    return instruction
+    offset = 1
+    for width, o in zip(widths, operands):
+        instruction[offset:offset + width] = o.to_bytes(width, byteorder='big')
+        offset += width
+    return prefix + instruction
+
+def make_words(op, widths, operands):
+    """
+    Encodes an instruction as wordcode, preceded by an OpExtendedArg word
+    for every OPERAND_BITS of its operand that do not fit in its own word.
+    Jump targets below 2**OPERAND_BITS words fit, so jumps can still be
+    patched in place.
+    """
+    operand = operands[0] if len(widths) == 1 and len(operands) > 0 else 0
+    words = array(WORDCODE_TYPECODE)
+    ext = []
+    high = operand >> OPERAND_BITS
+    while high > 0:
+        ext.append(high & OPERAND_MASK)
+        high >>= OPERAND_BITS
+    for chunk in reversed(ext):
+        words.append(OpExtendedArg | chunk << 8)
+    words.append(op | (operand & OPERAND_MASK) << 8)
+    return words
 
-def put_int_16(array, unint16):
+def new_instructions(wordcode=False):
     """
-    Constructs and returns a bytearray with the appropriate bytes 
-    representing an usigned int
+    Returns empty instructions in either format
     """
-    return bytearray((unint16).to_bytes(byte_size(unint16), byteorder='big'))
+    if wordcode:
+        return array(WORDCODE_TYPECODE)
+    return bytearray()
+
+def is_wordcode(ins):
+    return isinstance(ins, array)
 
-def byte_size(integer):
+def opcode_at(ins, pos):
     """
-    Returns the number of bytes required to represent the integer based on the
-    bit length of the integer (if only 1 byte needed, make default 2 bytes)
+    Returns the opcode of the instruction starting at pos, in either format
     """
-    byte_s = math.ceil(integer.bit_length() / 8)
-    return 2 if byte_s < 2 else byte_s
+    if is_wordcode(ins):
+        return ins[pos] & OPCODE_MASK
+    return ins[pos]
+
+def is_writable(ins):
+    """
+    Reports whether instructions can be rewritten in place
+    """
+    if isinstance(ins, memoryview):
+        return not ins.readonly
+    return isinstance(ins, (bytearray, array))
+
+def set_opcode(ins, pos, op):
+    """
+    Replaces the opcode of the instruction at pos, keeping its operand
+    """
+    if is_wordcode(ins):
+        ins[pos] = (ins[pos] & ~OPCODE_MASK) | op
+    else:
+        ins[pos] = op
 
 def bytes_to_int(ins):
     """
-    Converts bytes representing an integer to an integer
+    Converts big-endian bytes representing an unsigned integer to an integer
     """
-    concatted = ins[0]
-    i = 1
-    while i < len(ins):
-        concatted += ins[i]
-        i += 1
-    return c_uint16(concatted).value
+    return int.from_bytes(ins, byteorder='big')
 
 def read_operands(defn, ins):
     """
     Given the Definition of the instruction, and the instruction itself,
     this function reads operands portion of the instruction bytecode and 
     returns them along with the updated offset into the instruction.
+
+    For wordcode, ins starts at the instruction's own word, which also holds
+    the operand: it is returned as OPERAND_BITS // 8 big-endian bytes and
+    the offset is 0.
     """
-    operands = bytearray(len(defn.operand_widths))
+    if is_wordcode(ins):
+        operand = ins[0] >> 8 if len(defn.operand_widths) > 0 else 0
+        return bytearray(operand.to_bytes(OPERAND_BITS // 8, byteorder='big')), 0
+    operands = bytearray(sum(defn.operand_widths))
     offset = 0
-    for i, width in enumerate(defn.operand_widths):
-        if width == 2:
-            operands[i:i+width] = ins[offset:offset+width]
+    for width in defn.operand_widths:
+        operands[offset:offset+width] = ins[offset:offset+width]
         offset += width
     return operands, offset
+
+def decode(ins):
+    """
+    Yields (position, op, operand, next position) for every instruction, in
+    either format. OpExtendedArg prefixes are folded into the operand of the
+    instruction they extend, whose position is that of its first prefix.
+    The operand of an instruction with several operands is their bytes
+    taken together, and None for one without operands.
+    """
+    wordcode = is_wordcode(ins)
+    ip = 0
+    start = 0
+    ext = 0
+    while ip < len(ins):
+        if wordcode:
+            op = ins[ip] & OPCODE_MASK
+            operand = ins[ip] >> 8
+            bits = OPERAND_BITS
+            ip += 1
+        else:
+            op = ins[ip]
+            width = sum(definitions[op].operand_widths)
+            operand = bytes_to_int(ins[ip+1:ip+1+width])
+            bits = 8 * width
+            ip += 1 + width
+        operand |= ext << bits
+        if op == OpExtendedArg:
+            ext = operand
+            continue
+        if len(definitions[op].operand_widths) == 0:
+            operand = None
+        yield start, op, operand, ip
+        start = ip
+        ext = 0
@@ -0,0 +1,123 @@
+"""
+A directory of cached build results, in the spirit of __pycache__. Entries
+are files named by a key hashed from everything the result depends on;
+they are written atomically and the least recently used ones are removed
+once the directory grows past a size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+
+# Bump whenever the AST, macro expansion or the cached file formats change,
+# so results of older interpreters are not picked up
+VERSION = 2
+
+DIRECTORY = '__monkeycache__'
+MAX_BYTES = 64 * 1024 * 1024
+
+class Cache:
+
+    directory = None # path of the directory holding the entries
+    max_bytes = MAX_BYTES # size above which entries are evicted
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, *parts):
+        """
+        Hashes parts, bytes or strings, into a key that also covers VERSION
+        """
+        h = hashlib.sha256(str(VERSION).encode())
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            h.update(len(part).to_bytes(8, 'big'))
+            h.update(part)
+        return h.hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key, suffix):
+        """
+        Returns the path of the entry for key, marking it as recently used,
+        or None if there is no such entry
+        """
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def read(self, key, suffix):
+        """
+        Returns the contents of the entry for key or None
+        """
+        path = self.get(key, suffix)
+        if path == None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, suffix, data):
+        """
+        Stores data as the entry for key. The data is written to a temporary
+        file first and renamed into place, so readers never see a partial
+        entry. Failing to write is not an error, the result is just not
+        cached.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, self.path(key, suffix))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            return
+        self.evict()
+
+    def remove(self, key, suffix):
+        try:
+            os.unlink(self.path(key, suffix))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the directory holds at
+        most max_bytes
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+def for_script(path):
+    """
+    Returns the cache for the script at path, kept next to it
+    """
+    return Cache(os.path.join(os.path.dirname(os.path.abspath(path)), DIRECTORY))
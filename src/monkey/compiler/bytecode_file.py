@@ -0,0 +1,153 @@
+"""
+The .mnkc file format for compiled programs. A file holds a constant pool
+shared by one or more instruction sections, which are run one after
+another against the same globals, e.g. one section per top-level
+statement of a script.
+
+Layout, little-endian:
+    header      magic b'MNKC', format version (u16), reserved (u16),
+                constant count (u32), section count (u32), CRC-32 of the
+                rest of the file (u32)
+    constants   tag (u8), payload length (u32), payload, per constant
+    sections    length (u32), instructions, per section
+
+Constant payloads: an Integer is its value as signed bytes, a String its
+UTF-8 encoding, a CompiledFunction its instructions and a Quote the
+serialized arena of its node. Only bytearray instructions are stored, not
+wordcode.
+"""
+
+import mmap
+import struct
+import zlib
+from typing import NamedTuple
+from typing import List
+
+from monkey import object
+from monkey.ast import arena
+from monkey.code import code
+
+MAGIC = b'MNKC'
+FORMAT_VERSION = 2
+SUFFIX = '.mnkc'
+
+HEADER = struct.Struct('<4sHHIII')
+LENGTH = struct.Struct('<I')
+TAGGED_LENGTH = struct.Struct('<BI')
+
+TAG_INTEGER = 1
+TAG_STRING = 2
+TAG_FUNCTION = 3
+TAG_QUOTE = 4
+
+class CompiledProgram(NamedTuple):
+    constants: List[object.Object]
+    sections: list # instructions, bytearray or memoryview
+
+def dumps(program):
+    """
+    Serializes a CompiledProgram. Returns (bytes, None), or (None, error
+    message) if a constant cannot be stored.
+    """
+    parts = []
+    for constant in program.constants:
+        tag, payload, err = encode_constant(constant)
+        if err != None:
+            return None, err
+        parts.append(TAGGED_LENGTH.pack(tag, len(payload)))
+        parts.append(payload)
+    for instructions in program.sections:
+        if code.is_wordcode(instructions):
+            return None, 'cannot serialize wordcode instructions'
+        parts.append(LENGTH.pack(len(instructions)))
+        parts.append(bytes(instructions))
+    body = b''.join(parts)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(program.constants),
+        len(program.sections), zlib.crc32(body))
+    return header + body, None
+
+def encode_constant(constant):
+    if isinstance(constant, object.Integer):
+        value = constant.value
+        # macro expansion can leave e.g. a float in an Integer
+        if type(value) is not int:
+            return None, None, f'cannot serialize Integer holding {type(value)}'
+        return TAG_INTEGER, value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True), None
+    if isinstance(constant, object.String):
+        return TAG_STRING, constant.value.encode('utf-8'), None
+    if isinstance(constant, object.CompiledFunction):
+        if code.is_wordcode(constant.instructions):
+            return None, None, 'cannot serialize wordcode instructions'
+        return TAG_FUNCTION, bytes(constant.instructions), None
+    if isinstance(constant, object.Quote):
+        tree = arena.Arena()
+        tree.root = arena.encode(tree, constant.node)
+        return TAG_QUOTE, arena.dumps(tree), None
+    return None, None, f'cannot serialize constant: {type(constant)}'
+
+def loads(data):
+    """
+    Reads a CompiledProgram from bytes or any buffer. Instructions are
+    memoryviews into data, not copies. Returns (CompiledProgram, None), or
+    (None, error message) for data that is not a valid .mnkc file.
+    """
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        return None, 'truncated header'
+    magic, version, _, constant_count, section_count, crc = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        return None, 'not a .mnkc file'
+    if version != FORMAT_VERSION:
+        return None, f'unsupported .mnkc format version {version}'
+    if zlib.crc32(view[HEADER.size:]) != crc:
+        return None, 'checksum mismatch'
+    offset = HEADER.size
+    constants = []
+    try:
+        for _ in range(constant_count):
+            tag, length = TAGGED_LENGTH.unpack_from(view, offset)
+            offset += TAGGED_LENGTH.size
+            payload = view[offset:offset + length]
+            offset += length
+            constant, err = decode_constant(tag, payload)
+            if err != None:
+                return None, err
+            constants.append(constant)
+        sections = []
+        for _ in range(section_count):
+            length, = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            sections.append(view[offset:offset + length])
+            offset += length
+    except struct.error:
+        return None, 'truncated file'
+    if offset != len(view):
+        return None, 'wrong size'
+    return CompiledProgram(constants, sections), None
+
+def decode_constant(tag, payload):
+    if tag == TAG_INTEGER:
+        return object.Integer(value=int.from_bytes(payload, 'little', signed=True)), None
+    if tag == TAG_STRING:
+        return object.String(value=str(payload, 'utf-8')), None
+    if tag == TAG_FUNCTION:
+        return object.CompiledFunction(payload), None
+    if tag == TAG_QUOTE:
+        tree, err = arena.loads(payload)
+        if err != None:
+            return None, err
+        return object.Quote(tree.to_node()), None
+    return None, f'unknown constant tag {tag}'
+
+def load(path):
+    """
+    Memory-maps the .mnkc file at path and reads it, so instructions are
+    used straight from the mapping. Returns (CompiledProgram, None) or
+    (None, error message).
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        return None, str(e)
+    return loads(data)
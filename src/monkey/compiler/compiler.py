@@ -4,17 +4,24 @@ Monkey Compiler and Bytecode class definitions
 
 import sys
 sys.path.append("../../")
-from typing import NamedTuple
 from typing import List
 
 from monkey.ast import ast
 from monkey.object import *
 from monkey.code import code
 from monkey.compiler import symbol_table
+from monkey.compiler import superinstructions
+from monkey.evaluator.builtins import builtins
+from monkey.evaluator import quote_unquote
 
-class Bytecode(NamedTuple):
+class Bytecode:
     instructions: code.Instructions
     constants: List[Object]
+    sites = None # vm.Sites of the instructions, made by the first run needing them
+
+    def __init__(self, instructions, constants):
+        self.instructions = instructions
+        self.constants = constants
 
 class EmittedInstruction:
     opcode: bytes
@@ -39,19 +46,24 @@ class Compiler:
     constants: List[Integer]
     scopes: List[CompilationScope]
     scope_index: int
+    wordcode: bool = False # emit wordcode instead of bytearray instructions
+    superinstructions: bool = False # run the superinstruction pass on the output
 
-    def __init__(self, constants, sym_table, scopes, scope_index):
+    def __init__(self, constants, sym_table, scopes, scope_index, wordcode=False,
+            superinstructions=False):
         self.constants = constants
         self.sym_table = sym_table
         self.scopes = scopes
         self.scope_index = scope_index
+        self.wordcode = wordcode
+        self.superinstructions = superinstructions
     
     def current_instructions(self):
         return self.scopes[self.scope_index].instructions
     
     def enter_scope(self):
         scope = CompilationScope(
-            bytearray(),
+            code.new_instructions(self.wordcode),
             EmittedInstruction(None, 0), 
             EmittedInstruction(None, 0)
         )
@@ -89,7 +101,10 @@ class Compiler:
             else:
                 return f'unknown operator {node.operator}'
         elif isinstance(node, ast.BlockStatement):
-            for s in node.statements:
+            statements = node.statements
+            if isinstance(node, ast.LazyBlockStatement) and node.errors:
+                return "parse errors in function body: " + "; ".join(node.errors)
+            for s in statements:
                 err = self.compile(s)
                 if err != None:
                     return err
@@ -103,7 +118,10 @@ class Compiler:
             symbol = self.sym_table.resolve(node.value)
             if symbol == None:
                 return f"undefine variable {node.value}"
-            self.emit(code.OpGetGlobal, symbol.index)
+            if symbol.scope == symbol_table.BUILTIN_SCOPE:
+                self.emit(code.OpGetBuiltin, symbol.index)
+            else:
+                self.emit(code.OpGetGlobal, symbol.index)
         elif isinstance(node, ast.IfExpression):
             err = self.compile(node.condition)
             if err != None:
@@ -121,7 +139,9 @@ class Compiler:
             jump_pos = self.emit(code.OpJump, 9999)
             after_conseq_pos = len(self.current_instructions())
             # Make OpJumpNotTruthy jump right after OpJump
-            self.change_operand(jump_not_truthy_pos, after_conseq_pos)
+            err = self.change_operand(jump_not_truthy_pos, after_conseq_pos)
+            if err != None:
+                return err
             # Handle alternative if there is one, otherwise emit OpNull
             if node.alternative == None:
                 self.emit(code.OpNull)
@@ -134,7 +154,9 @@ class Compiler:
                     self.remove_last_pop()
             # Patch operand of OpJump
             after_alternative_pos = len(self.current_instructions())
-            self.change_operand(jump_pos, after_alternative_pos)
+            err = self.change_operand(jump_pos, after_alternative_pos)
+            if err != None:
+                return err
         elif isinstance(node, ast.InfixExpression):
             # treat < as a special case by compiling right operand
             # before the left operand and simply work with OpGreaterThan
@@ -206,6 +228,17 @@ class Compiler:
             if err != None:
                 return err
             self.emit(code.OpIndex)
+        elif isinstance(node, ast.AssignIndexStatement):
+            err = self.compile(node.left)
+            if err != None:
+                return err
+            err = self.compile(node.index)
+            if err != None:
+                return err
+            err = self.compile(node.value)
+            if err != None:
+                return err
+            self.emit(code.OpSetIndex)
         elif isinstance(node, ast.FunctionLiteral):
             self.enter_scope()
             err = self.compile(node.body)
@@ -215,7 +248,7 @@ class Compiler:
                 self.replace_last_pop_with_return() 
             if not self.last_instruction_is(code.OpReturnValue):
                 self.emit(code.OpReturn)
-            instructions = self.leave_scope()
+            instructions = self.finished(self.leave_scope())
             compiled_fn = CompiledFunction(instructions)
             self.emit(code.OpConstant, self.add_constant(compiled_fn))
         elif isinstance(node, ast.ReturnStatement):
@@ -224,15 +257,35 @@ class Compiler:
                 return err
             self.emit(code.OpReturnValue)
         elif isinstance(node, ast.CallExpression):
+            if node.function.token_literal() == "quote":
+                if len(node.arguments) != 1:
+                    return f'wrong number of arguments to quote: got={len(node.arguments)}, want=1'
+                return self.compile_quote(node.arguments[0])
             err = self.compile(node.function)
             if err != None:
                 return err
-            self.emit(code.OpCall)
+            for a in node.arguments:
+                err = self.compile(a)
+                if err != None:
+                    return err
+            self.emit(code.OpCall, len(node.arguments))
+        return None
+
+    def compile_quote(self, quoted):
+        """
+        Pushes the values of the unquote calls in quoted, in the order of
+        their paths, and emits OpQuote to splice them into a copy of it
+        """
+        for path in quote_unquote.site_paths(quoted):
+            err = self.compile(quote_unquote.at(quoted, path).arguments[0])
+            if err != None:
+                return err
+        self.emit(code.OpQuote, self.add_constant(Quote(quoted)))
         return None
 
     def replace_last_pop_with_return(self):
         last_pos = self.scopes[self.scope_index].last_instruction.position
-        self.replace_instruction(last_pos, code.Make(code.OpReturnValue))
+        self.replace_instruction(last_pos, code.Make(code.OpReturnValue, wordcode=self.wordcode))
         self.scopes[self.scope_index].last_instruction.opcode = code.OpReturnValue
 
     def last_instruction_is(self, op):
@@ -261,7 +314,7 @@ class Compiler:
         Generate code for the given instruction based on opcode and operands
         and returnt the position
         """
-        ins = code.Make(op, *operands)
+        ins = code.Make(op, *operands, wordcode=self.wordcode)
         pos = self.add_instruction(ins)
         self.set_last_instruction(op, pos)
         return pos
@@ -277,10 +330,14 @@ class Compiler:
     
     def change_operand(self, pos, operand):
         """
-        Changes the old operand of an instruction to a new operand
+        Changes the old operand of an instruction to a new operand. Returns an
+        error if the new operand would need OpExtendedArg prefixes, since the
+        instruction is patched in place.
         """
-        op = self.current_instructions()[pos]
-        new_instruction = code.Make(op, operand)
+        op = code.opcode_at(self.current_instructions(), pos)
+        new_instruction = code.Make(op, operand, wordcode=self.wordcode)
+        if len(new_instruction) != len(code.Make(op, 0, wordcode=self.wordcode)):
+            return f'operand {operand} does not fit in {code.definitions[op].name} at {pos}'
         self.replace_instruction(pos, new_instruction)
     
     def replace_instruction(self, pos, new_instruction):
@@ -299,33 +356,53 @@ class Compiler:
         Add an instruction and return its position in the instructions bytearray
         """
         pos_new_instruction = len(self.current_instructions())
-        updated_instructions = self.current_instructions() + ins
-        # print(updated_instructions, type(updated_instructions), type(self.scopes[self.scope_index].instructions))
-        self.scopes[self.scope_index].instructions = updated_instructions
+        # extend in place, copying the whole scope on every emit made large
+        # programs quadratic to compile
+        self.scopes[self.scope_index].instructions += ins
         return pos_new_instruction
     
+    def finished(self, instructions):
+        """
+        Returns the instructions of a completely compiled scope as they are
+        run, after the superinstruction pass if enabled
+        """
+        if self.superinstructions:
+            return superinstructions.fuse(instructions)
+        return instructions
+
     def bytecode(self):
         """
         Return a bytecode representation of all instructions and the constant
         pool.
         """
-        return Bytecode(self.current_instructions(), self.constants)
+        return Bytecode(self.finished(self.current_instructions()), self.constants)
 
-def new():
+def new(wordcode=False, superinstructions=False):
     main_scope = CompilationScope(
-        bytearray(),
+        code.new_instructions(wordcode),
         EmittedInstruction(None, 0), 
         EmittedInstruction(None, 0)
     )
+    sym_table = symbol_table.new_symbol_table()
+    define_builtins(sym_table)
     return Compiler(
         [], 
-        symbol_table.new_symbol_table(),
+        sym_table,
         [main_scope],
-        0
+        0,
+        wordcode,
+        superinstructions
     )
 
-def new_with_state(sym_table, constants):
-    compiler = new()
+def define_builtins(sym_table):
+    """
+    Makes the builtin functions resolvable through the given symbol table
+    """
+    for i, name in enumerate(builtins):
+        sym_table.define_builtin(i, name)
+
+def new_with_state(sym_table, constants, wordcode=False, superinstructions=False):
+    compiler = new(wordcode, superinstructions)
     compiler.sym_table = sym_table
     compiler.constants = constants
     return compiler
\ No newline at end of file
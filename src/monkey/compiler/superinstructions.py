@@ -0,0 +1,70 @@
+"""
+The superinstruction pass: rewrites compiled instructions so that each
+sequence listed in code.superinstructions runs as a single instruction
+"""
+
+from monkey.code import code
+
+# (first op, second op) -> the superinstruction for the pair
+PAIRS = {parts: op for op, parts in code.superinstructions.items()}
+
+JUMPS = {code.OpJump, code.OpJumpNotTruthy, code.OpGreaterThanJumpNotTruthy}
+
+def fuse(instructions):
+    """
+    Returns a copy of instructions with superinstructions in place of the
+    sequences they stand for, and jump targets moved to match. A pair is
+    left alone if a jump lands on its second instruction or an operand does
+    not fit the superinstruction. Wordcode is returned as it is, since its
+    words hold a single operand.
+    """
+    if code.is_wordcode(instructions):
+        return instructions
+    decoded = list(code.decode(instructions))
+    targets = {operand for _, op, operand, _ in decoded if op in JUMPS}
+    out = bytearray()
+    moved = {} # old position -> new position
+    jumps = [] # (new position, op, old target)
+    i = 0
+    while i < len(decoded):
+        pos, op, operand, end = decoded[i]
+        moved[pos] = len(out)
+        fused = None
+        if i + 1 < len(decoded):
+            fused = fusion(decoded[i], decoded[i + 1], targets)
+        if fused != None:
+            op, operands = fused
+            if op in JUMPS:
+                jumps.append((len(out), op, operands[0]))
+            out += code.Make(op, *operands)
+            i += 2
+            continue
+        if op in JUMPS:
+            jumps.append((len(out), op, operand))
+            out += code.Make(op, operand)
+        else:
+            out += instructions[pos:end]
+        i += 1
+    moved[len(instructions)] = len(out)
+    for pos, op, target in jumps:
+        # jump operands are wide enough to never need prefixes, so they are
+        # patched in place
+        ins = code.Make(op, moved[target])
+        out[pos:pos + len(ins)] = ins
+    return out
+
+def fusion(first, second, targets):
+    """
+    Returns the superinstruction and its operands replacing the decoded
+    instructions first and second, or None if they cannot be fused
+    """
+    _, op, operand, _ = first
+    pos, next_op, next_operand, _ = second
+    fused = PAIRS.get((op, next_op))
+    if fused == None or pos in targets:
+        return None
+    operands = [o for o in (operand, next_operand) if o != None]
+    for o, width in zip(operands, code.definitions[fused].operand_widths):
+        if o >= 1 << (8 * width):
+            return None
+    return fused, operands
@@ -2,6 +2,7 @@ from typing import NamedTuple
 from typing import Dict
 
 GLOBAL_SCOPE = "GLOBAL"
+BUILTIN_SCOPE = "BUILTIN"
 
 class Symbol(NamedTuple):
     name: str
@@ -22,6 +23,11 @@ class SymbolTable:
         self.store[name] = symbol
         self.num_definitions += 1
         return symbol
+
+    def define_builtin(self, index, name):
+        symbol = Symbol(name=name, index=index, scope=BUILTIN_SCOPE)
+        self.store[name] = symbol
+        return symbol
     
     def resolve(self, name):
         symbol = self.store[name] if name in self.store else None
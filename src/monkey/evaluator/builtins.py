@@ -1,4 +1,5 @@
 from monkey.object import *
+from monkey.object import vector
 from monkey import evaluator
 
 def _len(*args):
@@ -10,6 +11,10 @@ def _len(*args):
         return Integer(len(arg.elements))
     elif isinstance(arg, String):
         return Integer(len(arg.value))
+    elif isinstance(arg, Vector):
+        return Integer(vector.length(arg))
+    elif isinstance(arg, Set):
+        return Integer(arg.length())
     return evaluator.new_error(f"argument to `len` not supported, got {arg.object_type()}")  
 
 def _first(*args):
@@ -65,11 +70,161 @@ def _puts(*args):
             print(a.inspect())
     return None
 
+def _vec(*args):
+    arguments = args[0]
+    if len(arguments) != 1:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=1")
+    arg = arguments[0]
+    if isinstance(arg, Vector):
+        return arg
+    elif not isinstance(arg, Array):
+        return evaluator.new_error(f"argument to `vec` must be ARRAY, got {arg.object_type()}")
+    vec = vector.from_array(arg)
+    if vec == None:
+        return evaluator.new_error("argument to `vec` must only contain INTEGER elements")
+    return vec
+
+def _varray(*args):
+    arguments = args[0]
+    if len(arguments) != 1:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=1")
+    arg = arguments[0]
+    if not isinstance(arg, Vector):
+        return evaluator.new_error(f"argument to `varray` must be VECTOR, got {arg.object_type()}")
+    return vector.to_array(arg)
+
+def _vsum(*args):
+    arguments = args[0]
+    if len(arguments) != 1:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=1")
+    arg = arguments[0]
+    if not isinstance(arg, Vector):
+        return evaluator.new_error(f"argument to `vsum` must be VECTOR, got {arg.object_type()}")
+    return Integer(vector.total(arg))
+
+def _vmean(*args):
+    arguments = args[0]
+    if len(arguments) != 1:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=1")
+    arg = arguments[0]
+    if not isinstance(arg, Vector):
+        return evaluator.new_error(f"argument to `vmean` must be VECTOR, got {arg.object_type()}")
+    mean = vector.mean(arg)
+    if mean == None:
+        return NULL
+    return Integer(mean)
+
+def _vdot(*args):
+    arguments = args[0]
+    if len(arguments) != 2:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=2")
+    left, right = arguments
+    if not isinstance(left, Vector) or not isinstance(right, Vector):
+        return evaluator.new_error(f"arguments to `vdot` must be VECTOR, got {left.object_type()} and {right.object_type()}")
+    result, err = vector.dot(left, right)
+    if err != None:
+        return evaluator.new_error(err)
+    return Integer(result)
+
+def _vmap_add(*args):
+    arguments = args[0]
+    if len(arguments) != 2:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=2")
+    if not isinstance(arguments[0], Vector):
+        return evaluator.new_error(f"first argument to `vmap_add` must be VECTOR, got {arguments[0].object_type()}")
+    result, err = vector.binary_operation('+', arguments[0], arguments[1])
+    if err != None:
+        return evaluator.new_error(err)
+    return result
+
+def _vmul(*args):
+    arguments = args[0]
+    if len(arguments) != 2:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=2")
+    if not isinstance(arguments[0], Vector):
+        return evaluator.new_error(f"first argument to `vmul` must be VECTOR, got {arguments[0].object_type()}")
+    result, err = vector.binary_operation('*', arguments[0], arguments[1])
+    if err != None:
+        return evaluator.new_error(err)
+    return result
+
+def _vslice(*args):
+    arguments = args[0]
+    if len(arguments) != 3:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=3")
+    vec, start, end = arguments
+    if not isinstance(vec, Vector):
+        return evaluator.new_error(f"first argument to `vslice` must be VECTOR, got {vec.object_type()}")
+    if not isinstance(start, Integer) or not isinstance(end, Integer):
+        return evaluator.new_error(f"bounds of `vslice` must be INTEGER, got {start.object_type()} and {end.object_type()}")
+    return vector.slice_vector(vec, start.value, end.value)
+
+def _set(*args):
+    arguments = args[0]
+    if len(arguments) != 1:
+        return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=1")
+    arg = arguments[0]
+    if not isinstance(arg, Array):
+        return evaluator.new_error(f"argument to `set` must be ARRAY, got {arg.object_type()}")
+    for e in arg.elements:
+        if not callable(getattr(e, 'hash_key', None)):
+            return evaluator.new_error(f"unusable as set element: {e.object_type()}")
+    return new_set(arg.elements)
+
+def _set_element_builtin(name, operation):
+    """
+    Creates a builtin taking a SET and a hashable element, e.g. has(s, x)
+    """
+    def builtin(*args):
+        arguments = args[0]
+        if len(arguments) != 2:
+            return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=2")
+        s, element = arguments
+        if not isinstance(s, Set):
+            return evaluator.new_error(f"first argument to `{name}` must be SET, got {s.object_type()}")
+        if not callable(getattr(element, 'hash_key', None)):
+            return evaluator.new_error(f"unusable as set element: {element.object_type()}")
+        return operation(s, element)
+    return builtin
+
+def _set_set_builtin(name, operation):
+    """
+    Creates a builtin taking two SETs, e.g. union(a, b)
+    """
+    def builtin(*args):
+        arguments = args[0]
+        if len(arguments) != 2:
+            return evaluator.new_error(f"wrong number of arguments. got={len(arguments)}, want=2")
+        left, right = arguments
+        if not isinstance(left, Set) or not isinstance(right, Set):
+            return evaluator.new_error(f"arguments to `{name}` must be SET, got {left.object_type()} and {right.object_type()}")
+        return operation(left, right)
+    return builtin
+
 builtins = {
     'len': object.Builtin(_len),
     'first': object.Builtin(_first),
     'last': object.Builtin(_last),
     'push': object.Builtin(_push),
     'rest': object.Builtin(_rest),
-    'puts': object.Builtin(_puts)
-}
\ No newline at end of file
+    'puts': object.Builtin(_puts),
+    'vec': object.Builtin(_vec),
+    'varray': object.Builtin(_varray),
+    'vsum': object.Builtin(_vsum),
+    'vmean': object.Builtin(_vmean),
+    'vdot': object.Builtin(_vdot),
+    'vmap_add': object.Builtin(_vmap_add),
+    'vmul': object.Builtin(_vmul),
+    'vslice': object.Builtin(_vslice),
+    'set': object.Builtin(_set),
+    'has': object.Builtin(_set_element_builtin('has', 
+        lambda s, e: TRUE if s.contains(e) else FALSE)),
+    'add': object.Builtin(_set_element_builtin('add', Set.add)),
+    'remove': object.Builtin(_set_element_builtin('remove', Set.remove)),
+    'union': object.Builtin(_set_set_builtin('union', Set.union)),
+    'intersection': object.Builtin(_set_set_builtin('intersection', Set.intersection)),
+    'difference': object.Builtin(_set_set_builtin('difference', Set.difference))
+}
+
+# The compiler and vm refer to builtins by their position in this list
+builtin_list = list(builtins.values())
\ No newline at end of file
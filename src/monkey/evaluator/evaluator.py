@@ -1,5 +1,6 @@
 from monkey import ast
 from monkey.object import *
+from monkey.object import vector
 from .builtins import *
 from monkey.evaluator.quote_unquote import *
 
@@ -57,6 +58,8 @@ def Eval(node, env):
         if is_error(val):
             return val
         env.set_name(node.name.value, val)
+    elif isinstance(node, ast.AssignIndexStatement):
+        return eval_assign_index_statement(node, env)
     elif isinstance(node, ast.Identifier):
         return eval_identifier(node, env)
     elif isinstance(node, ast.FunctionLiteral):
@@ -122,7 +125,10 @@ def unwrapped_return_value(obj):
 
 def eval_block_statement(block, env):
     result = Object()
-    for statement in block.statements:
+    statements = block.statements
+    if isinstance(block, ast.LazyBlockStatement) and block.errors:
+        return new_error("parse errors in function body: " + "; ".join(block.errors))
+    for statement in statements:
         result = Eval(statement, env)
         if result != None:
             rt = result.object_type()
@@ -155,6 +161,8 @@ def eval_minus_prefix_operator(right):
 def eval_infix_expression(operator, left, right):
     if left.object_type() == INTEGER_OBJ and right.object_type() == INTEGER_OBJ:
         return eval_integer_infix_expression(operator, left, right)
+    elif left.object_type() == VECTOR_OBJ or right.object_type() == VECTOR_OBJ:
+        return eval_vector_infix_expression(operator, left, right)
     elif operator == "==":
         return native_boolean_object(left == right)
     elif operator == "!=":
@@ -186,6 +194,14 @@ def eval_integer_infix_expression(operator, left, right):
         return native_boolean_object(left_val != right_val)
     return new_error(f"unknown operator: {left.object_type()} {operator} {right.object_type()}")
 
+def eval_vector_infix_expression(operator, left, right):
+    if operator == "==" or operator == "!=":
+        return native_boolean_object((left == right) == (operator == "=="))
+    result, err = vector.binary_operation(operator, left, right)
+    if err != None:
+        return new_error(err)
+    return result
+
 def eval_string_infix_expression(operator, left, right):
     if operator != "+":
         return new_error(f"unknown operator: {left.object_type()} {operator} {right.object_type()}")
@@ -198,10 +214,42 @@ def eval_index_expression(left, index):
         return eval_array_index_expression(left, index)
     elif left.object_type() == HASH_OBJ:
         return eval_hash_index_expression(left, index)
+    elif left.object_type() == VECTOR_OBJ and index.object_type() == INTEGER_OBJ:
+        element = vector.index(left, index.value)
+        return element if element != None else NULL
     return new_error(f"index operator not supported: {left.object_type()}")
 
+def eval_assign_index_statement(node, env):
+    left = Eval(node.left, env)
+    if is_error(left):
+        return left
+    index = Eval(node.index, env)
+    if is_error(index):
+        return index
+    value = Eval(node.value, env)
+    if is_error(value):
+        return value
+    if left.object_type() == ARRAY_OBJ and index.object_type() == INTEGER_OBJ:
+        elements = left.elements
+        idx = index.value
+        # assigning right past the end appends, so tables can be grown in place
+        if idx == len(elements):
+            elements.append(value)
+        elif 0 <= idx < len(elements):
+            elements[idx] = value
+        else:
+            return new_error(f"index out of range: {idx}")
+        return None
+    elif left.object_type() == HASH_OBJ:
+        if not callable(getattr(index, 'hash_key', None)):
+            return new_error(f"unusable as hash key: {index.object_type()}")
+        left.set(index, value)
+        return None
+    return new_error(f"index assignment not supported: {left.object_type()}")
+
 def eval_hash_literal(node, env):
-    pairs = {}
+    keys = []
+    values = []
     for key_node, value_node in node.pairs.items():
         key = Eval(key_node, env)
         if is_error(key):
@@ -211,19 +259,16 @@ def eval_hash_literal(node, env):
         value = Eval(value_node, env)
         if is_error(value):
             return value
-        hashed = key.hash_key()
-        pairs[hashed] = HashPair(key, value)
-    return Hash(pairs)
+        keys.append(key)
+        values.append(value)
+    return new_hash(keys, values)
 
 def eval_hash_index_expression(hash, index):
     hash_object = hash
     if not callable(getattr(index, 'hash_key', None)):
         return new_error(f"unusable as hash key: {index.object_type()}")
-    pair = NULL
-    key = index.hash_key()
-    if key in hash_object.pairs:
-        pair = hash_object.pairs[key]
-    return pair.value if pair != NULL else pair
+    value = hash_object.get(index)
+    return value if value != None else NULL
 
 def eval_array_index_expression(array, index):
     array_object = array
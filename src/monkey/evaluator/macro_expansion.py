@@ -2,26 +2,145 @@
 Functions to assist in finding macros and expanding them
 """
 
+import sys
+from collections import OrderedDict
+
 from monkey import ast
 from monkey import object
 from monkey import evaluator as e
+from monkey import compiler
+from monkey import vm
+from monkey.common import utilities
+
+class ExpansionCache:
+    """
+    Remembers macro expansions, least recently used first, keyed by the
+    environment the macros were looked up in, the Macro object and the
+    ast.structural_key of its argument nodes, so a call repeated with the
+    same argument ASTs is a hit; redefining a macro makes a new Macro
+    object, whose calls miss. Cached trees are copied on the way in and
+    out, as callers modify the expansions they get.
+
+    A hit skips running the macro body, so the cache is only for pure
+    macros: ones whose expansion depends only on their arguments, and that
+    have no side effects such as puts or index assignments. Caches are
+    made per session, which opts in to them.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, env, macro, arguments):
+        """
+        Returns a copy of the expansion of macro, found in env, for
+        arguments, or None
+        """
+        key = (env, macro, ast.structural_key(arguments))
+        node = self.entries.get(key)
+        if node == None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return ast.Copy(node)
+
+    def put(self, env, macro, arguments, node):
+        key = (env, macro, ast.structural_key(arguments))
+        self.entries[key] = ast.Copy(node)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
 
-def ExpandMacros(program, env):
+def ExpandMacros(program, env, cache=None, use_vm=False):
+    """
+    Expands the macro calls of program in place. Only top-level statements
+    calling a macro are visited, which makes programs without macros cost
+    next to nothing. Given an ExpansionCache, which assumes pure macros,
+    expansions are looked up in it first; by default every macro body runs.
+    With use_vm, macro bodies are compiled and run on the VM instead of
+    being evaluated; a body the VM cannot compile or run is evaluated after
+    all.
+    """
+    names = macro_names(env)
+    if len(names) == 0:
+        return program
     def modifier(node):
         call_expression = node
         if not isinstance(call_expression, ast.CallExpression):
             return node
+        if not isinstance(call_expression.function, ast.Identifier) \
+                or call_expression.function.value not in names:
+            return node
         macro = is_macro_call(call_expression, env)
         if not macro:
             return node 
+        if cache != None:
+            expansion = cache.get(env, macro, call_expression.arguments)
+            if expansion != None:
+                return expansion
         args = quote_args(call_expression)
-        eval_env = extend_macro_env(macro, args)
-        evaluated = e.Eval(macro.body, eval_env)
-        quote = evaluated
+        quote = None
+        if use_vm:
+            quote, _ = run_macro(macro, args)
+        if quote == None:
+            eval_env = extend_macro_env(macro, args)
+            quote = e.Eval(macro.body, eval_env)
         if not isinstance(quote, object.Quote):
             sys.exit('we only support returning AST-nodes from macros')
+        if cache != None and quote.node != None:
+            cache.put(env, macro, call_expression.arguments, quote.node)
         return quote.node
-    return ast.Modify(program, modifier)
+    def skip(node):
+        # function bodies not parsed yet only need parsing if they may call a macro
+        return isinstance(node, ast.LazyBlockStatement) and not node.is_parsed() \
+            and not node.mentions(names)
+    for i in macro_call_statements(program, names, skip):
+        program.statements[i] = ast.Modify(program.statements[i], modifier, skip)
+    return program
+
+def macro_call_statements(program, names, skip):
+    """
+    Returns the indexes of the top-level statements that may call one of
+    the macros in names, from the call sites the parser recorded or else
+    from a scan of the program
+    """
+    sites = getattr(program, 'call_sites', None)
+    if sites != None:
+        indexes = set(sites.get(None, ()))
+        for name in names:
+            indexes.update(sites.get(name, ()))
+        return sorted(indexes)
+    indexes = []
+    for i, statement in enumerate(program.statements):
+        for node in ast.Walk(statement, skip):
+            if isinstance(node, ast.CallExpression) and isinstance(node.function, ast.Identifier) \
+                    and node.function.value in names:
+                indexes.append(i)
+                break
+    return indexes
+
+def macro_names(env):
+    """
+    Collects the names bound to macros in env and its enclosing environments
+    """
+    names = set()
+    while env != None:
+        for name, obj in env.store.items():
+            if isinstance(obj, object.Macro):
+                names.add(name)
+        env = env.outer
+    return names
 
 def is_macro_call(exp, env):
     identifier = exp.function
@@ -47,18 +166,63 @@ def extend_macro_env(macro, args):
         extended.set_name(p.value, args[pidx])
     return extended
 
+def compile_macro(macro):
+    """
+    Compiles the body of macro for the VM, its parameters being its first
+    globals. Returns (Bytecode, globals) or (None, error message).
+    """
+    comp = compiler.new(superinstructions=True)
+    for p in macro.parameters:
+        comp.sym_table.define(p.value)
+    err = comp.compile(macro.body)
+    if err != None:
+        return None, err
+    return (comp.bytecode(), utilities.make_list(comp.sym_table.num_definitions)), None
+
+def run_macro(macro, args):
+    """
+    Runs the compiled body of macro with the given Quote arguments and
+    returns (its value, None), or (None, error message) if the body cannot
+    be compiled, e.g. for defining a function, or fails on the VM. A body
+    that failed to compile is not compiled again.
+    """
+    if macro.compile_error != None:
+        return None, macro.compile_error
+    if macro.compiled == None:
+        compiled, err = compile_macro(macro)
+        if err != None:
+            macro.compile_error = f'compiling macro failed: {err}'
+            return None, macro.compile_error
+        macro.compiled = compiled
+    bytecode, global_vars = macro.compiled
+    for i, arg in enumerate(args):
+        global_vars[i] = arg
+    machine = vm.new_with_global_store(bytecode, global_vars)
+    err = machine.run()
+    if err != None:
+        return None, f'running macro failed: {err}'
+    return machine.last_popped_stack_element(), None
+
 def DefineMacros(program, env):
-    definitions = []
+    """
+    Adds the macros defined at the top level of program to env and removes
+    their definitions from it in a single pass
+    """
+    statements = []
+    new_index = {}
     for i, statement in enumerate(program.statements):
         if is_macro_definition(statement):
             add_macro(statement, env)
-            definitions.append(i)
-
-    for i in definitions[::-1]:
-        definition_index = i
-        program.statements = \
-            program.statements[:definition_index] \
-            + program.statements[definition_index+1:]
+        else:
+            new_index[i] = len(statements)
+            statements.append(statement)
+    if len(statements) == len(program.statements):
+        return
+    program.statements = statements
+    sites = getattr(program, 'call_sites', None)
+    if sites != None:
+        program.call_sites = {name: [new_index[i] for i in indexes if i in new_index]
+            for name, indexes in sites.items()}
 
 def is_macro_definition(node):
     let_statement = node
@@ -2,32 +2,134 @@
 Functions to create Quote objects and evaluate unquotes
 """
 
+from collections import OrderedDict
+
 from monkey import ast
+from monkey.ast import modify
 from monkey import object
 from monkey import evaluator
 from monkey.tokens import token
 
+# id of a quoted node -> (node, paths to its unquote calls), least recently
+# used first and at most UNQUOTE_SITES_SIZE of them; the node is kept so its
+# id cannot be reused by another node while the entry lives. The compiler
+# uses the same paths, so its OpQuote operands line up with them.
+UNQUOTE_SITES_SIZE = 1024
+unquote_sites = OrderedDict()
+
 def quote(node, env):
-    node = eval_unquote_calls(node, env)
-    return object.Quote(node)
-
-def eval_unquote_calls(quoted, env):
-    def modifier(node):
-        # TODO make variables more explicit here
-        if not is_unquote_call(node):
-            return node
-        if not isinstance(node, ast.CallExpression):
-            return node
-        if len(node.arguments) != 1:
-            return node
-        unquoted = evaluator.Eval(node.arguments[0], env)
-        return convert_object_to_astnode(unquoted)
-    return ast.Modify(quoted, modifier)
+    paths = site_paths(node)
+    values = [unquote(at(node, path), env) for path in paths]
+    return fill(node, paths, values)
+
+def site_paths(node):
+    """
+    Returns the paths to the unquote calls under a quoted node, working
+    them out unless the node was seen lately
+    """
+    site = unquote_sites.get(id(node))
+    if site == None or site[0] is not node:
+        site = (node, unquote_paths(node))
+        unquote_sites[id(node)] = site
+        if len(unquote_sites) > UNQUOTE_SITES_SIZE:
+            unquote_sites.popitem(last=False)
+    unquote_sites.move_to_end(id(node))
+    return site[1]
+
+def fill(node, paths, values):
+    """
+    Returns a Quote of a copy of node with the unquote call at each path
+    replaced by the matching value, an AST node. Unquotes are replaced in a
+    copy, so the quoted code (e.g. a macro body) can be evaluated again.
+    """
+    return object.Quote(splice(ast.Copy(node), paths, values))
+
+def unquote_paths(node):
+    """
+    Returns the paths from node to the unquote calls under it, in the order
+    Modify visits them. A path is a list of (field, index) steps: index is
+    None for a single node field, else the position in the list field or
+    in the keys and values of a hash, taken alternately.
+    """
+    paths = []
+    stack = [(node, [])]
+    while len(stack) > 0:
+        node, path = stack.pop()
+        if node == None:
+            continue
+        if is_unquote_call(node):
+            paths.append(path)
+            continue
+        children = []
+        for name, kind in modify.fields_of(type(node)):
+            value = getattr(node, name)
+            if kind == modify.NODE:
+                children.append((value, path + [(name, None)]))
+            elif kind == modify.LIST:
+                if value != None:
+                    for i, child in enumerate(value):
+                        children.append((child, path + [(name, i)]))
+            else:
+                for i, child in enumerate(pair_items(value)):
+                    children.append((child, path + [(name, i)]))
+        stack.extend(reversed(children))
+    return paths
+
+def pair_items(pairs):
+    items = []
+    for k, v in pairs.items():
+        items.append(k)
+        items.append(v)
+    return items
+
+def splice(root, paths, nodes):
+    """
+    Puts each node in place of whatever is at its path under root, returning
+    the new root. Every path is followed before anything is replaced, and
+    each hash is rebuilt once with all its replacements: a replaced key may
+    equal another one, merging their pairs and moving the rest.
+    """
+    targets = [(at(root, path[:-1]), path[-1]) for path in paths if len(path) > 0]
+    if len(targets) < len(paths):
+        # the unquote call is the root itself, and the only one
+        return nodes[0]
+    hashes = {} # id of a hash -> (parent, field, its keys and values)
+    for (parent, (name, i)), node in zip(targets, nodes):
+        value = getattr(parent, name)
+        if i == None:
+            setattr(parent, name, node)
+        elif isinstance(value, dict):
+            if id(value) not in hashes:
+                hashes[id(value)] = (parent, name, pair_items(value))
+            hashes[id(value)][2][i] = node
+        else:
+            value[i] = node
+    for parent, name, items in hashes.values():
+        setattr(parent, name, {items[k]: items[k + 1] for k in range(0, len(items), 2)})
+    return root
+
+def at(root, path):
+    """
+    Returns the node at path under root
+    """
+    node = root
+    for name, i in path:
+        value = getattr(node, name)
+        if i == None:
+            node = value
+        elif isinstance(value, dict):
+            node = pair_items(value)[i]
+        else:
+            node = value[i]
+    return node
+
+def unquote(call, env):
+    return convert_object_to_astnode(evaluator.Eval(call.arguments[0], env))
 
 def is_unquote_call(node):
     if not isinstance(node, ast.CallExpression):
-        return node
-    return node.function.token_literal() == "unquote"
+        return False
+    return node.function.token_literal() == "unquote" and len(node.arguments) == 1
 
 def convert_object_to_astnode(obj):
     if isinstance(obj, object.Integer):
@@ -39,8 +141,24 @@ def convert_object_to_astnode(obj):
         else:
             t = token.Token(Type=token.FALSE, Literal='false')
         return ast.Boolean(t, obj.value)
+    if isinstance(obj, object.String):
+        t = token.Token(Type=token.STRING, Literal=obj.value)
+        return ast.StringLiteral(t, obj.value)
+    if isinstance(obj, object.Array):
+        elements = [convert_object_to_astnode(element) for element in obj.elements]
+        if None in elements:
+            return None
+        return ast.ArrayLiteral(token.Token(Type=token.LBRACKET, Literal='['), elements)
+    if isinstance(obj, object.Hash):
+        pairs = {}
+        for key, value in obj.items():
+            key = convert_object_to_astnode(key)
+            value = convert_object_to_astnode(value)
+            if key == None or value == None:
+                return None
+            pairs[key] = value
+        return ast.HashLiteral(token.Token(Type=token.LBRACE, Literal='{'), pairs)
     if isinstance(obj, object.Quote):
         # Quote already has the ASTNode object so just return it!
         return obj.node
     return None
-        
\ No newline at end of file
@@ -1,3 +1,7 @@
+import codecs
+import re
+from array import array
+from bisect import bisect_right
 from monkey.tokens import token
 from monkey import ast
 
@@ -134,4 +138,295 @@ def new_token(token_type, ch):
 def new(source):
     l = Lexer(source)
     l.read_char()
-    return l
\ No newline at end of file
+    return l
+
+# Number of characters (or bytes) read at a time by the streaming lexer
+CHUNK_SIZE = 1 << 16
+
+# A single master pattern matching one token (after any leading whitespace)
+# per match. Alternatives mirror Lexer.next_token: identifiers are letters and
+# underscores only, strings run to the closing quote or the end of the source,
+# and any other single non-whitespace character is ILLEGAL.
+TOKEN_PATTERN = re.compile(r'''
+    [ \t\n\r]*
+    (?:
+        (?P<ident>[A-Za-z_]+)
+      | (?P<int>[0-9]+)
+      | "(?P<string>[^"]*)"?
+      | (?P<op>==|!=|[-=+!/*<>;:,{}()\[\]])
+      | (?P<illegal>[^ \t\n\r])
+    )''', re.VERBOSE)
+
+# Tokens whose literal is fixed are immutable, so they are created only once
+OPERATOR_TOKENS = {
+    '=': token.Token(token.ASSIGN, '='),
+    '==': token.Token(token.EQ, '=='),
+    '!=': token.Token(token.NOT_EQ, '!='),
+    '+': token.Token(token.PLUS, '+'),
+    '-': token.Token(token.MINUS, '-'),
+    '!': token.Token(token.BANG, '!'),
+    '/': token.Token(token.SLASH, '/'),
+    '*': token.Token(token.ASTERISK, '*'),
+    '<': token.Token(token.LT, '<'),
+    '>': token.Token(token.GT, '>'),
+    ';': token.Token(token.SEMICOLON, ';'),
+    ':': token.Token(token.COLON, ':'),
+    ',': token.Token(token.COMMA, ','),
+    '{': token.Token(token.LBRACE, '{'),
+    '}': token.Token(token.RBRACE, '}'),
+    '(': token.Token(token.LPAREN, '('),
+    ')': token.Token(token.RPAREN, ')'),
+    '[': token.Token(token.LBRACKET, '['),
+    ']': token.Token(token.RBRACKET, ']'),
+}
+KEYWORD_TOKENS = {k: token.Token(t, k) for k, t in token.keywords.items()}
+EOF_TOKEN = token.Token(token.EOF, "")
+
+class RegexLexer:
+    """
+    Produces the same tokens as Lexer.next_token, but scans the source with
+    TOKEN_PATTERN instead of stepping through it one character at a time.
+    """
+
+    source = ""
+    tokens = None # iterator of Token
+
+    def __init__(self, source, tokens=None):
+        self.source = source
+        if tokens == None:
+            tokens = scan(source)
+        self.tokens = tokens
+
+    def next_token(self):
+        return next(self.tokens, EOF_TOKEN)
+
+def scan(source):
+    """
+    Yields every token of the source, not including the final EOF
+    """
+    yield from scan_buffer(source, True)
+
+def scan_stream(chunks):
+    """
+    Yields every token from an iterable of source chunks. A token that might
+    continue into the next chunk (i.e. one touching the end of the buffered
+    text, such as an identifier, a string or `=`) is carried over and
+    rescanned together with the next chunk. Chunks that only extend that
+    token are collected without scanning, so a token spanning many chunks is
+    scanned once it can end rather than once per chunk.
+    """
+    pending = [] # pieces of the unfinished token
+    for chunk in chunks:
+        pending.append(chunk)
+        if len(pending) > 1 and continues_token(pending[0], chunk):
+            continue
+        buffer = "".join(pending)
+        consumed = yield from scan_buffer(buffer, False)
+        rest = buffer[consumed:].lstrip(' \t\n\r')
+        pending = [rest] if rest else []
+    yield from scan_buffer("".join(pending), True)
+
+IDENT_CHARS = re.compile(r'[A-Za-z_]*')
+INT_CHARS = re.compile(r'[0-9]*')
+
+def continues_token(start, chunk):
+    """
+    Tells whether chunk extends the unfinished token whose text begins with
+    start without ending it. Pieces are only added after start when they do
+    not end the token, so a string is unterminated if start has no closing
+    quote.
+    """
+    first = start[0]
+    if first == '"':
+        return '"' not in start[1:] and '"' not in chunk
+    if IDENT_CHARS.fullmatch(first):
+        return IDENT_CHARS.fullmatch(chunk) != None
+    if INT_CHARS.fullmatch(first):
+        return INT_CHARS.fullmatch(chunk) != None
+    return False
+
+def scan_buffer(buffer, final):
+    """
+    Yields the tokens of buffer and returns the offset right after the last
+    one. Unless final, a token ending at the end of the buffer is held back.
+    """
+    Token = token.Token
+    IDENT, INT, STRING, ILLEGAL = token.IDENT, token.INT, token.STRING, token.ILLEGAL
+    operators = OPERATOR_TOKENS
+    keywords = KEYWORD_TOKENS
+    end = len(buffer)
+    consumed = 0
+    for m in TOKEN_PATTERN.finditer(buffer):
+        if not final and m.end() == end:
+            break
+        consumed = m.end()
+        kind = m.lastgroup
+        if kind == 'ident':
+            literal = m.group('ident')
+            tok = keywords.get(literal)
+            yield tok if tok != None else Token(IDENT, literal)
+        elif kind == 'op':
+            yield operators[m.group('op')]
+        elif kind == 'int':
+            yield Token(INT, m.group('int'))
+        elif kind == 'string':
+            yield Token(STRING, m.group('string'))
+        else:
+            yield Token(ILLEGAL, m.group('illegal'))
+    return consumed
+
+def read_chunks(stream, chunk_size=CHUNK_SIZE):
+    """
+    Reads a text or binary file object (or an mmap) chunk by chunk, decoding
+    bytes as UTF-8 without splitting multi-byte characters
+    """
+    decoder = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if not isinstance(chunk, str):
+            if decoder == None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder != None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+# Display literals of tokens with fixed text, indexed by kind
+FIXED_TOKENS = {tok.Type: tok for tok in list(OPERATOR_TOKENS.values()) + list(KEYWORD_TOKENS.values())}
+FIXED_TOKENS[token.EOF] = EOF_TOKEN
+
+class TokenBuffer:
+    """
+    A columnar token stream: token kinds and [start, end) offsets of each
+    literal in the source are kept in parallel arrays, so a token costs a few
+    bytes instead of a Token tuple and a literal string. Literals are sliced
+    from the source only when asked for. The last token is always EOF.
+    """
+
+    source = ""
+    kinds = None # array('B') of token kinds
+    starts = None # array('q') of literal start offsets
+    ends = None # array('q') of literal end offsets
+    line_starts = None # offsets at which each line starts, built on demand
+    brace_pairs = None # index of each { -> index of its matching }, built on demand
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        """
+        Compatibility view: returns the i-th token as a Token
+        """
+        return self.token(i)
+
+    def literal(self, i):
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def token(self, i):
+        kind = self.kinds[i]
+        tok = FIXED_TOKENS.get(kind)
+        if tok != None:
+            return tok
+        return token.Token(kind, self.source[self.starts[i]:self.ends[i]])
+
+    def matching_brace(self, i):
+        """
+        Returns the index of the } closing the { at index i, or None if it
+        is never closed
+        """
+        if self.brace_pairs == None:
+            self.brace_pairs = {}
+            braces = re.compile(bytes([token.LBRACE, token.RBRACE]).join([b'[', b']']))
+            opened = []
+            for m in braces.finditer(self.kinds.tobytes()):
+                if m.group()[0] == token.LBRACE:
+                    opened.append(m.start())
+                elif len(opened) > 0:
+                    self.brace_pairs[opened.pop()] = m.start()
+        return self.brace_pairs.get(i)
+
+    def location(self, i):
+        """
+        Returns the (line, column) of the i-th token, both counted from 1
+        """
+        if self.line_starts == None:
+            self.line_starts = [0] + [m.end() for m in re.finditer('\n', self.source)]
+        offset = self.starts[i]
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+def tokenize(source):
+    """
+    Scans the whole source into a TokenBuffer
+    """
+    buffer = TokenBuffer(source)
+    append_kind = buffer.kinds.append
+    append_start = buffer.starts.append
+    append_end = buffer.ends.append
+    keywords = token.keywords
+    operators = {text: tok.Type for text, tok in OPERATOR_TOKENS.items()}
+    group_kinds = {'int': token.INT, 'string': token.STRING, 'illegal': token.ILLEGAL}
+    for m in TOKEN_PATTERN.finditer(source):
+        group = m.lastgroup
+        if group == 'ident':
+            kind = keywords.get(m.group(group), token.IDENT)
+        elif group == 'op':
+            kind = operators[m.group(group)]
+        else:
+            kind = group_kinds[group]
+        append_kind(kind)
+        append_start(m.start(group))
+        append_end(m.end(group))
+    append_kind(token.EOF)
+    append_start(len(source))
+    append_end(len(source))
+    return buffer
+
+class BufferLexer:
+    """
+    Hands out the tokens of a TokenBuffer through the usual next_token()
+    """
+
+    buffer = None # TokenBuffer
+    index = 0 # index of the next token to hand out, past EOF once it is handed out
+
+    def __init__(self, buffer, index=0):
+        self.buffer = buffer
+        self.index = index
+
+    def next_token(self):
+        i = self.index
+        self.index = i + 1
+        last = len(self.buffer.kinds) - 1
+        return self.buffer.token(i if i < last else last)
+
+    def location(self, back=1):
+        """
+        Returns the (line, column) of a recently handed out token; back=1 is
+        the last one (the parser's peek token), back=2 the one before it
+        """
+        i = min(max(self.index - back, 0), len(self.buffer.kinds) - 1)
+        return self.buffer.location(i)
+
+def new_buffer(source):
+    return BufferLexer(tokenize(source))
+
+def new_regex(source):
+    return RegexLexer(source)
+
+def new_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Returns a RegexLexer reading its source from a file object or mmap in
+    chunks, so the whole source never has to be held in memory
+    """
+    return RegexLexer(None, scan_stream(read_chunks(stream, chunk_size)))
\ No newline at end of file
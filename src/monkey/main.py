@@ -1,16 +1,174 @@
 import getpass
+import mmap
+import struct
 import sys
 sys.path.append("../")
+from monkey import ast
+from monkey import lexer
+from monkey import parser
 from monkey import repl
+from monkey.ast import arena
+from monkey.common import cache as monkey_cache
+from monkey.compiler import bytecode_file
+from monkey.object import Error
 
-def main(interpreter=True):
+def main(interpreter=True, vm_macros=False, pure_macros=False):
     user = getpass.getuser()
     print("Hello %s! This is the Monkey programming language!\n" % user)
     print("Feel free to type in commands. To quit, enter exit()\n")
-    repl.start(interpreter)
+    repl.start(interpreter, vm_macros, pure_macros)
+
+def run_file(path, interpreter=True, use_cache=True, vm_macros=False, pure_macros=False):
+    """
+    Runs the Monkey program at path, streaming it from a memory-mapped file 
+    through the lexer and parser and executing each top-level statement as soon
+    as it is parsed. Returns the process exit code.
+
+    With use_cache, the script's cache directory keeps the macro-expanded
+    program, or the bytecode when compiling, and later runs of the same
+    source use it without lexing or parsing.
+    """
+    session = repl.Session(interpreter, vm_macros, pure_macros)
+    with open(path, 'rb') as f:
+        source = map_file(f)
+        try:
+            cache = key = None
+            if use_cache:
+                cache = monkey_cache.for_script(path)
+                # a script defines its own macros, so its source decides
+                # what it expands to
+                key = cache.key(source if source is not f else b'')
+                code = run_cached(session, cache, key)
+                if code != None:
+                    return code
+                # the compiled sections are what gets cached
+                session.sections = []
+            p = parser.new(lexer.new_stream(source))
+            executed = []
+            code = run_statements(session, parsed_statements(p), executed)
+            if code == 1:
+                return 1
+            if len(p.errors) != 0:
+                repl.print_parse_errors(p.errors)
+                return 1
+            if cache != None:
+                store(session, cache, key, executed)
+        finally:
+            if source is not f:
+                source.close()
+    return 0
+
+def parsed_statements(p):
+    """
+    Yields the statements of p up to the first parse error
+    """
+    for stmt in p.parse_statements():
+        if len(p.errors) != 0:
+            return
+        yield stmt
+
+def run_statements(session, statements, executed):
+    """
+    Runs statements one at a time, adding them to executed as expanded,
+    until one fails or returns. Returns the exit code if the program ended,
+    None otherwise.
+    """
+    for stmt in statements:
+        program = ast.Program([stmt])
+        code = check_result(*session.run(program))
+        executed.extend(program.statements)
+        if code != None:
+            return code
+        # a top-level return ends the program
+        if isinstance(stmt, ast.ReturnStatement):
+            return 0
+    return None
+
+def check_result(result, err):
+    """
+    Prints the error of a failed statement and returns 1, or returns None
+    """
+    if err != None:
+        print(err)
+        return 1
+    if isinstance(result, Error):
+        print(result.inspect())
+        return 1
+    return None
+
+def run_cached(session, cache, key):
+    """
+    Runs the program cached under key for the session's mode. Returns the
+    exit code, or None if nothing usable is cached.
+    """
+    if session.interpreter:
+        program = load_program(cache, key)
+        if program == None:
+            return None
+        code = run_statements(session, program.statements, [])
+        return 0 if code == None else code
+    path = cache.get(key, bytecode_file.SUFFIX)
+    if path == None:
+        return None
+    compiled, err = bytecode_file.load(path)
+    if err != None:
+        cache.remove(key, bytecode_file.SUFFIX)
+        return None
+    session.constants = compiled.constants
+    # sections end at a top-level return, if there was one
+    for instructions in compiled.sections:
+        code = check_result(*session.run_instructions(instructions))
+        if code != None:
+            return code
+    return 0
+
+def load_program(cache, key):
+    """
+    Returns the expanded Program cached under key, or None if there is
+    none or it cannot be decoded
+    """
+    data = cache.read(key, '.ast')
+    if data == None:
+        return None
+    try:
+        tree, err = arena.loads(data)
+        if err == None:
+            return tree.to_node()
+    except (ValueError, KeyError, IndexError, struct.error):
+        pass
+    # an unreadable file is a miss, and is written again after the run
+    cache.remove(key, '.ast')
+    return None
+
+def store(session, cache, key, executed):
+    """
+    Caches the program the session just ran: the expanded statements for
+    the interpreter, the compiled sections otherwise
+    """
+    if session.interpreter:
+        cache.put(key, '.ast', arena.dumps(arena.from_node(ast.Program(executed))))
+        return
+    data, err = bytecode_file.dumps(bytecode_file.CompiledProgram(session.constants, session.sections))
+    if err == None:
+        cache.put(key, bytecode_file.SUFFIX, data)
+
+def map_file(f):
+    """
+    Memory-maps an open file for reading; empty files cannot be mapped, so
+    the file object itself is returned for those
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return f
 
 if __name__ == '__main__':
-    if len(sys.argv) == 2 and sys.argv[1] == '--c': # for using compiler
-        main(False)
-    else:                                           # otherwise, interpreter
-        main()
\ No newline at end of file
+    args = sys.argv[1:]
+    interpreter = '--c' not in args # for using compiler
+    use_cache = '--no-cache' not in args
+    vm_macros = '--vm-macros' in args # for running macro bodies on the VM
+    pure_macros = '--pure-macros' in args # for caching macro expansions
+    files = [a for a in args if a not in ('--c', '--no-cache', '--vm-macros', '--pure-macros')]
+    if len(files) > 0:
+        sys.exit(run_file(files[0], interpreter, use_cache, vm_macros, pure_macros))
+    main(interpreter, vm_macros, pure_macros)
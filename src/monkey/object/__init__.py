@@ -1,2 +1,3 @@
 from .object import *
 from .environment import *
+from .vector import Vector
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+from types import MappingProxyType
 from monkey import ast
 
 """
@@ -18,6 +19,8 @@ HASH_OBJ = 'HASH'
 QUOTE_OBJ = 'QUOTE'
 MACRO_OBJ = 'MACRO'
 COMPILED_FUNCTION_OBJ = 'COMPILED_FUNCTION_OBJ'
+SET_OBJ = 'SET'
+VECTOR_OBJ = 'VECTOR'
 
 # object "interface"
 class Object:
@@ -167,19 +170,336 @@ class HashPair:
         self.key = key
         self.value = value
 
+class Shape:
+    """
+    A fixed sequence of String keys mapped to slot indices. Hashes whose keys
+    are the same strings in the same order share one Shape and only keep their
+    values in a flat list.
+    """
+    keys = () # tuple of str
+    slots = {} # <str, int>
+    transitions = {} # <str, Shape> reached by adding that key
+    def __init__(self, keys):
+        self.keys = keys
+        self.slots = {k: i for i, k in enumerate(keys)}
+        self.transitions = {}
+
+    def with_key(self, key):
+        shape = self.transitions.get(key)
+        if shape == None:
+            shape = shape_for(self.keys + (key,))
+            self.transitions[key] = shape
+        return shape
+
+# Shapes are interned so that e.g. every {"name": ..., "age": ...} shares one.
+# Keys can be built at runtime, so the table is capped and overflow shapes are
+# simply not shared. Hashes that grow past MAX_SHAPE_KEYS through assignment
+# become general ones, since they are tables rather than records.
+MAX_SHAPES = 4096
+MAX_SHAPE_KEYS = 32
+shapes = {} # <tuple of str, Shape>
+
+def shape_for(keys):
+    shape = shapes.get(keys)
+    if shape == None:
+        shape = Shape(keys)
+        if len(shapes) < MAX_SHAPES:
+            shapes[keys] = shape
+    return shape
+
 class Hash(Object):
-    pairs = OrderedDict() # <hash key, HashPair>
-    def __init__(self, pairs):
-        self.pairs = pairs
+    """
+    A Hash uses one of three layouts, picked by new_hash:
+    - shape: all keys are Strings; keys live in a shared Shape and values in
+      the `values` list
+    - dense: the keys are the Integers 0..n-1 in order; values live in the
+      `dense` list
+    - general: `general` is an OrderedDict <HashKey, HashPair>
+    Lookups through get() skip HashKey construction for the first two.
+    """
+    shape = None # Shape
+    values = None # list of Object, for the shape layout
+    dense = None # list of Object, for the dense layout
+    general = None # OrderedDict <HashKey, HashPair>
+
+    def __init__(self, pairs=None, shape=None, values=None, dense=None):
+        if shape != None:
+            self.shape = shape
+            self.values = values
+        elif dense != None:
+            self.dense = dense
+        else:
+            if pairs == None:
+                pairs = OrderedDict()
+            self.general = pairs
+
+    @property
+    def pairs(self):
+        """
+        A read-only <HashKey, HashPair> view of the hash. This is built on
+        demand for the specialized layouts, so hot paths should use get() and
+        items(), and every write has to go through set().
+        """
+        if self.general != None:
+            return MappingProxyType(self.general)
+        return MappingProxyType(self.build_pairs())
+
+    def build_pairs(self):
+        pairs = OrderedDict()
+        for key, value in self.items():
+            pairs[key.hash_key()] = HashPair(key, value)
+        return pairs
+
+    def get(self, key):
+        """
+        Returns the value stored under the key Object or None if missing
+        """
+        if self.shape != None:
+            if type(key) is not String:
+                return None
+            slot = self.shape.slots.get(key.value)
+            return None if slot == None else self.values[slot]
+        elif self.dense != None:
+            if type(key) is not Integer:
+                return None
+            i = key.value
+            if type(i) is int:
+                return self.dense[i] if 0 <= i < len(self.dense) else None
+            # e.g. the 0.0 of 2 / 2 - 1, which is looked up by its HashKey
+            pair = self.build_pairs().get(key.hash_key())
+            return None if pair == None else pair.value
+        pair = self.general.get(key.hash_key())
+        return None if pair == None else pair.value
+
+    def set(self, key, value):
+        """
+        Stores value under the key Object in place, switching to a more
+        general layout when the key does not fit the current one
+        """
+        if self.shape != None and not self.values and type(key) is Integer and type(key.value) is int \
+                and key.value == 0:
+            # an empty hash starts out with the empty shape; let it become dense
+            self.shape = None
+            self.values = None
+            self.dense = []
+        if self.shape != None:
+            if type(key) is String:
+                slot = self.shape.slots.get(key.value)
+                if slot != None:
+                    self.values[slot] = value
+                    return
+                if len(self.values) < MAX_SHAPE_KEYS:
+                    self.shape = self.shape.with_key(key.value)
+                    self.values.append(value)
+                    return
+            self.to_general()
+        elif self.dense != None:
+            if type(key) is Integer and type(key.value) is int:
+                i = key.value
+                if 0 <= i < len(self.dense):
+                    self.dense[i] = value
+                    return
+                if i == len(self.dense):
+                    self.dense.append(value)
+                    return
+            self.to_general()
+        hash_key = key.hash_key()
+        pair = self.general.get(hash_key)
+        if pair != None:
+            pair.value = value
+        else:
+            self.general[hash_key] = HashPair(key, value)
+
+    def to_general(self):
+        self.general = self.build_pairs()
+        self.shape = None
+        self.values = None
+        self.dense = None
+
+    def items(self):
+        """
+        Yields (key Object, value Object) in insertion order
+        """
+        if self.shape != None:
+            for k, v in zip(self.shape.keys, self.values):
+                yield String(k), v
+        elif self.dense != None:
+            for i, v in enumerate(self.dense):
+                yield Integer(i), v
+        else:
+            for pair in self.general.values():
+                yield pair.key, pair.value
+
+    def length(self):
+        if self.shape != None:
+            return len(self.values)
+        elif self.dense != None:
+            return len(self.dense)
+        return len(self.general)
+
     def object_type(self):
         return HASH_OBJ
     def inspect(self):
         string_pairs = []
-        for key, value in self.pairs.items():
-            string_pairs.append(f"{key.inspect()}:  {value.value.inspect()}")
+        for key, value in self.items():
+            string_pairs.append(f"{key.inspect()}:  {value.inspect()}")
         out = "{" + ", ".join(string_pairs) + "}"
         return out
 
+def new_hash(keys, values):
+    """
+    Builds a Hash from parallel lists of key and value Objects, picking the
+    most compact layout the keys allow. Every key must have a hash_key method.
+    """
+    if all(type(k) is String for k in keys):
+        key_strings = tuple(k.value for k in keys)
+        # duplicate keys would need a slot per key, so leave those general
+        if len(set(key_strings)) == len(key_strings):
+            return Hash(shape=shape_for(key_strings), values=list(values))
+    elif all(type(k) is Integer and type(k.value) is int and k.value == i for i, k in enumerate(keys)):
+        return Hash(dense=list(values))
+    pairs = OrderedDict()
+    for key, value in zip(keys, values):
+        pairs[key.hash_key()] = HashPair(key, value)
+    return Hash(pairs)
+
+REROOT_LIMIT = 32 # diffs a Set replays before it copies the dict instead
+
+class Set(Object):
+    """
+    An immutable set of hashable Objects, keyed by their HashKey like Hash.
+
+    Versions derived through add() and remove() share a single dict: the
+    newest version owns it and every older version keeps a diff of
+    (newer version, HashKey, element it had or None). Using an older version
+    re-roots the dict onto it by replaying those diffs, so building a set one
+    element at a time is O(1) per step instead of a copy. Versions more than
+    REROOT_LIMIT diffs away from the owner take a copy of their own instead,
+    so alternating between two distant versions does not replay the whole
+    distance on every access.
+    """
+    members = None # <HashKey, Object>, while this version owns the dict
+    diff = None # (Set, HashKey, Object or None), otherwise
+
+    def __init__(self, members=None):
+        if members == None:
+            members = {}
+        self.members = members
+
+    def object_type(self):
+        return SET_OBJ
+
+    def inspect(self):
+        return "set([" + ", ".join(e.inspect() for e in self.elements()) + "])"
+
+    def reroot(self):
+        """
+        Makes this version the owner of the shared dict and returns it
+        """
+        if self.members != None:
+            return self.members
+        path = []
+        version = self
+        while version.members == None:
+            path.append(version)
+            version = version.diff[0]
+        members = version.members
+        if len(path) > REROOT_LIMIT:
+            # leave the shared dict with its owner and detach a copy
+            members = dict(members)
+            for version in reversed(path):
+                _, key, element = version.diff
+                if element == None:
+                    del members[key]
+                else:
+                    members[key] = element
+            self.members = members
+            self.diff = None
+            return members
+        # undo the diffs from the current owner back towards this version,
+        # turning each one around so the newer version can find its way back
+        for version in reversed(path):
+            newer, key, element = version.diff
+            current = members.get(key)
+            if element == None:
+                del members[key]
+            else:
+                members[key] = element
+            newer.members = None
+            newer.diff = (version, key, current)
+            version.members = members
+            version.diff = None
+        return members
+
+    def contains(self, element):
+        return element.hash_key() in self.reroot()
+
+    def length(self):
+        return len(self.reroot())
+
+    def elements(self):
+        return list(self.reroot().values())
+
+    def add(self, element):
+        members = self.reroot()
+        key = element.hash_key()
+        if key in members:
+            return self
+        members[key] = element
+        return self.hand_over(members, key, None)
+
+    def remove(self, element):
+        members = self.reroot()
+        key = element.hash_key()
+        if key not in members:
+            return self
+        previous = members.pop(key)
+        return self.hand_over(members, key, previous)
+
+    def hand_over(self, members, key, element):
+        """
+        Moves ownership of the (already updated) dict to a new version and
+        records how to undo the change from this one
+        """
+        newer = Set(members)
+        self.members = None
+        self.diff = (newer, key, element)
+        return newer
+
+    def union(self, other):
+        larger, smaller = (self, other) if self.length() >= other.length() else (other, self)
+        result = larger
+        for e in smaller.elements():
+            result = result.add(e)
+        return result
+
+    def intersection(self, other):
+        larger, smaller = (self, other) if self.length() >= other.length() else (other, self)
+        # both sets may be versions sharing one dict, so snapshot the smaller
+        # side before re-rooting onto the larger
+        candidates = list(smaller.reroot().items())
+        larger_members = larger.reroot()
+        return Set({k: v for k, v in candidates if k in larger_members})
+
+    def difference(self, other):
+        if other.length() < self.length():
+            result = self
+            for e in other.elements():
+                result = result.remove(e)
+            return result
+        candidates = list(self.reroot().items())
+        other_members = other.reroot()
+        return Set({k: v for k, v in candidates if k not in other_members})
+
+def new_set(elements):
+    """
+    Builds a Set from a list of Objects, each of which must have a hash_key
+    """
+    members = {}
+    for e in elements:
+        members.setdefault(e.hash_key(), e)
+    return Set(members)
+
 class Quote(Object):
     node = None # AST Node
     def __init__(self, node):
@@ -187,12 +507,14 @@ class Quote(Object):
     def object_type(self):
         return QUOTE_OBJ
     def inspect(self):
-        return "QUOTE(" + node.string() + ")"
+        return "QUOTE(" + self.node.string() + ")"
 
 class Macro(Object):
     parameters = [] # Identifier
     body = None # BlockStatement
     env = None # Environment
+    compiled = None # (Bytecode, globals) once the body is compiled for the VM
+    compile_error = None # why the body could not be compiled for the VM, if so
 
     def __init__(self, parameters=None, env=None, body=None):
         if parameters == None:
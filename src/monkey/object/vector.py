@@ -0,0 +1,204 @@
+"""
+Numeric vector support for Monkey.
+
+Vectors hold plain machine integers instead of boxed Integer objects so that
+element-wise arithmetic and reductions run in one native call rather than one
+Monkey call per element. When NumPy is installed the elements live in an int64
+ndarray; otherwise they are kept in a Python list of ints. Values outside the
+int64 range, and results that could leave it, use the list backend instead, so
+both backends give the same exact results.
+"""
+
+from operator import attrgetter
+from monkey.object.object import Object, Integer, Array, VECTOR_OBJ
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_get_value = attrgetter('value')
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+class Vector(Object):
+    data = None # numpy.ndarray (int64) or list of int
+
+    def __init__(self, data):
+        self.data = data
+
+    def object_type(self):
+        return VECTOR_OBJ
+
+    def inspect(self):
+        return 'vec[' + ','.join(str(v) for v in to_list(self)) + ']'
+
+def new_vector(values):
+    """
+    Creates a Vector from an iterable of Python ints using the best backend
+    """
+    values = list(values)
+    if numpy is not None and all(type(v) is int for v in values) \
+            and (len(values) == 0 or fits_int64(min(values), max(values))):
+        return Vector(numpy.array(values, dtype=numpy.int64))
+    return Vector(values)
+
+def fits_int64(*values):
+    return all(INT64_MIN <= v <= INT64_MAX for v in values)
+
+def is_ndarray(data):
+    return numpy is not None and isinstance(data, numpy.ndarray)
+
+def bounds(data):
+    """
+    Returns the (min, max) of an ndarray, or of a single int, as Python ints
+    """
+    if not is_ndarray(data):
+        return data, data
+    if len(data) == 0:
+        return 0, 0
+    return int(data.min()), int(data.max())
+
+def from_array(array):
+    """
+    Converts an Array of Integers to a Vector. The values are unwrapped in one
+    pass and handed to the backend as a whole; returns None if any element is
+    not an Integer.
+    """
+    elements = array.elements
+    for e in elements:
+        if type(e) is not Integer:
+            return None
+    return new_vector(map(_get_value, elements))
+
+def to_list(vector):
+    """
+    Returns the elements of the vector as a list of Python ints
+    """
+    if is_ndarray(vector.data):
+        return vector.data.tolist()
+    return list(vector.data)
+
+def to_array(vector):
+    """
+    Converts a Vector back into an Array. Boxing into Integer objects is
+    unavoidable here, but it is done once over the natively converted list.
+    """
+    return Array([Integer(v) for v in to_list(vector)])
+
+def length(vector):
+    return len(vector.data)
+
+def index(vector, i):
+    """
+    Returns the element at i as an Integer or None if out of range
+    """
+    if i < 0 or i >= len(vector.data):
+        return None
+    return Integer(int(vector.data[i]))
+
+def slice_vector(vector, start, end):
+    """
+    Returns a new Vector with elements [start, end). Bounds are clamped like
+    Python slices, but negative indices are treated as 0.
+    """
+    start = max(start, 0)
+    end = max(end, start)
+    data = vector.data[start:end]
+    if is_ndarray(data):
+        # ndarray slices are views; copy so the result does not pin the parent
+        data = data.copy()
+    return Vector(data)
+
+def total(vector):
+    data = vector.data
+    if is_ndarray(data):
+        # every partial sum lies between n * min and n * max
+        low, high = bounds(data)
+        if fits_int64(len(data) * low, len(data) * high):
+            return int(data.sum())
+    return sum(to_list(vector))
+
+def mean(vector):
+    """
+    Returns the mean of the vector, following the semantics of `/` on Integers,
+    or None for an empty vector
+    """
+    n = len(vector.data)
+    if n == 0:
+        return None
+    return total(vector) / n
+
+def dot(left, right):
+    """
+    Returns (dot product, None) or (None, error message)
+    """
+    if len(left.data) != len(right.data):
+        return None, f'vector length mismatch: {len(left.data)} and {len(right.data)}'
+    if is_ndarray(left.data) and is_ndarray(right.data):
+        largest = max(map(abs, bounds(left.data))) * max(map(abs, bounds(right.data)))
+        if fits_int64(len(left.data) * largest):
+            return int(numpy.dot(left.data, right.data)), None
+    return sum(a * b for a, b in zip(to_list(left), to_list(right))), None
+
+def binary_operation(operator, left, right):
+    """
+    Applies +, - or * element-wise. Either operand may be an Integer, in which
+    case it is broadcast over the other (Vector) operand.
+    Returns (Vector, None) or (None, error message).
+    """
+    if operator not in ('+', '-', '*'):
+        return None, f'unknown operator: {left.object_type()} {operator} {right.object_type()}'
+    if isinstance(left, Vector) and isinstance(right, Vector):
+        if len(left.data) != len(right.data):
+            return None, f'vector length mismatch: {len(left.data)} and {len(right.data)}'
+        a, b = left.data, right.data
+    elif isinstance(left, Vector) and isinstance(right, Integer):
+        a, b = left.data, right.value
+    elif isinstance(left, Integer) and isinstance(right, Vector):
+        a, b = left.value, right.data
+    else:
+        return None, f'type mismatch: {left.object_type()} {operator} {right.object_type()}'
+    if native(a) and native(b) and fits_int64(*result_bounds(operator, bounds(a), bounds(b))):
+        if operator == '+':
+            return Vector(a + b), None
+        elif operator == '-':
+            return Vector(a - b), None
+        return Vector(a * b), None
+    a = a.tolist() if is_ndarray(a) else a
+    b = b.tolist() if is_ndarray(b) else b
+    return Vector(_list_operation(operator, a, b)), None
+
+def native(operand):
+    """
+    Tells whether an operand can take part in int64 arithmetic
+    """
+    return is_ndarray(operand) or (type(operand) is int and numpy is not None and fits_int64(operand))
+
+def result_bounds(operator, a, b):
+    """
+    Returns bounds of the results of a +, - or * b element-wise, given the
+    (min, max) of each operand
+    """
+    if operator == '+':
+        return a[0] + b[0], a[1] + b[1]
+    elif operator == '-':
+        return a[0] - b[1], a[1] - b[0]
+    return [x * y for x in a for y in b]
+
+def _list_operation(operator, a, b):
+    """
+    Pure-Python fallback for binary_operation
+    """
+    if isinstance(a, list) and isinstance(b, list):
+        pairs = zip(a, b)
+    elif isinstance(a, list):
+        pairs = ((x, b) for x in a)
+    else:
+        pairs = ((a, y) for y in b)
+    if operator == '+':
+        return [x + y for x, y in pairs]
+    elif operator == '-':
+        return [x - y for x, y in pairs]
+    return [x * y for x, y in pairs]
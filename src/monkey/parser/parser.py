@@ -1,6 +1,7 @@
 from monkey.tokens import token
 from monkey import lexer
 from monkey import ast
+from monkey.ast import arena
 from monkey import parser_tracing
 
 from enum import Enum, auto
@@ -28,22 +29,82 @@ precedences = {
     token.LBRACKET: Precedence.INDEX.value
 }
 
+# Names of the methods parsing each kind of token, resolved into
+# per-class tables of functions once when a Parser class is created
+prefix_parse_fn_names = {
+    token.IDENT: 'parse_identifer',
+    token.INT: 'parse_integer_literal',
+    token.STRING: 'parse_string_literal',
+    token.BANG: 'parse_prefix_expression',
+    token.MINUS: 'parse_prefix_expression',
+    token.TRUE: 'parse_boolean',
+    token.FALSE: 'parse_boolean',
+    token.LPAREN: 'parse_grouped_expression',
+    token.IF: 'parse_if_expression',
+    token.FUNCTION: 'parse_function_literal',
+    token.LBRACKET: 'parse_array_literal',
+    token.LBRACE: 'parse_hash_literal',
+    token.MACRO: 'parse_macro_literal',
+}
+
+infix_parse_fn_names = {
+    token.PLUS: 'parse_infix_expression',
+    token.MINUS: 'parse_infix_expression',
+    token.SLASH: 'parse_infix_expression',
+    token.ASTERISK: 'parse_infix_expression',
+    token.EQ: 'parse_infix_expression',
+    token.NOT_EQ: 'parse_infix_expression',
+    token.LT: 'parse_infix_expression',
+    token.GT: 'parse_infix_expression',
+    token.LPAREN: 'parse_call_expression',
+    token.LBRACKET: 'parse_index_expression',
+}
+
 # Uses Pratt Parsing
 class Parser:
+    """
+    A parser holds no state shared with other instances: the parse tables
+    are built once per class and never mutated (register_prefix and
+    register_infix give the instance its own copy), so independent parsers
+    can run on different threads. reset() reuses an instance for another
+    lexer.
+    """
 
     lexer = None
     cur_token = None
     peek_token = None
-    errors = []
-    prefix_parse_fns = {}
-    infix_parse_fns = {}
+    errors = None
+    lazy_bodies = False # only brace-match function bodies when lexing a TokenBuffer
+    call_sites = None # callee name -> indexes of the top-level statements calling it
+    statement_count = 0 # top-level statements parsed so far
+    prefix_parse_fns = {} # token type -> fn(parser)
+    infix_parse_fns = {} # token type -> fn(parser, left)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        build_parse_tables(cls)
+
+    def __init__(self, lexer, errors=None, lazy_bodies=False):
+        self.lazy_bodies = lazy_bodies
+        self.reset(lexer, errors)
+        # self.tracer = parser_tracing.ParserTracer()
 
-    def __init__(self, lexer, errors=None):
+    def reset(self, lexer, errors=None):
+        """
+        Starts parsing from a new lexer, dropping the previous errors
+        """
         self.lexer = lexer
         if errors == None:
             errors = []
         self.errors = errors
-        # self.tracer = parser_tracing.ParserTracer()
+        self.call_sites = {}
+        self.statement_count = 0
+        self.cur_token = None
+        self.peek_token = None
+        # this sets both cur_token and peek_token
+        self.next_token()
+        self.next_token()
+        return self
 
     def next_token(self):
         self.cur_token = self.peek_token
@@ -64,12 +125,38 @@ class Parser:
 
     def parse_program(self):
         program = ast.Program()
-        while self.cur_token.Type != token.EOF:
+        for stmt in self.parse_statements():
+            program.statements.append(stmt)
+        program.call_sites = self.call_sites
+        return program
+
+    def parse_statements(self):
+        """
+        Yields top-level statements one at a time as they are parsed, so a
+        consumer can execute each before the rest of the source is read.
+        Errors are still collected in self.errors as parsing goes on.
+        """
+        while not self.current_token_is(token.EOF):
             stmt = self.parse_statement()
             if stmt != None:
-                program.statements.append(stmt)
+                yield stmt
+                self.statement_count += 1
             self.next_token()
-        return program
+
+    def record_call(self, function):
+        """
+        Notes that the current top-level statement calls function, so macro
+        expansion can go straight to the statements calling a macro. Calls
+        inside function bodies left unparsed are noted under None.
+        """
+        if function != None and not isinstance(function, ast.Identifier):
+            return
+        name = None if function == None else function.value
+        sites = self.call_sites.get(name)
+        if sites == None:
+            self.call_sites[name] = [self.statement_count]
+        elif sites[-1] != self.statement_count:
+            sites.append(self.statement_count)
 
     def parse_statement(self):
         if self.cur_token.Type == token.LET:
@@ -103,10 +190,24 @@ class Parser:
         # begin = self.tracer.trace('parse_expression_statement')
         stmt = ast.ExpressionStatement(self.cur_token)
         stmt.expression = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.ASSIGN) and isinstance(stmt.expression, ast.IndexExpression):
+            return self.parse_assign_index_statement(stmt.expression)
         if self.peek_token_is(token.SEMICOLON):
             self.next_token()
         # self.tracer.untrace(begin)
         return stmt
+
+    def parse_assign_index_statement(self, target):
+        """
+        Parses `<left>[<index>] = <value>` once the index expression is parsed
+        """
+        self.next_token()
+        stmt = ast.AssignIndexStatement(self.cur_token, target.left, target.index)
+        self.next_token()
+        stmt.value = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.SEMICOLON):
+            self.next_token()
+        return stmt
     
     def parse_expression(self, precedence):
         # begin = self.tracer.trace('parse_expression')
@@ -115,14 +216,14 @@ class Parser:
             # self.tracer.untrace(begin)
             return None
         prefix = self.prefix_parse_fns[self.cur_token.Type]
-        left_exp = prefix()
+        left_exp = prefix(self)
         while not self.peek_token_is(token.SEMICOLON) and precedence < self.peek_precendence():
             if self.peek_token.Type not in self.infix_parse_fns:
                 # self.tracer.untrace(begin)
                 return left_exp
             infix = self.infix_parse_fns[self.peek_token.Type]
             self.next_token()
-            left_exp = infix(left_exp)
+            left_exp = infix(self, left_exp)
         # self.tracer.untrace(begin)
         return left_exp
     
@@ -164,8 +265,8 @@ class Parser:
         return expression
         
     def no_prefix_parse_fn_error(self, token_type):
-        msg = "no prefix parse function for {} found".format(token_type)
-        self.errors.append(msg)
+        msg = "no prefix parse function for {} found".format(token.type_name(token_type))
+        self.errors.append(msg + self.error_location(2))
     
     def parse_infix_expression(self, left):
         # begin = self.tracer.trace('parse_infix_expression')
@@ -224,8 +325,42 @@ class Parser:
         lit.parameters = self.parse_function_parameters()
         if not self.expect_peek(token.LBRACE):
             return None
-        lit.body = self.parse_block_statement()
+        lit.body = self.skip_lazy_body()
+        if lit.body == None:
+            lit.body = self.parse_block_statement()
         return lit
+
+    def skip_lazy_body(self):
+        """
+        With lazy_bodies set, brace-matches the block starting at cur_token
+        and returns it as an unparsed ast.LazyBlockStatement, leaving
+        cur_token on its closing brace. Returns None when the body has to
+        be parsed now: lazy bodies are off, the lexer keeps no TokenBuffer
+        or the braces do not match.
+        """
+        if not self.lazy_bodies or not isinstance(self.lexer, lexer.BufferLexer):
+            return None
+        tokens = self.lexer.buffer
+        start = self.lexer.index - 2
+        end = tokens.matching_brace(start)
+        if end == None:
+            return None
+        body = ast.LazyBlockStatement(self.cur_token, tokens, start, end, type(self).parse_body)
+        self.record_call(None)
+        self.lexer.index = end
+        self.peek_token = self.lexer.next_token()
+        self.next_token()
+        return body
+
+    @classmethod
+    def parse_body(cls, tokens, start):
+        """
+        Parses the block starting at tokens[start], returning its statements
+        and the parse errors; used to force an ast.LazyBlockStatement
+        """
+        p = cls(lexer.BufferLexer(tokens, start), lazy_bodies=True)
+        block = p.parse_block_statement()
+        return block.statements, p.errors
     
     def parse_function_parameters(self):
         identifiers = []
@@ -246,6 +381,7 @@ class Parser:
         return identifiers
 
     def parse_call_expression(self, function):
+        self.record_call(function)
         exp = ast.CallExpression(self.cur_token, function)
         exp.arguments = self.parse_expression_list(token.RPAREN)
         return exp
@@ -299,13 +435,32 @@ class Parser:
         return ast.Boolean(self.cur_token, self.current_token_is(token.TRUE))
 
     def peek_error(self, t):
-        msg = 'expected token to be {}, got {} instead'.format(t, self.peek_token.Type)
-        self.errors.append(msg)
+        msg = 'expected token to be {}, got {} instead'.format(
+            token.type_name(t), token.type_name(self.peek_token.Type))
+        self.errors.append(msg + self.error_location(1))
+
+    def error_location(self, back):
+        """
+        Describes where the current (back=2) or peek (back=1) token is, if the
+        lexer keeps source offsets
+        """
+        if not hasattr(self.lexer, 'location'):
+            return ''
+        line, column = self.lexer.location(back)
+        return ' at line {}, column {}'.format(line, column)
     
     def register_prefix(self, token_type, fn):
+        """
+        Parses tokens of token_type with fn(parser) in this instance only
+        """
+        self.prefix_parse_fns = dict(self.prefix_parse_fns)
         self.prefix_parse_fns[token_type] = fn
     
     def register_infix(self, token_type, fn):
+        """
+        Parses tokens of token_type with fn(parser, left) in this instance only
+        """
+        self.infix_parse_fns = dict(self.infix_parse_fns)
         self.infix_parse_fns[token_type] = fn
 
     def peek_precendence(self):
@@ -318,35 +473,656 @@ class Parser:
             return precedences[self.cur_token.Type]
         return Precedence.LOWEST.value
 
-def new(lexer):
-    p = Parser(lexer)
-    # create maps for prefix and infix operators to parse functions
-    p.prefix_parse_fns = {}
-    p.register_prefix(token.IDENT, p.parse_identifer)
-    p.register_prefix(token.INT, p.parse_integer_literal)
-    p.register_prefix(token.STRING, p.parse_string_literal)
-    p.register_prefix(token.BANG, p.parse_prefix_expression)
-    p.register_prefix(token.MINUS, p.parse_prefix_expression)
-    p.register_prefix(token.TRUE, p.parse_boolean)
-    p.register_prefix(token.FALSE, p.parse_boolean)
-    p.register_prefix(token.LPAREN, p.parse_grouped_expression)
-    p.register_prefix(token.IF, p.parse_if_expression)
-    p.register_prefix(token.FUNCTION, p.parse_function_literal)
-    p.register_prefix(token.LBRACKET, p.parse_array_literal)
-    p.register_prefix(token.LBRACE, p.parse_hash_literal)
-    p.register_prefix(token.MACRO, p.parse_macro_literal)
-    # infix
-    p.register_infix(token.PLUS, p.parse_infix_expression) 
-    p.register_infix(token.MINUS, p.parse_infix_expression) 
-    p.register_infix(token.SLASH, p.parse_infix_expression) 
-    p.register_infix(token.ASTERISK, p.parse_infix_expression) 
-    p.register_infix(token.EQ, p.parse_infix_expression) 
-    p.register_infix(token.NOT_EQ, p.parse_infix_expression) 
-    p.register_infix(token.LT, p.parse_infix_expression) 
-    p.register_infix(token.GT, p.parse_infix_expression)
-    p.register_infix(token.LPAREN, p.parse_call_expression)
-    p.register_infix(token.LBRACKET, p.parse_index_expression)
-    # this sets both cur_token and peek_token
-    p.next_token()
-    p.next_token()
-    return p
\ No newline at end of file
+def build_parse_tables(cls):
+    cls.prefix_parse_fns = {t: getattr(cls, name) for t, name in prefix_parse_fn_names.items()}
+    cls.infix_parse_fns = {t: getattr(cls, name) for t, name in infix_parse_fn_names.items()}
+
+build_parse_tables(Parser)
+
+# Frames kept on the IterativeParser stack. Each frame is a tuple
+# (kind, precedence, node, extra) where precedence is that of the
+# parse_expression call the frame's construct was started from.
+F_ROOT = 0 # bottom of the stack, hands the result back to the caller
+F_LET = 1 # node is the LetStatement waiting for its value
+F_RETURN = 2 # node is the ReturnStatement waiting for its value
+F_EXPRESSION_STMT = 3 # node is the ExpressionStatement waiting for its expression
+F_ASSIGN_INDEX = 4 # node is the AssignIndexStatement waiting for its value
+F_PREFIX = 5 # node is the PrefixExpression waiting for its right operand
+F_INFIX = 6 # node is the InfixExpression waiting for its right operand
+F_GROUP = 7 # inside ( ... )
+F_INDEX = 8 # node is the IndexExpression waiting for its index
+F_LIST = 9 # node is an ArrayLiteral/CallExpression, extra is (closing token, parsed expressions)
+F_HASH = 10 # node is the HashLiteral being filled
+F_HASH_KEY = 11 # a key of the HashLiteral below is being parsed
+F_HASH_VALUE = 12 # a value of the HashLiteral below is being parsed, extra is its key
+F_IF_CONDITION = 13 # node is the IfExpression waiting for its condition
+F_IF_CONSEQUENCE = 14 # node is the IfExpression waiting for its consequence block
+F_IF_ALTERNATIVE = 15 # node is the IfExpression waiting for its alternative block
+F_BODY = 16 # node is the FunctionLiteral/MacroLiteral waiting for its body
+F_BLOCK = 17 # node is the BlockStatement being filled
+
+# What the IterativeParser is doing next
+M_STATEMENT = 0 # parse a statement starting at cur_token
+M_EXPRESSION = 1 # parse_expression(precedence) starting at cur_token
+M_INFIX = 2 # the operator loop of parse_expression, value is the left operand
+M_EXPRESSION_DONE = 3 # value is a finished expression
+M_STATEMENT_DONE = 4 # value is a finished statement (or None)
+M_BLOCK = 5 # parse a block statement, cur_token is {
+M_BLOCK_NEXT = 6 # parse the next statement of the block on top of the stack
+M_BLOCK_DONE = 7 # value is a finished BlockStatement
+M_HASH_NEXT = 8 # parse the next pair of the hash on top of the stack
+
+class IterativeParser(Parser):
+    """
+    A Parser that keeps no Python frames per nesting level: expressions are
+    parsed with explicit operator/operand frames and blocks with explicit
+    block frames, so nesting depth is bounded by memory rather than by the
+    recursion limit. It builds the same AST and reports the same errors as
+    Parser; parse functions registered for other token types are still
+    called as usual.
+    """
+
+    def parse_statement(self):
+        return self.run(M_STATEMENT)
+
+    def parse_expression(self, precedence):
+        return self.run(M_EXPRESSION, precedence)
+
+    def parse_block_statement(self):
+        return self.run(M_BLOCK)
+
+    def run(self, mode, precedence=Precedence.LOWEST.value):
+        stack = [(F_ROOT, precedence, None, None)]
+        push = stack.append
+        pop = stack.pop
+        lowest = Precedence.LOWEST.value
+        value = None
+        while True:
+            if mode == M_EXPRESSION:
+                t = self.cur_token.Type
+                if t == token.BANG or t == token.MINUS:
+                    node = ast.PrefixExpression(self.cur_token, self.cur_token.Literal)
+                    self.next_token()
+                    push((F_PREFIX, precedence, node, None))
+                    precedence = Precedence.PREFIX.value
+                elif t == token.LPAREN:
+                    self.next_token()
+                    push((F_GROUP, precedence, None, None))
+                    precedence = lowest
+                elif t == token.IF:
+                    node = ast.IfExpression(self.cur_token)
+                    if not self.expect_peek(token.LPAREN):
+                        value = None
+                        mode = M_INFIX
+                        continue
+                    self.next_token()
+                    push((F_IF_CONDITION, precedence, node, None))
+                    precedence = lowest
+                elif t == token.FUNCTION or t == token.MACRO:
+                    if t == token.FUNCTION:
+                        node = ast.FunctionLiteral(self.cur_token)
+                    else:
+                        node = ast.MacroLiteral(self.cur_token)
+                    if not self.expect_peek(token.LPAREN):
+                        value = None
+                        mode = M_INFIX
+                        continue
+                    node.parameters = self.parse_function_parameters()
+                    if not self.expect_peek(token.LBRACE):
+                        value = None
+                        mode = M_INFIX
+                        continue
+                    if t == token.FUNCTION:
+                        node.body = self.skip_lazy_body()
+                        if node.body != None:
+                            value = node
+                            mode = M_INFIX
+                            continue
+                    push((F_BODY, precedence, node, None))
+                    mode = M_BLOCK
+                elif t == token.LBRACKET:
+                    node = ast.ArrayLiteral(self.cur_token)
+                    if self.peek_token_is(token.RBRACKET):
+                        self.next_token()
+                        node.elements = []
+                        value = node
+                        mode = M_INFIX
+                        continue
+                    self.next_token()
+                    push((F_LIST, precedence, node, (token.RBRACKET, [])))
+                    precedence = lowest
+                elif t == token.LBRACE:
+                    node = ast.HashLiteral(self.cur_token)
+                    node.pairs = {}
+                    push((F_HASH, precedence, node, None))
+                    mode = M_HASH_NEXT
+                elif t in self.prefix_parse_fns:
+                    # identifiers, literals and booleans
+                    value = self.prefix_parse_fns[t](self)
+                    mode = M_INFIX
+                else:
+                    self.no_prefix_parse_fn_error(t)
+                    value = None
+                    mode = M_EXPRESSION_DONE
+
+            elif mode == M_INFIX:
+                if self.peek_token_is(token.SEMICOLON) or precedence >= self.peek_precendence():
+                    mode = M_EXPRESSION_DONE
+                    continue
+                t = self.peek_token.Type
+                if t not in self.infix_parse_fns:
+                    mode = M_EXPRESSION_DONE
+                    continue
+                self.next_token()
+                if t == token.LPAREN:
+                    self.record_call(value)
+                    node = ast.CallExpression(self.cur_token, value)
+                    if self.peek_token_is(token.RPAREN):
+                        self.next_token()
+                        node.arguments = []
+                        value = node
+                        continue
+                    self.next_token()
+                    push((F_LIST, precedence, node, (token.RPAREN, [])))
+                    precedence = lowest
+                    mode = M_EXPRESSION
+                elif t == token.LBRACKET:
+                    node = ast.IndexExpression(self.cur_token, value)
+                    self.next_token()
+                    push((F_INDEX, precedence, node, None))
+                    precedence = lowest
+                    mode = M_EXPRESSION
+                elif t in precedences:
+                    node = ast.InfixExpression(self.cur_token, self.cur_token.Literal, value)
+                    push((F_INFIX, precedence, node, None))
+                    precedence = self.cur_precendence()
+                    self.next_token()
+                    mode = M_EXPRESSION
+                else:
+                    value = self.infix_parse_fns[t](self, value)
+
+            elif mode == M_EXPRESSION_DONE:
+                kind, outer, node, extra = pop()
+                if kind == F_PREFIX or kind == F_INFIX:
+                    node.right = value
+                    value = node
+                    precedence = outer
+                    mode = M_INFIX
+                elif kind == F_GROUP:
+                    if not self.expect_peek(token.RPAREN):
+                        value = None
+                    precedence = outer
+                    mode = M_INFIX
+                elif kind == F_INDEX:
+                    node.index = value
+                    value = node if self.expect_peek(token.RBRACKET) else None
+                    precedence = outer
+                    mode = M_INFIX
+                elif kind == F_LIST:
+                    end, exprs = extra
+                    exprs.append(value)
+                    if self.peek_token_is(token.COMMA):
+                        self.next_token()
+                        self.next_token()
+                        push((kind, outer, node, extra))
+                        mode = M_EXPRESSION
+                        continue
+                    if not self.expect_peek(end):
+                        exprs = None
+                    if end == token.RPAREN:
+                        node.arguments = exprs
+                    else:
+                        node.elements = exprs
+                    value = node
+                    precedence = outer
+                    mode = M_INFIX
+                elif kind == F_HASH_KEY:
+                    if not self.expect_peek(token.COLON):
+                        kind, outer, node, extra = pop()
+                        value = None
+                        precedence = outer
+                        mode = M_INFIX
+                        continue
+                    self.next_token()
+                    push((F_HASH_VALUE, outer, node, value))
+                    mode = M_EXPRESSION
+                elif kind == F_HASH_VALUE:
+                    node.pairs[extra] = value
+                    if not self.peek_token_is(token.RBRACE) and not self.expect_peek(token.COMMA):
+                        kind, outer, node, extra = pop()
+                        value = None
+                        precedence = outer
+                        mode = M_INFIX
+                        continue
+                    mode = M_HASH_NEXT
+                elif kind == F_IF_CONDITION:
+                    node.condition = value
+                    if not self.expect_peek(token.RPAREN) or not self.expect_peek(token.LBRACE):
+                        value = None
+                        precedence = outer
+                        mode = M_INFIX
+                        continue
+                    push((F_IF_CONSEQUENCE, outer, node, None))
+                    mode = M_BLOCK
+                elif kind == F_LET or kind == F_RETURN or kind == F_ASSIGN_INDEX:
+                    if kind == F_RETURN:
+                        node.return_value = value
+                    else:
+                        node.value = value
+                    if self.peek_token_is(token.SEMICOLON):
+                        self.next_token()
+                    value = node
+                    mode = M_STATEMENT_DONE
+                elif kind == F_EXPRESSION_STMT:
+                    node.expression = value
+                    if self.peek_token_is(token.ASSIGN) and isinstance(value, ast.IndexExpression):
+                        self.next_token()
+                        node = ast.AssignIndexStatement(self.cur_token, value.left, value.index)
+                        self.next_token()
+                        push((F_ASSIGN_INDEX, outer, node, None))
+                        precedence = lowest
+                        mode = M_EXPRESSION
+                        continue
+                    if self.peek_token_is(token.SEMICOLON):
+                        self.next_token()
+                    value = node
+                    mode = M_STATEMENT_DONE
+                else: # F_ROOT
+                    return value
+
+            elif mode == M_HASH_NEXT:
+                kind, outer, node, extra = stack[-1]
+                if not self.peek_token_is(token.RBRACE):
+                    self.next_token()
+                    push((F_HASH_KEY, outer, node, None))
+                    precedence = lowest
+                    mode = M_EXPRESSION
+                    continue
+                pop()
+                value = node if self.expect_peek(token.RBRACE) else None
+                precedence = outer
+                mode = M_INFIX
+
+            elif mode == M_STATEMENT:
+                t = self.cur_token.Type
+                if t == token.LET:
+                    node = ast.LetStatement(self.cur_token)
+                    if not self.expect_peek(token.IDENT):
+                        value = None
+                        mode = M_STATEMENT_DONE
+                        continue
+                    node.name = ast.Identifier(self.cur_token, self.cur_token.Literal)
+                    if not self.expect_peek(token.ASSIGN):
+                        value = None
+                        mode = M_STATEMENT_DONE
+                        continue
+                    self.next_token()
+                    push((F_LET, precedence, node, None))
+                elif t == token.RETURN:
+                    node = ast.ReturnStatement(self.cur_token)
+                    self.next_token()
+                    push((F_RETURN, precedence, node, None))
+                else:
+                    push((F_EXPRESSION_STMT, precedence, ast.ExpressionStatement(self.cur_token), None))
+                precedence = lowest
+                mode = M_EXPRESSION
+
+            elif mode == M_STATEMENT_DONE:
+                kind, outer, node, extra = stack[-1]
+                if kind != F_BLOCK: # F_ROOT
+                    return value
+                if value != None:
+                    node.statements.append(value)
+                self.next_token()
+                mode = M_BLOCK_NEXT
+
+            elif mode == M_BLOCK:
+                push((F_BLOCK, precedence, ast.BlockStatement(self.cur_token), None))
+                self.next_token()
+                mode = M_BLOCK_NEXT
+
+            elif mode == M_BLOCK_NEXT:
+                if not self.current_token_is(token.RBRACE) and not self.current_token_is(token.EOF):
+                    mode = M_STATEMENT
+                    continue
+                value = pop()[2]
+                mode = M_BLOCK_DONE
+
+            else: # M_BLOCK_DONE
+                kind, outer, node, extra = pop()
+                precedence = outer
+                mode = M_INFIX
+                if kind == F_IF_CONSEQUENCE:
+                    node.consequence = value
+                    value = node
+                    if self.peek_token_is(token.ELSE):
+                        self.next_token()
+                        if not self.expect_peek(token.LBRACE):
+                            value = None
+                            continue
+                        push((F_IF_ALTERNATIVE, outer, node, None))
+                        mode = M_BLOCK
+                elif kind == F_IF_ALTERNATIVE:
+                    node.alternative = value
+                    value = node
+                elif kind == F_BODY:
+                    node.body = value
+                    value = node
+                else: # F_ROOT
+                    return value
+
+def ref(node):
+    """
+    Maps a node that failed to parse (None) to arena.NONE
+    """
+    return arena.NONE if node == None else node
+
+class ArenaParser(Parser):
+    """
+    A Parser appending nodes to an ast.arena.Arena instead of building node
+    objects: every parse function returns the index of its node, or None on
+    errors as usual. parse_program returns the Arena with its root set.
+    """
+
+    arena = None # Arena
+    add_node = None # fn(kind, token, a, b, c) appending a node to the arena
+
+    def reset(self, lexer, errors=None):
+        self.arena = arena.Arena()
+        self.add_node = self.arena.add
+        self.lazy_bodies = False
+        return super().reset(lexer, errors)
+
+    def parse_program(self):
+        statements = list(self.parse_statements())
+        nodes = self.arena
+        nodes.root = nodes.add(arena.PROGRAM, None, nodes.add_list(statements), len(statements))
+        return nodes
+
+    def parse_let_statement(self):
+        tok = self.cur_token
+        if not self.expect_peek(token.IDENT):
+            return None
+        name = self.add_node(arena.IDENTIFIER, self.cur_token)
+        if not self.expect_peek(token.ASSIGN):
+            return None
+        self.next_token()
+        value = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.SEMICOLON):
+            self.next_token()
+        return self.add_node(arena.LET, tok, name, ref(value))
+
+    def parse_return_statement(self):
+        tok = self.cur_token
+        self.next_token()
+        value = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.SEMICOLON):
+            self.next_token()
+        return self.add_node(arena.RETURN, tok, ref(value))
+
+    def parse_expression_statement(self):
+        tok = self.cur_token
+        expression = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.ASSIGN) and expression != None \
+                and self.arena.kinds[expression] == arena.INDEX:
+            return self.parse_assign_index_statement(expression)
+        if self.peek_token_is(token.SEMICOLON):
+            self.next_token()
+        return self.add_node(arena.EXPRESSION_STMT, tok, ref(expression))
+
+    def parse_assign_index_statement(self, target):
+        self.next_token()
+        tok = self.cur_token
+        self.next_token()
+        value = self.parse_expression(Precedence.LOWEST.value)
+        if self.peek_token_is(token.SEMICOLON):
+            self.next_token()
+        return self.add_node(arena.ASSIGN_INDEX, tok,
+            self.arena.a[target], self.arena.b[target], ref(value))
+
+    def parse_identifer(self):
+        return self.add_node(arena.IDENTIFIER, self.cur_token)
+
+    def parse_integer_literal(self):
+        try:
+            int(self.cur_token.Literal)
+        except ValueError:
+            msg = 'could not parse {} as integer'.format(self.cur_token)
+            self.errors.append(msg)
+            return None
+        return self.add_node(arena.INTEGER, self.cur_token)
+
+    def parse_string_literal(self):
+        return self.add_node(arena.STRING, self.cur_token)
+
+    def parse_boolean(self):
+        return self.add_node(arena.BOOLEAN, self.cur_token, 1 if self.current_token_is(token.TRUE) else 0)
+
+    def parse_prefix_expression(self):
+        tok = self.cur_token
+        self.next_token()
+        right = self.parse_expression(Precedence.PREFIX.value)
+        return self.add_node(arena.PREFIX, tok, ref(right))
+
+    def parse_infix_expression(self, left):
+        tok = self.cur_token
+        precedence = self.cur_precendence()
+        self.next_token()
+        right = self.parse_expression(precedence)
+        return self.add_node(arena.INFIX, tok, ref(left), ref(right))
+
+    def parse_if_expression(self):
+        tok = self.cur_token
+        if not self.expect_peek(token.LPAREN):
+            return None
+        self.next_token()
+        condition = self.parse_expression(Precedence.LOWEST.value)
+        if not self.expect_peek(token.RPAREN):
+            return None
+        if not self.expect_peek(token.LBRACE):
+            return None
+        consequence = self.parse_block_statement()
+        alternative = arena.NONE
+        if self.peek_token_is(token.ELSE):
+            self.next_token()
+            if not self.expect_peek(token.LBRACE):
+                return None
+            alternative = self.parse_block_statement()
+        return self.add_node(arena.IF, tok, ref(condition), consequence, alternative)
+
+    def parse_block_statement(self):
+        tok = self.cur_token
+        statements = []
+        self.next_token()
+        while not self.current_token_is(token.RBRACE) and not self.current_token_is(token.EOF):
+            stmt = self.parse_statement()
+            if stmt != None:
+                statements.append(stmt)
+            self.next_token()
+        return self.add_node(arena.BLOCK, tok, self.arena.add_list(statements), len(statements))
+
+    def parse_function_literal(self):
+        return self.parse_function(arena.FUNCTION)
+
+    def parse_macro_literal(self):
+        return self.parse_function(arena.MACRO)
+
+    def parse_function(self, kind):
+        tok = self.cur_token
+        if not self.expect_peek(token.LPAREN):
+            return None
+        parameters = self.parse_function_parameters()
+        if not self.expect_peek(token.LBRACE):
+            return None
+        body = self.parse_block_statement()
+        start, count = self.add_list(parameters)
+        return self.add_node(kind, tok, start, count, body)
+
+    def parse_function_parameters(self):
+        identifiers = []
+        if self.peek_token_is(token.RPAREN):
+            self.next_token()
+            return identifiers
+        self.next_token()
+        identifiers.append(self.add_node(arena.IDENTIFIER, self.cur_token))
+        while self.peek_token_is(token.COMMA):
+            self.next_token()
+            self.next_token()
+            identifiers.append(self.add_node(arena.IDENTIFIER, self.cur_token))
+        if not self.expect_peek(token.RPAREN):
+            return None
+        return identifiers
+
+    def parse_call_expression(self, function):
+        tok = self.cur_token
+        start, count = self.add_list(self.parse_expression_list(token.RPAREN))
+        return self.add_node(arena.CALL, tok, ref(function), start, count)
+
+    def parse_array_literal(self):
+        tok = self.cur_token
+        start, count = self.add_list(self.parse_expression_list(token.RBRACKET))
+        return self.add_node(arena.ARRAY, tok, start, count)
+
+    def parse_index_expression(self, left):
+        tok = self.cur_token
+        self.next_token()
+        index = self.parse_expression(Precedence.LOWEST.value)
+        if not self.expect_peek(token.RBRACKET):
+            return None
+        return self.add_node(arena.INDEX, tok, ref(left), ref(index))
+
+    def parse_hash_literal(self):
+        tok = self.cur_token
+        pairs = []
+        while not self.peek_token_is(token.RBRACE):
+            self.next_token()
+            key = self.parse_expression(Precedence.LOWEST.value)
+            if not self.expect_peek(token.COLON):
+                return None
+            self.next_token()
+            value = self.parse_expression(Precedence.LOWEST.value)
+            pairs.append(ref(key))
+            pairs.append(ref(value))
+            if not self.peek_token_is(token.RBRACE) and not self.expect_peek(token.COMMA):
+                return None
+        if not self.expect_peek(token.RBRACE):
+            return None
+        return self.add_node(arena.HASH, tok, self.arena.add_list(pairs), len(pairs) // 2)
+
+    def add_list(self, nodes):
+        """
+        Stores a list field, returning its (start, count); a list that
+        failed to parse (None) gets the count arena.NONE
+        """
+        if nodes == None:
+            return 0, arena.NONE
+        return self.arena.add_list([ref(node) for node in nodes]), len(nodes)
+
+class BufferArenaParser(ArenaParser):
+    """
+    An ArenaParser reading token kinds and literal offsets straight from the
+    columns of a BufferLexer's TokenBuffer: cur_token and peek_token are
+    token indexes, so no Token is built while parsing.
+    """
+
+    tokens = None # TokenBuffer
+    kinds = None # its array of token kinds
+    last = 0 # index of its EOF token
+
+    def reset(self, lexer, errors=None):
+        self.arena = arena.Arena()
+        self.add_node = self.add_buffer_node
+        self.lazy_bodies = False
+        self.lexer = lexer
+        self.tokens = lexer.buffer
+        self.kinds = self.tokens.kinds
+        self.last = len(self.kinds) - 1
+        if errors == None:
+            errors = []
+        self.errors = errors
+        self.call_sites = {}
+        self.statement_count = 0
+        self.cur_token = None
+        self.peek_token = lexer.index - 1
+        self.next_token()
+        self.next_token()
+        return self
+
+    def next_token(self):
+        self.cur_token = self.peek_token
+        self.peek_token = min(self.peek_token + 1, self.last)
+
+    def current_token_is(self, t):
+        return self.kinds[self.cur_token] == t
+
+    def peek_token_is(self, t):
+        return self.kinds[self.peek_token] == t
+
+    def peek_precendence(self):
+        return precedences.get(self.kinds[self.peek_token], Precedence.LOWEST.value)
+
+    def cur_precendence(self):
+        return precedences.get(self.kinds[self.cur_token], Precedence.LOWEST.value)
+
+    def add_buffer_node(self, kind, i, a=arena.NONE, b=arena.NONE, c=arena.NONE):
+        if i == None:
+            return self.arena.add_literal(kind, token.ILLEGAL, None, a, b, c)
+        return self.arena.add_literal(kind, self.kinds[i], self.tokens.literal(i), a, b, c)
+
+    def parse_statement(self):
+        kind = self.kinds[self.cur_token]
+        if kind == token.LET:
+            return self.parse_let_statement()
+        if kind == token.RETURN:
+            return self.parse_return_statement()
+        return self.parse_expression_statement()
+
+    def parse_expression(self, precedence):
+        kinds = self.kinds
+        prefix = self.prefix_parse_fns.get(kinds[self.cur_token])
+        if prefix == None:
+            self.no_prefix_parse_fn_error(kinds[self.cur_token])
+            return None
+        left_exp = prefix(self)
+        while kinds[self.peek_token] != token.SEMICOLON and precedence < self.peek_precendence():
+            infix = self.infix_parse_fns.get(kinds[self.peek_token])
+            if infix == None:
+                return left_exp
+            self.next_token()
+            left_exp = infix(self, left_exp)
+        return left_exp
+
+    def parse_integer_literal(self):
+        i = self.cur_token
+        try:
+            int(self.tokens.literal(i))
+        except ValueError:
+            msg = 'could not parse {} as integer'.format(self.tokens.token(i))
+            self.errors.append(msg)
+            return None
+        return self.add_node(arena.INTEGER, i)
+
+    def peek_error(self, t):
+        msg = 'expected token to be {}, got {} instead'.format(
+            token.type_name(t), token.type_name(self.kinds[self.peek_token]))
+        self.errors.append(msg + self.error_location(1))
+
+    def error_location(self, back):
+        line, column = self.tokens.location(self.peek_token if back == 1 else self.cur_token)
+        return ' at line {}, column {}'.format(line, column)
+
+
+def new(lexer, lazy_bodies=False):
+    return Parser(lexer, lazy_bodies=lazy_bodies)
+
+def new_iterative(lexer, lazy_bodies=False):
+    return IterativeParser(lexer, lazy_bodies=lazy_bodies)
+
+def new_arena(l):
+    """
+    Returns an ArenaParser, one reading the token columns directly when l is
+    a BufferLexer
+    """
+    if isinstance(l, lexer.BufferLexer):
+        return BufferArenaParser(l)
+    return ArenaParser(l)
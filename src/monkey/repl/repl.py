@@ -7,7 +7,6 @@ from monkey import vm
 from monkey.compiler import symbol_table
 from monkey.common import utilities
 from monkey.evaluator import macro_expansion
-import keyboard
 
 prompt = ">> "
 MONKEY_FACE = '''
@@ -24,14 +23,64 @@ MONKEY_FACE = '''
            '-----'
 '''
 
-def start(interpreter=True):
-    # need one instance since we are persisting values
-    env = environment.new_environment()
-    macro_env = environment.new_environment()
-    # need to keep around constants, globals and symbol table for compiler
-    constants = []
-    global_vars = utilities.make_list(vm.GLOBAL_SIZE)
-    sym_table = symbol_table.new_symbol_table()
+class Session:
+    """
+    Holds the state that persists between programs run one after another,
+    e.g. lines typed into the REPL or statements streamed from a file
+    """
+
+    def __init__(self, interpreter=True, vm_macros=False, pure_macros=False):
+        self.interpreter = interpreter
+        # run macro bodies on the VM, falling back to the evaluator for the
+        # ones it cannot run
+        self.vm_macros = vm_macros
+        # macros without side effects can have their expansions cached
+        self.expansion_cache = macro_expansion.ExpansionCache() if pure_macros else None
+        # need one instance since we are persisting values
+        self.env = environment.new_environment()
+        self.macro_env = environment.new_environment()
+        # need to keep around constants, globals and symbol table for compiler
+        self.constants = []
+        self.global_vars = utilities.make_list(vm.GLOBAL_SIZE)
+        self.sym_table = symbol_table.new_symbol_table()
+        compiler.define_builtins(self.sym_table)
+        # instructions of every program compiled so far, in the order run,
+        # only kept once set to a list, e.g. for caching them
+        self.sections = None
+
+    def run(self, program):
+        """
+        Runs a parsed program and returns (result Object or None, error message 
+        or None)
+        """
+        macro_expansion.DefineMacros(program, self.macro_env)
+        expanded = macro_expansion.ExpandMacros(program, self.macro_env,
+            self.expansion_cache, self.vm_macros)
+        if self.interpreter:
+            return evaluator.Eval(expanded, self.env), None
+        comp = compiler.new_with_state(self.sym_table, self.constants, superinstructions=True)
+        err = comp.compile(expanded)
+        if err != None:
+            return None, f'Woops! Compilation failed:\n{err}\n'
+        code = comp.bytecode()
+        self.constants = code.constants
+        if self.sections != None:
+            self.sections.append(code.instructions)
+        return self.run_instructions(code.instructions)
+
+    def run_instructions(self, instructions):
+        """
+        Runs compiled instructions against the session's constants and
+        globals, returning the same as run
+        """
+        machine = vm.new_with_global_store(compiler.Bytecode(instructions, self.constants), self.global_vars)
+        err = machine.run()
+        if err != None:
+            return None, f'Woops! Executing bytecode failed:\n{err}\n'
+        return machine.last_popped_stack_element(), None
+
+def start(interpreter=True, vm_macros=False, pure_macros=False):
+    session = Session(interpreter, vm_macros, pure_macros)
     while True:
         line = input(prompt)
         if line == 'exit()':
@@ -44,29 +93,12 @@ def start(interpreter=True):
         program = p.parse_program()
         if len(p.errors) != 0:
             print_parse_errors(p.errors)
-        else:
-            if interpreter:
-                macro_expansion.DefineMacros(program, macro_env)
-                expanded = macro_expansion.ExpandMacros(program, macro_env)
-                evaluated = evaluator.Eval(expanded, env)
-                if evaluated != None:
-                    print(evaluated.inspect(), '\n')
-            else:
-                # Note: Compiler is not yet completed
-                comp = compiler.new_with_state(sym_table, constants)
-                err = comp.compile(program)
-                if err != None:
-                    print(f'Woops! Compilation failed:\n{err}\n')
-                    continue
-                code = comp.bytecode()
-                constants = code.constants
-                machine = vm.new_with_global_store(code, global_vars)
-                err = machine.run()
-                if err != None:
-                    print(f'Woops! Executing bytecode failed:\n{err}\n')
-                    continue
-                last_popped = machine.last_popped_stack_element()
-                print(last_popped.inspect(), '\n')
+            continue
+        result, err = session.run(program)
+        if err != None:
+            print(err)
+        elif result != None:
+            print(result.inspect(), '\n')
 
 def print_parse_errors(errors):
     print(MONKEY_FACE)
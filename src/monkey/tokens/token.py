@@ -1,52 +1,69 @@
 from typing import NamedTuple
 
+# Token kinds are small integers so they can be compared cheaply and stored
+# compactly (see lexer.TokenBuffer); `names` maps each back to its display name.
+names = [
+    "ILLEGAL",
+    "EOF",
+    # Identifiers + literals
+    "IDENT", # add, foobar, x, y, ...
+    "INT",   # 1343456
+    "STRING",
+    # Operators
+    "=", "+", "-", "!", "*", "/", "<", ">", "==", "!=",
+    # Delimiters
+    ",", ";", "(", ")", "{", "}", "[", "]", ":",
+    # Keywords
+    "FUNCTION", "LET", "TRUE", "FALSE", "IF", "ELSE", "RETURN", "MACRO",
+]
+
 # Constants
-ILLEGAL = "ILLEGAL"
-EOF     = "EOF"
+ILLEGAL = 0
+EOF     = 1
 # Identifiers + literals
-IDENT = "IDENT" # add, foobar, x, y, ...
-INT   = "INT"   # 1343456
-STRING = "STRING"
+IDENT  = 2
+INT    = 3
+STRING = 4
 
 # Operators
-ASSIGN   = "="
-PLUS     = "+"
-MINUS    = "-"
-BANG     = "!"
-ASTERISK = "*"
-SLASH    = "/"
+ASSIGN   = 5
+PLUS     = 6
+MINUS    = 7
+BANG     = 8
+ASTERISK = 9
+SLASH    = 10
 
-LT = "<"
-GT = ">"
+LT = 11
+GT = 12
 
-EQ     = "=="
-NOT_EQ = "!="
+EQ     = 13
+NOT_EQ = 14
 
 # Delimiters
-COMMA     = ","
-SEMICOLON = ";"
+COMMA     = 15
+SEMICOLON = 16
 
-LPAREN = "("
-RPAREN = ")"
-LBRACE = "{"
-RBRACE = "}"
-LBRACKET = "["
-RBRACKET = "]"
-COLON = ":"
+LPAREN   = 17
+RPAREN   = 18
+LBRACE   = 19
+RBRACE   = 20
+LBRACKET = 21
+RBRACKET = 22
+COLON    = 23
 
 # Keywords
-FUNCTION = "FUNCTION"
-LET      = "LET"
-TRUE     = "TRUE"
-FALSE    = "FALSE"
-IF       = "IF"
-ELSE     = "ELSE"
-RETURN   = "RETURN"
-MACRO    = "MACRO"
+FUNCTION = 24
+LET      = 25
+TRUE     = 26
+FALSE    = 27
+IF       = 28
+ELSE     = 29
+RETURN   = 30
+MACRO    = 31
 
 # immutable 'struct'
 class Token(NamedTuple):
-    Type: str
+    Type: int
     Literal: str
 
 keywords = {
@@ -61,4 +78,10 @@ keywords = {
 }
 
 def lookup_ident(ident):
-    return keywords[ident] if ident in keywords else IDENT
\ No newline at end of file
+    return keywords[ident] if ident in keywords else IDENT
+
+def type_name(token_type):
+    """
+    Returns the display name of a token kind, e.g. "=" for ASSIGN
+    """
+    return names[token_type]
@@ -1,109 +1,257 @@
 """
 Monkey VM
 """
-from collections import OrderedDict
 from typing import List
+from collections import Counter
 from monkey import code
 from monkey import compiler
 from monkey import object
+from monkey.object import vector
+from monkey.evaluator.builtins import builtin_list
+from monkey.evaluator import quote_unquote
 from monkey.common import utilities
 
-STACK_SIZE = 2048
-GLOBAL_SIZE = 65536
-# instead of creating new booleans every time we need them, we just create the 
-# two instances we will ever need 
-TRUE = object.Boolean(True)
-FALSE = object.Boolean(False)
-NULL = object.Null()
+STACK_SIZE = 2048 # initial size of the stack, which grows up to MAX_STACK_SIZE
+MAX_STACK_SIZE = 1 << 20
+GLOBAL_SIZE = 65536 # initial size of the global store, which grows as needed
+# instead of creating new booleans every time we need them, we just share the 
+# two instances we will ever need (the same ones builtins return)
+TRUE = object.TRUE
+FALSE = object.FALSE
+NULL = object.NULL
+# executions of a generic OpAdd, OpGreaterThan or OpIndex before it is
+# rewritten into a variant specialized for the operand types it sees. They
+# are counted from the second run of a program on: a program run once, like
+# a REPL statement, cannot get hot, having no loops.
+QUICKEN_AFTER = 8
+
+class Sites:
+    """
+    State kept per instruction of a program across the runs of it:
+    execution counts for quickening and inline cache slots. It hangs off
+    the Bytecode holding the instructions, and goes away with it.
+    """
+    runs: int = 0 # runs of the instructions so far
+    counts: bytearray = None # executions of the generic instruction at a position, once counted
+    caches: dict = None # position after an instruction -> its inline cache slot
+
+    def __init__(self):
+        self.runs = 0
+        self.caches = {}
+
+# Integers live on the stack and in the global store as Python ints, which
+# saves allocating an Integer for every constant and every result. They are
+# boxed into Integers only when handed out: to builtins, into arrays and
+# hashes, to quotes and as the last popped element.
+
+def box(value):
+    """
+    Returns the Integer for an int from the stack; other Objects are returned
+    as they are
+    """
+    return object.Integer(value = value) if type(value) is int else value
+
+def unbox(obj):
+    """
+    Returns the int held by an Integer, as it is kept on the stack; other
+    Objects, and Integers not holding an int (e.g. the result of a division),
+    are returned as they are
+    """
+    if type(obj) is object.Integer and type(obj.value) is int:
+        return obj.value
+    return obj
 
 class VM:
 
     constants: List[object.Object] = []
     instructions: code.Instructions = None
-    stack: List[object.Object] = [] # stack top
+    stack: List[object.Object] = [] # stack top; Integers are kept as ints
     sp: int = 0 # stack top index
     global_vars: List[object.Object]
+    trace: list = None # when set, the opcode of every executed instruction is appended
+    quicken: bool = True # rewrite hot generic instructions into specialized ones
+    inline_caches: bool = True # look up hash keys through inline caches
+    specializations: Counter # specialized opcode name -> times rewritten into it
+    deoptimizations: Counter # specialized opcode name -> times its guard failed
+    cache_hits: int = 0 # inline cache lookups that found their entry
+    cache_misses: int = 0 # inline cache lookups that had to fill it
+    bytecode = None # the Bytecode run, which keeps the Sites of its instructions
 
-    def __init__(self, instructions, constants, stack, sp, global_vars):
+    def __init__(self, instructions, constants, stack, sp, global_vars, bytecode=None):
+        self.bytecode = bytecode
         self.instructions = instructions
         self.constants = constants
         self.stack = stack
         self.sp = sp
         self.global_vars = global_vars
+        self.specializations = Counter()
+        self.deoptimizations = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def stack_top(self):
-        return None if self.sp == 0 else self.stack[self.sp - 1]
+        return None if self.sp == 0 else box(self.stack[self.sp - 1])
     
     def run(self):
         """
-        Execute every instruction generated by the compiler
+        Execute every instruction generated by the compiler, either bytearray
+        instructions or wordcode
         """
+        ins = self.instructions
+        wordcode = code.is_wordcode(ins)
+        bits = code.OPERAND_BITS # how far OpExtendedArg operands are shifted
+        trace = self.trace
+        site = self.sites()
+        if site != None:
+            site.runs += 1
+        # instructions are counted from their second run on; those mapped
+        # read-only, e.g. from a .mnkc file, are not quickened
+        quicken = self.quicken and site != None and site.runs > 1 and code.is_writable(ins)
+        if quicken and site.counts == None:
+            site.counts = bytearray(len(ins))
+        # inline cache slots are keyed by ip once it has moved past the
+        # instruction, which is as unique as its start
+        caches = site.caches if self.inline_caches and site != None else None
         ip = 0
-        while ip < len(self.instructions):
-            op = self.instructions[ip]
-            dfn, _ = code.lookup(op)
-            # calculate width of Opcode + Operands; the + 1 is to make sure 
-            # entire width is included
-            width = sum(dfn.operand_widths) + 1
-            if op == code.OpConstant:
-                # because we are using bytearray we will need to specify
-                # the end range of the instructions bytearray so we don't
-                # overshoot the operand and accidentally read next opcode
-                const_index = code.bytes_to_int(self.instructions[ip+1:ip+width])
-                # we increment the ip offset variables based on the OpCode
-                # for e.g. here, we need to increment by 3 since we have an
-                # OpCode and two Operands
+        ext = 0 # operand bits carried by OpExtendedArg prefixes
+        while ip < len(ins):
+            # decoding moves ip past the instruction, so jumps just overwrite it
+            if wordcode:
+                # every instruction is one word: no width lookup needed
+                word = ins[ip]
+                op = word & 0xff
+                operand = word >> 8
+                ip += 1
+            else:
+                op = ins[ip]
+                dfn, _ = code.lookup(op)
+                # calculate width of Opcode + Operands; the + 1 is to make sure 
+                # entire width is included
+                width = sum(dfn.operand_widths) + 1
+                if width == 2:
+                    operand = ins[ip+1]
+                elif width > 2:
+                    operand = code.bytes_to_int(ins[ip+1:ip+width])
+                bits = 8 * (width - 1)
                 ip += width
-                err = self.push(self.constants[const_index])
+            if ext != 0:
+                operand |= ext << bits
+                ext = 0
+            if trace != None:
+                trace.append(op)
+            if op == code.OpExtendedArg:
+                ext = operand
+            elif op == code.OpConstant:
+                const_index = operand
+                # macro expansion can leave a non-int (e.g. 5 / 2) in an Integer
+                err = self.push(unbox(self.constants[const_index]))
                 if err != None:
                     return err
             elif op == code.OpSetGlobal:
-                global_index = code.bytes_to_int(self.instructions[ip+1:ip+width])
+                global_index = operand
+                if global_index >= len(self.global_vars):
+                    self.global_vars.extend(utilities.make_list(global_index + 1 - len(self.global_vars)))
                 self.global_vars[global_index] = self.pop()
-                ip += width
             elif op == code.OpGetGlobal:
-                global_index = code.bytes_to_int(self.instructions[ip+1:ip+width])
-                err = self.push(self.global_vars[global_index])
+                global_index = operand
+                value = self.global_vars[global_index]
+                # a global store handed in may hold Integers
+                if type(value) is object.Integer:
+                    value = unbox(value)
+                err = self.push(value)
                 if err != None:
                     return err
-                ip += width
+            # specialized instructions check their operand types and go back
+            # to the generic instruction if they do not match; they come early
+            # in the chain, being the hot ones
+            elif op == code.OpAddInt:
+                right = self.stack[self.sp - 1]
+                left = self.stack[self.sp - 2]
+                if type(left) is int and type(right) is int:
+                    self.sp -= 1
+                    self.stack[self.sp - 1] = left + right
+                else:
+                    err = self.deoptimize(ins, ip - 1, op)
+                    if err != None:
+                        return err
+            elif op == code.OpAddStr:
+                right = self.stack[self.sp - 1]
+                left = self.stack[self.sp - 2]
+                if type(left) is object.String and type(right) is object.String:
+                    self.sp -= 1
+                    self.stack[self.sp - 1] = object.String(value=left.value + right.value)
+                else:
+                    err = self.deoptimize(ins, ip - 1, op)
+                    if err != None:
+                        return err
+            elif op == code.OpGreaterThanInt:
+                right = self.stack[self.sp - 1]
+                left = self.stack[self.sp - 2]
+                if type(left) is int and type(right) is int:
+                    self.sp -= 1
+                    self.stack[self.sp - 1] = TRUE if left > right else FALSE
+                else:
+                    err = self.deoptimize(ins, ip - 1, op)
+                    if err != None:
+                        return err
+            elif op == code.OpIndexArrayInt:
+                index = self.stack[self.sp - 1]
+                left = self.stack[self.sp - 2]
+                if type(left) is object.Array and type(index) is int:
+                    self.sp -= 1
+                    elements = left.elements
+                    self.stack[self.sp - 1] = unbox(elements[index]) if 0 <= index < len(elements) else NULL
+                else:
+                    err = self.deoptimize(ins, ip - 1, op)
+                    if err != None:
+                        return err
+            elif op == code.OpIndexHashStr:
+                index = self.stack[self.sp - 1]
+                left = self.stack[self.sp - 2]
+                if type(left) is object.Hash and type(index) is object.String:
+                    self.sp -= 1
+                    if caches != None and left.general != None:
+                        value = self.cached_hash_get(caches, ip, left, index)
+                    else:
+                        value = left.get(index)
+                    self.stack[self.sp - 1] = unbox(value) if value != None else NULL
+                else:
+                    err = self.deoptimize(ins, ip - 1, op)
+                    if err != None:
+                        return err
             elif op == code.OpAdd or op == code.OpSub or op == code.OpMul or op == code.OpDiv:
+                if op == code.OpAdd and quicken:
+                    # operand-less instructions take up one byte or word
+                    self.warm_up(site, ip - 1, op)
                 err = self.execute_binary_operation(op)
                 if err != None:
                     return err
-                # only need to move offset by 1 as there are no operands
-                ip += 1
             elif op == code.OpEqual or op == code.OpNotEqual or op == code.OpGreaterThan:
+                if op == code.OpGreaterThan and quicken:
+                    self.warm_up(site, ip - 1, op)
                 err = self.execute_comparison(op)
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpBang:
                 err = self.execute_bang_operator()
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpMinus:
                 err = self.execute_minus_operator()
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpTrue:
                 err = self.push(TRUE)
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpFalse:
                 err = self.push(FALSE)
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpPop:
                 self.pop()
-                ip += 1
             elif op == code.OpJump:
-                # This one is just like OpConstant, need to jump to 3 places
-                pos = code.bytes_to_int(self.instructions[ip+1:ip+width])
+                pos = operand
                 # pos is the final destination, so instruction pointer should
                 # point to it
                 ip = pos
@@ -111,29 +259,25 @@ class VM:
                 # pos should be the place where we would jump to. For e.g:
                 # VmTestCase(input='if (1 > 2) { 10 } else { 20 }', expected=20)
                 # OpJumpNotTruthy ip=7 bytearray(b'\x10\x00\x01') next_ip=17 (jump to 0010)
-                pos = code.bytes_to_int(self.instructions[ip+1:ip+width+1])
-                ip += width
+                pos = operand
                 # In this case we need to actually see if condition was truthy
                 condition = self.pop()
                 if not self.is_truthy(condition):
-                    # if not truthy, instruction points to right before final destination
-                    ip = pos - 1
+                    # if not truthy, instruction points to the final destination
+                    ip = pos
             elif op == code.OpNull:
                 err = self.push(NULL)
                 if err != None:
                     return err
-                ip += 1
             elif op == code.OpArray:
-                num_elements = code.bytes_to_int(self.instructions[ip+1:ip+width])
-                ip += width
+                num_elements = operand
                 array = self.build_array(self.sp - num_elements, self.sp)
                 self.sp = self.sp - num_elements
                 err = self.push(array)
                 if err != None:
                     return err
             elif op == code.OpHash:
-                num_elements = code.bytes_to_int(self.instructions[ip+1:ip+width])
-                ip += width
+                num_elements = operand
                 h, err = self.build_hash(self.sp - num_elements, self.sp)
                 if err != None:
                     return err
@@ -142,33 +286,214 @@ class VM:
                 if err != None:
                     return err
             elif op == code.OpIndex:
+                if quicken:
+                    self.warm_up(site, ip - 1, op)
                 index = self.pop()
                 left = self.pop()
-                err = self.execute_index_expression(left, index)
+                err = self.execute_index_expression(left, index, caches, ip)
                 if err != None:
                     return err
-                ip += width
+            elif op == code.OpSetIndex:
+                value = self.pop()
+                index = self.pop()
+                left = self.pop()
+                err = self.execute_set_index(left, index, value)
+                if err != None:
+                    return err
+            elif op == code.OpGetBuiltin:
+                builtin_index = operand
+                err = self.push(builtin_list[builtin_index])
+                if err != None:
+                    return err
+            elif op == code.OpCall:
+                num_args = operand
+                err = self.execute_call(num_args)
+                if err != None:
+                    return err
+            elif op == code.OpQuote:
+                const_index = operand
+                err = self.execute_quote(self.constants[const_index].node)
+                if err != None:
+                    return err
+            elif op == code.OpReturnValue:
+                # a return outside of any function ends the program, leaving
+                # the value as the last popped element
+                self.pop()
+                return None
+            # superinstructions; the two 2-byte operands of a pair arrive
+            # together in operand
+            elif op == code.OpGetGlobalConstant:
+                err = self.push(unbox(self.global_vars[operand >> 16]))
+                if err != None:
+                    return err
+                err = self.push(unbox(self.constants[operand & 0xffff]))
+                if err != None:
+                    return err
+            elif op == code.OpConstantConstant:
+                err = self.push(unbox(self.constants[operand >> 16]))
+                if err != None:
+                    return err
+                err = self.push(unbox(self.constants[operand & 0xffff]))
+                if err != None:
+                    return err
+            elif op == code.OpSetGetGlobal:
+                global_index = operand >> 16
+                if global_index >= len(self.global_vars):
+                    self.global_vars.extend(utilities.make_list(global_index + 1 - len(self.global_vars)))
+                self.global_vars[global_index] = self.pop()
+                err = self.push(unbox(self.global_vars[operand & 0xffff]))
+                if err != None:
+                    return err
+            elif op == code.OpConstantIndex:
+                left = self.pop()
+                err = self.execute_index_expression(left, unbox(self.constants[operand]), caches, ip)
+                if err != None:
+                    return err
+            elif op == code.OpConstantAdd or op == code.OpConstantSub or op == code.OpConstantMul:
+                err = self.push(unbox(self.constants[operand]))
+                if err != None:
+                    return err
+                err = self.execute_binary_operation(code.superinstructions[op][1])
+                if err != None:
+                    return err
+            elif op == code.OpGreaterThanJumpNotTruthy:
+                err = self.execute_comparison(code.OpGreaterThan)
+                if err != None:
+                    return err
+                condition = self.pop()
+                if not self.is_truthy(condition):
+                    ip = operand
+        return None
+
+    def sites(self):
+        """
+        Returns the Sites of the instructions, made on the first run that
+        quickens or caches, or None if neither is on or there is no Bytecode
+        to keep them in
+        """
+        if self.bytecode == None or not (self.quicken or self.inline_caches):
+            return None
+        if self.bytecode.sites == None:
+            self.bytecode.sites = Sites()
+        return self.bytecode.sites
+
+    def warm_up(self, site, pos, op):
+        """
+        Counts an execution of the generic instruction at pos. On the
+        QUICKEN_AFTER-th one, the instruction is rewritten into the variant
+        specialized for the operands now on the stack, if there is one; else
+        counting starts over.
+        """
+        counts = site.counts
+        counts[pos] += 1
+        if counts[pos] < QUICKEN_AFTER:
+            return
+        counts[pos] = 0
+        specialized = self.specialize(op, self.stack[self.sp - 2], self.stack[self.sp - 1])
+        if specialized != None:
+            code.set_opcode(self.instructions, pos, specialized)
+            self.specializations[code.definitions[specialized].name] += 1
+
+    def specialize(self, op, left, right):
+        """
+        Returns the specialized variant of the generic op for the operands
+        left and right, or None
+        """
+        if op == code.OpAdd:
+            if type(left) is int and type(right) is int:
+                return code.OpAddInt
+            if type(left) is object.String and type(right) is object.String:
+                return code.OpAddStr
+        elif op == code.OpGreaterThan:
+            if type(left) is int and type(right) is int:
+                return code.OpGreaterThanInt
+        elif op == code.OpIndex:
+            if type(left) is object.Array and type(right) is int:
+                return code.OpIndexArrayInt
+            if type(left) is object.Hash and type(right) is object.String:
+                return code.OpIndexHashStr
         return None
 
+    def deoptimize(self, ins, pos, op):
+        """
+        Rewrites the specialized instruction at pos, whose operands did not
+        match, back into its generic instruction and executes that
+        """
+        generic = code.specializations[op]
+        code.set_opcode(ins, pos, generic)
+        self.deoptimizations[code.definitions[op].name] += 1
+        if generic == code.OpIndex:
+            index = self.pop()
+            left = self.pop()
+            return self.execute_index_expression(left, index)
+        if generic == code.OpGreaterThan:
+            return self.execute_comparison(generic)
+        return self.execute_binary_operation(generic)
+
+    def execute_quote(self, quoted):
+        """
+        Replaces the unquoted values on the stack with a Quote of a copy of
+        quoted holding them
+        """
+        paths = quote_unquote.site_paths(quoted)
+        values = []
+        for i in range(self.sp - len(paths), self.sp):
+            values.append(quote_unquote.convert_object_to_astnode(box(self.stack[i])))
+        self.sp = self.sp - len(paths)
+        return self.push(quote_unquote.fill(quoted, paths, values))
+
+    def cached_hash_get(self, caches, pos, h, key):
+        """
+        Does h.get(key) for a general hash through the inline cache slot at
+        pos. The slot holds the last key Object and its HashKey, which is not
+        built again while the key stays the same. Hashes with a shape or
+        dense keys find keys without a HashKey, so they skip the cache. key
+        must be hashable.
+        """
+        entry = caches.get(pos)
+        if entry != None and (entry[0] is key or
+                (type(entry[0]) is type(key) and entry[0].value == key.value)):
+            self.cache_hits += 1
+            hash_key = entry[1]
+        else:
+            self.cache_misses += 1
+            hash_key = key.hash_key()
+            caches[pos] = (key, hash_key)
+        pair = h.general.get(hash_key)
+        return None if pair == None else pair.value
+
+    def execute_call(self, num_args):
+        """
+        Calls the callee sitting below its arguments on the stack and replaces
+        callee and arguments with the result. Only builtins can be called for now.
+        """
+        callee = box(self.stack[self.sp - 1 - num_args])
+        if not isinstance(callee, object.Builtin):
+            return f'calling non-builtin: {callee.object_type()}'
+        args = [box(arg) for arg in self.stack[self.sp - num_args:self.sp]]
+        result = callee.fn(args)
+        self.sp = self.sp - num_args - 1
+        if result == None:
+            return self.push(NULL)
+        return self.push(unbox(result))
+
     def build_array(self, start_idx, end_idx):
         elements = utilities.make_list(end_idx - start_idx)
-        for i in range(end_idx):
-            elements[i - start_idx] = self.stack[i]
+        for i in range(start_idx, end_idx):
+            elements[i - start_idx] = box(self.stack[i])
         return object.Array(elements = elements)
     
     def build_hash(self, start_idx, end_idx):
-        hashed_pairs = OrderedDict()
+        keys = []
+        values = []
         for i in range(start_idx, end_idx, 2):
-            key = self.stack[i]
-            value = self.stack[i + 1]
-            pair = object.HashPair(key, value)
-            # check if the key is "hashable" by trying to call a hash_key
-            try:
-                hash_key = key.hash_key()
-                hashed_pairs[hash_key] = pair
-            except:
+            key = box(self.stack[i])
+            # check if the key is "hashable" by looking for a hash_key method
+            if not callable(getattr(key, 'hash_key', None)):
                 return None, f'unusable as hash key: {type(key)}'
-        return object.Hash(hashed_pairs), None
+            keys.append(key)
+            values.append(box(self.stack[i + 1]))
+        return object.new_hash(keys, values), None
 
     def is_truthy(self, obj):
         if type(obj) == object.Boolean:
@@ -184,21 +509,25 @@ class VM:
         """
         right = self.pop()
         left = self.pop()
+        if type(left) is int and type(right) is int:
+            return self.execute_binary_integer_operation(op, left, right)
+        left = box(left)
+        right = box(right)
         left_type = left.object_type()
         right_type = right.object_type()
         if left_type == object.INTEGER_OBJ and right_type == object.INTEGER_OBJ:
-            return self.execute_binary_integer_operation(op, left, right)
+            return self.execute_binary_integer_operation(op, left.value, right.value)
         elif left_type == object.STRING_OBJ and right_type == object.STRING_OBJ:
             return self.execute_binary_string_operation(op, left, right)
+        elif left_type == object.VECTOR_OBJ or right_type == object.VECTOR_OBJ:
+            return self.execute_binary_vector_operation(op, left, right)
         return f'unsupported types for binary operation: {left_type} {right_type}'
 
-    def execute_binary_integer_operation(self, op, left, right):
+    def execute_binary_integer_operation(self, op, left_value, right_value):
         """
-        Unwrap values of Integer objects of a binary operation and return result. 
+        Pushes the result of a binary operation on the values of two Integers.
         Otherwise, return an error if operator is unrecognized.
         """
-        left_value = left.value
-        right_value = right.value
         result = 0
         if op == code.OpAdd:
             result = left_value + right_value
@@ -210,7 +539,10 @@ class VM:
             result = left_value / right_value
         else:
             return f'unknown integer operator {op}'
-        self.push(object.Integer(value = result))
+        if type(result) is not int:
+            # a division gives a float, which only an Integer can carry
+            result = object.Integer(value = result)
+        return self.push(result)
     
     def execute_binary_string_operation(self, op, left, right):
         """
@@ -223,16 +555,33 @@ class VM:
         right_value = right.value
         return self.push(object.String(value = left_value + right_value))
 
+    def execute_binary_vector_operation(self, op, left, right):
+        """
+        Applies an element-wise operation where at least one side is a Vector;
+        an Integer operand is broadcast over the Vector.
+        """
+        operators = {code.OpAdd: '+', code.OpSub: '-', code.OpMul: '*'}
+        if op not in operators:
+            return f'unknown vector operator: {op}'
+        result, err = vector.binary_operation(operators[op], left, right)
+        if err != None:
+            return err
+        return self.push(result)
+
     def execute_comparison(self, op):
         """
         Executes comparison of integers or booleans using a compare operator
         """
         right = self.pop()
         left = self.pop()
+        if type(left) is int and type(right) is int:
+            return self.execute_integer_comparison(op, left, right)
+        left = box(left)
+        right = box(right)
         left_type = left.object_type()
         right_type = right.object_type()
         if left_type == object.INTEGER_OBJ or right_type == object.INTEGER_OBJ:
-            return self.execute_integer_comparison(op, left, right)
+            return self.execute_integer_comparison(op, left.value, right.value)
         if op == code.OpEqual:
             return self.push(self.native_bool_to_boolean_object(right == left))
         elif op == code.OpNotEqual:
@@ -240,12 +589,11 @@ class VM:
         else:
             return f'unknown operator {op} ({left_type} {right_type})'
     
-    def execute_integer_comparison(self, op, left, right):
+    def execute_integer_comparison(self, op, left_value, right_value):
         """
-        Executes integer comparison and pushes result on to the stack
+        Executes integer comparison of two values and pushes result on to the
+        stack; a Boolean compares as its value
         """
-        left_value = left.value
-        right_value = right.value
         if op == code.OpEqual:
             return self.push(self.native_bool_to_boolean_object(right_value == left_value))
         elif op == code.OpNotEqual:
@@ -255,41 +603,72 @@ class VM:
         else:
             return f'unknown operator {op}'
     
-    def execute_index_expression(self, left, index):
-        if left.object_type() == object.ARRAY_OBJ and index.object_type() == object.INTEGER_OBJ:
+    def execute_index_expression(self, left, index, caches=None, pos=None):
+        left = box(left)
+        if left.object_type() == object.ARRAY_OBJ and type(index) is int:
             return self.execute_array_index(left, index)
+        index = box(index)
+        if left.object_type() == object.ARRAY_OBJ and index.object_type() == object.INTEGER_OBJ:
+            return self.execute_array_index(left, index.value)
         elif left.object_type() == object.HASH_OBJ:
-            return self.execute_hash_index(left, index)
+            return self.execute_hash_index(left, index, caches, pos)
+        elif left.object_type() == object.VECTOR_OBJ and index.object_type() == object.INTEGER_OBJ:
+            element = vector.index(left, index.value)
+            return self.push(unbox(element) if element != None else NULL)
         return f'index operator not supported: {left.object_type()}'
     
-    def execute_array_index(self, array, index):
+    def execute_set_index(self, left, index, value):
+        """
+        Stores value into an array or hash in place. Assigning one past the
+        end of an array appends to it.
+        """
+        left = box(left)
+        index = box(index)
+        value = box(value)
+        if left.object_type() == object.ARRAY_OBJ and index.object_type() == object.INTEGER_OBJ:
+            elements = left.elements
+            i = index.value
+            if i == len(elements):
+                elements.append(value)
+            elif 0 <= i < len(elements):
+                elements[i] = value
+            else:
+                return f'index out of range: {i}'
+            return None
+        elif left.object_type() == object.HASH_OBJ:
+            if not callable(getattr(index, 'hash_key', None)):
+                return f'unusable as hash key: {type(index)}'
+            left.set(index, value)
+            return None
+        return f'index assignment not supported: {left.object_type()}'
+
+    def execute_array_index(self, array, i):
         """
         Executes and returns element form an array index operation. 
         If index is invalid, pushes NULL and returns.
         """
-        i = index.value
         max_idx = len(array.elements) - 1
         if i < 0 or i > max_idx:
             return self.push(NULL)
-        return self.push(array.elements[i])
+        return self.push(unbox(array.elements[i]))
 
-    def execute_hash_index(self, hash_object, index):
+    def execute_hash_index(self, hash_object, index, caches=None, pos=None):
         """
         Executes and returns element from an hash index operation. If index is 
         not hashable, return error message. If hash key does not exist in hash, 
-        pushes NULL and returns.
+        pushes NULL and returns. Given caches, the lookup goes through the
+        inline cache slot at pos.
         """
         # check if index is hashable
-        try:
-            hash_key = index.hash_key()
-        except:
-            return f'unusable as hash key: {type(key)}'
-        # check if hash key is valid
-        try:
-            pair = hash_object.pairs[hash_key]
-        except:
+        if not callable(getattr(index, 'hash_key', None)):
+            return f'unusable as hash key: {type(index)}'
+        if caches != None and hash_object.general != None:
+            value = self.cached_hash_get(caches, pos, hash_object, index)
+        else:
+            value = hash_object.get(index)
+        if value == None:
             return self.push(NULL)
-        return self.push(pair.value)
+        return self.push(unbox(value))
     
     def native_bool_to_boolean_object(self, boolean):
         """Convert Python boolean to Boolean Object."""
@@ -308,14 +687,19 @@ class VM:
     
     def execute_minus_operator(self):
         operand = self.pop()
+        if type(operand) is int:
+            return self.push(-operand)
         if operand.object_type() != object.INTEGER_OBJ:
             return f'unsupported type for negation: {operand.object_type()}'
         return self.push(object.Integer(value = -operand.value))
 
     def push(self, o):
-        if self.sp >= STACK_SIZE:
-            return "stack overflow"
-        self.stack[self.sp] = o
+        if self.sp >= len(self.stack):
+            if self.sp >= MAX_STACK_SIZE:
+                return "stack overflow"
+            self.stack.append(o)
+        else:
+            self.stack[self.sp] = o
         self.sp += 1
         return None
 
@@ -333,7 +717,7 @@ class VM:
         This is a peek version that doesn't actually pop the item off stack.
         It's used to test the vm.
         """
-        return self.stack[self.sp]
+        return box(self.stack[self.sp])
 
 def new(bytecode):
     return VM(
@@ -341,10 +725,18 @@ def new(bytecode):
         bytecode.constants,
         utilities.make_list(STACK_SIZE), 
         0,
-        utilities.make_list(GLOBAL_SIZE)
+        utilities.make_list(GLOBAL_SIZE),
+        bytecode
     )
 
 def new_with_global_store(bytecode, globals):
-    vm = new(bytecode)
-    vm.global_vars = globals
-    return vm
+    # not going through new(), which would allocate a global store only to
+    # throw it away
+    return VM(
+        bytecode.instructions,
+        bytecode.constants,
+        utilities.make_list(STACK_SIZE),
+        0,
+        globals,
+        bytecode
+    )
@@ -3,6 +3,7 @@ import sys
 sys.path.append("../src/")
 from monkey.tokens import token
 from monkey.ast import ast
+from monkey.ast import arena
 
 class AstTest(unittest.TestCase):
 
@@ -23,5 +24,104 @@ class AstTest(unittest.TestCase):
         self.assertEqual(program.string(), "let myVar = anotherVar;",
             msg = "program.string() wrong. got={}".format(program.string()))
 
+    def test_equality_and_hashing(self):
+        def infix(left, right):
+            return ast.InfixExpression(token.Token(token.PLUS, "+"), "+",
+                ast.IntegerLiteral(token.Token(token.INT, left), int(left)),
+                ast.Identifier(token.Token(token.IDENT, right), right))
+        # nodes compare by identity, so hash literal keys never merge
+        self.assertNotEqual(infix("1", "x"), infix("1", "x"))
+        self.assertEqual(len({infix("1", "x"): 1, infix("1", "x"): 2}), 2)
+        # structural keys compare by shape
+        self.assertEqual(ast.structural_key(infix("1", "x")), ast.structural_key(infix("1", "x")))
+        self.assertNotEqual(ast.structural_key(infix("1", "x")), ast.structural_key(infix("2", "x")))
+        block = ast.BlockStatement(token.Token(token.LBRACE, "{"),
+            [ast.ExpressionStatement(token.Token(token.INT, "1"), infix("1", "x"))])
+        other = ast.BlockStatement(token.Token(token.LBRACE, "{"),
+            [ast.ExpressionStatement(token.Token(token.INT, "1"), infix("1", "x"))])
+        self.assertEqual(len({ast.structural_key(block): 1, ast.structural_key(other): 2}), 1)
+        self.assertNotEqual(ast.structural_key(block), ast.structural_key(ast.Program(block.statements)))
+
+    def test_slots(self):
+        node = ast.Identifier(token.Token(token.IDENT, "x"), "x")
+        self.assertEqual(node.fields, ("token", "value"))
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.other = 1
+
+    def test_arena_round_trip(self):
+        def ident(name):
+            return ast.Identifier(token.Token(token.IDENT, name), name)
+        program = ast.Program([
+            ast.LetStatement(token.Token(token.LET, "let"), ident("f"),
+                ast.FunctionLiteral(token.Token(token.FUNCTION, "fn"), [ident("x"), ident("y")],
+                    ast.BlockStatement(token.Token(token.LBRACE, "{"), [
+                        ast.ExpressionStatement(token.Token(token.IDENT, "x"),
+                            ast.InfixExpression(token.Token(token.PLUS, "+"), "+", ident("x"), ident("y")))
+                    ]))),
+            ast.ExpressionStatement(token.Token(token.IF, "if"),
+                ast.IfExpression(token.Token(token.IF, "if"),
+                    ast.Boolean(token.Token(token.TRUE, "true"), True),
+                    ast.BlockStatement(token.Token(token.LBRACE, "{"), [
+                        ast.ExpressionStatement(token.Token(token.LBRACE, "{"),
+                            ast.HashLiteral(token.Token(token.LBRACE, "{"), {
+                                ast.StringLiteral(token.Token(token.STRING, "a"), "a"):
+                                    ast.IntegerLiteral(token.Token(token.INT, "1"), 1)}))
+                    ]))),
+        ])
+        nodes = arena.from_node(program)
+        self.assertEqual(ast.structural_key(nodes.to_node()), ast.structural_key(program))
+        self.assertEqual(nodes.kinds[nodes.root], arena.PROGRAM)
+        # children come before their parents
+        for i in range(len(nodes)):
+            for child in nodes.children(i):
+                self.assertLess(child, i)
+        kinds = [nodes.kinds[i] for i in nodes.walk()]
+        self.assertEqual(kinds[:5], [arena.PROGRAM, arena.LET, arena.IDENTIFIER,
+            arena.FUNCTION, arena.IDENTIFIER])
+        self.assertEqual(len(kinds), len(nodes))
+        data = arena.dumps(nodes)
+        loaded, err = arena.loads(data)
+        self.assertIsNone(err)
+        self.assertEqual(ast.structural_key(loaded.to_node()), ast.structural_key(program))
+        self.assertEqual(loaded.strings, nodes.strings)
+        self.assertEqual(arena.loads(data[:-1])[1], 'wrong size: want={} got={}'.format(len(data), len(data) - 1))
+        self.assertEqual(arena.loads(data[:-1] + b'?')[1], 'checksum mismatch')
+        self.assertEqual(arena.loads(b'MNKB' + data[4:])[1], 'not a serialized arena')
+
+    def test_arena_views(self):
+        nodes = arena.from_node(ast.Program([
+            ast.ExpressionStatement(token.Token(token.INT, "1"),
+                ast.InfixExpression(token.Token(token.PLUS, "+"), "+",
+                    ast.IntegerLiteral(token.Token(token.INT, "1"), 1),
+                    ast.PrefixExpression(token.Token(token.MINUS, "-"), "-",
+                        ast.IntegerLiteral(token.Token(token.INT, "2"), 2))))
+        ]))
+        program = nodes.view()
+        self.assertIsInstance(program, ast.Program)
+        infix = program.statements[0].expression
+        self.assertIsInstance(infix, ast.InfixExpression)
+        self.assertEqual(infix.operator, "+")
+        self.assertEqual(infix.right.right.value, 2)
+        self.assertEqual(infix.token, token.Token(token.PLUS, "+"))
+        self.assertEqual(program.string(), "(1 + (-2))")
+        with self.assertRaises(AttributeError):
+            infix.operator = "-"
+
+    def test_arena_visitor(self):
+        class IntegerSum(arena.Visitor):
+            total = 0
+            def visit_IntegerLiteral(self, nodes, i):
+                self.total += int(nodes.literal(i))
+        nodes = arena.from_node(ast.Program([
+            ast.ExpressionStatement(token.Token(token.LBRACKET, "["),
+                ast.ArrayLiteral(token.Token(token.LBRACKET, "["), [
+                    ast.IntegerLiteral(token.Token(token.INT, str(n)), n) for n in range(5)
+                ]))
+        ]))
+        visitor = IntegerSum()
+        visitor.visit(nodes, nodes.root)
+        self.assertEqual(visitor.total, 10)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
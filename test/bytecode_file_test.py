@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.append("../src/")
+from monkey import ast
+from monkey.lexer import lexer
+from monkey.parser import parser
+from monkey.object import *
+from monkey.code import *
+from monkey.compiler import compiler as c
+from monkey.compiler import bytecode_file
+from monkey.vm import vm as v
+
+class BytecodeFileTest(unittest.TestCase):
+
+    def compile(self, source):
+        comp = c.new()
+        err = comp.compile(parser.new(lexer.new(source)).parse_program())
+        self.assertIsNone(err, msg=f'compiler error: {err}')
+        return comp.bytecode()
+
+    def test_round_trip(self):
+        bytecode = self.compile('''
+            let big = -12345678901234567890 + 0;
+            let s = "héllo" + " world";
+            let q = quote(unquote(1 + 2) * x);
+            let f = fn() { 1 };
+            [big, s, {"k": q}]
+        ''')
+        data, err = bytecode_file.dumps(bytecode_file.CompiledProgram(bytecode.constants, [bytecode.instructions]))
+        self.assertIsNone(err)
+        loaded, err = bytecode_file.loads(data)
+        self.assertIsNone(err)
+        self.assertEqual(len(loaded.sections), 1)
+        self.assertEqual(bytes(loaded.sections[0]), bytes(bytecode.instructions))
+        self.assertEqual(len(loaded.constants), len(bytecode.constants))
+        for want, got in zip(bytecode.constants, loaded.constants):
+            self.assertEqual(type(got), type(want))
+            if isinstance(want, Quote):
+                self.assertEqual(ast.structural_key(got.node), ast.structural_key(want.node))
+            elif isinstance(want, CompiledFunction):
+                self.assertEqual(bytes(got.instructions), bytes(want.instructions))
+            else:
+                self.assertEqual(got.value, want.value)
+        vm = v.new(c.Bytecode(loaded.sections[0], loaded.constants))
+        self.assertIsNone(vm.run())
+        self.assertEqual(vm.last_popped_stack_element().inspect(), '[-12345678901234567890,héllo world,{k:  QUOTE((3 * x))}]')
+
+    def test_invalid_files(self):
+        bytecode = self.compile('1 + 2')
+        data, err = bytecode_file.dumps(bytecode_file.CompiledProgram(bytecode.constants, [bytecode.instructions]))
+        tests = [
+            (data[:10], 'truncated header'),
+            (b'MNKX' + data[4:], 'not a .mnkc file'),
+            (data[:-1] + b'\xff', 'checksum mismatch'),
+        ]
+        for data, expected in tests:
+            self.assertEqual(bytecode_file.loads(data), (None, expected))
+        self.assertEqual(bytecode_file.dumps(bytecode_file.CompiledProgram([Null()], [])),
+            (None, f"cannot serialize constant: {Null}"))
+        self.assertEqual(bytecode_file.dumps(bytecode_file.CompiledProgram([Integer(2.5)], [])),
+            (None, f"cannot serialize Integer holding {float}"))
+        self.assertEqual(bytecode_file.dumps(bytecode_file.CompiledProgram([], [Make(OpPop, wordcode=True)])),
+            (None, 'cannot serialize wordcode instructions'))
+
+    def test_load_maps_file(self):
+        bytecode = self.compile('let a = 5; a * 2')
+        data, err = bytecode_file.dumps(bytecode_file.CompiledProgram(bytecode.constants, [bytecode.instructions]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'program' + bytecode_file.SUFFIX)
+            with open(path, 'wb') as f:
+                f.write(data)
+            loaded, err = bytecode_file.load(path)
+            self.assertIsNone(err)
+            self.assertIsInstance(loaded.sections[0], memoryview)
+            vm = v.new(c.Bytecode(loaded.sections[0], loaded.constants))
+            self.assertIsNone(vm.run())
+            self.assertEqual(vm.last_popped_stack_element().value, 10)
+            del loaded, vm
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+sys.path.append("../src/")
+from monkey.common import cache
+from monkey import main
+from monkey import parser
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_put_and_read(self):
+        c = cache.Cache(os.path.join(self.tmp.name, cache.DIRECTORY))
+        key = c.key(b'source', 'macros')
+        self.assertNotEqual(key, c.key(b'source', 'other macros'))
+        self.assertNotEqual(c.key(b'ab', 'c'), c.key(b'a', 'bc'))
+        self.assertIsNone(c.read(key, '.ast'))
+        c.put(key, '.ast', b'data')
+        self.assertEqual(c.read(key, '.ast'), b'data')
+        self.assertEqual(os.listdir(c.directory), [key + '.ast'])
+        c.remove(key, '.ast')
+        self.assertIsNone(c.get(key, '.ast'))
+
+    def test_evict_least_recently_used(self):
+        c = cache.Cache(os.path.join(self.tmp.name, cache.DIRECTORY), max_bytes=35)
+        for i, name in enumerate(['a', 'b', 'c']):
+            c.put(name, '.ast', b'0123456789')
+            os.utime(c.path(name, '.ast'), ns=(i * 10**9, i * 10**9))
+        # reading a makes b the least recently used entry
+        self.assertIsNotNone(c.read('a', '.ast'))
+        c.put('d', '.ast', b'0123456789')
+        self.assertEqual(sorted(os.listdir(c.directory)), ['a.ast', 'c.ast', 'd.ast'])
+
+    def test_run_file_from_cache(self):
+        path = os.path.join(self.tmp.name, 'script.mk')
+        with open(path, 'w') as f:
+            f.write('''
+                let twice = macro(x) { quote(unquote(x) * 2) };
+                let y = twice(21);
+                puts(y);
+            ''')
+        outputs = []
+        for run in range(2):
+            out = io.StringIO()
+            with redirect_stdout(out), mock.patch.object(parser, 'new', wraps=parser.new) as new:
+                self.assertEqual(main.run_file(path), 0)
+            outputs.append(out.getvalue())
+            # only the first run parses the script
+            self.assertEqual(new.called, run == 0)
+        self.assertEqual(outputs, ['42\n', '42\n'])
+        with open(path, 'a') as f:
+            f.write('puts(y + 1);')
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(main.run_file(path), 0)
+        self.assertEqual(out.getvalue(), '42\n43\n')
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, cache.DIRECTORY))), 2)
+
+    def test_run_file_with_expanded_floats_from_cache(self):
+        path = os.path.join(self.tmp.name, 'script.mk')
+        with open(path, 'w') as f:
+            f.write('let m = macro() { quote(unquote(5 / 2)) }; let r = m(); puts(r + 1);')
+        for interpreter in [True, False]:
+            outputs = []
+            for run in range(2):
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    self.assertEqual(main.run_file(path, interpreter), 0)
+                outputs.append(out.getvalue())
+            self.assertEqual(outputs, ['3.5\n', '3.5\n'])
+        # the compiled program cannot be stored, only the expanded one is
+        names = os.listdir(os.path.join(self.tmp.name, cache.DIRECTORY))
+        self.assertEqual([name[-4:] for name in names], ['.ast'])
+
+    def test_unreadable_cached_program_is_a_miss(self):
+        path = os.path.join(self.tmp.name, 'script.mk')
+        with open(path, 'w') as f:
+            f.write('puts(1);')
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(main.run_file(path), 0)
+        directory = os.path.join(self.tmp.name, cache.DIRECTORY)
+        name, = os.listdir(directory)
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(b'MNKA')
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(main.run_file(path), 0)
+        self.assertEqual(out.getvalue(), '1\n')
+
+    def test_run_compiled_file_from_cache(self):
+        path = os.path.join(self.tmp.name, 'script.mk')
+        with open(path, 'w') as f:
+            f.write('''
+                let twice = macro(x) { quote(unquote(x) * 2) };
+                let y = twice(21);
+                puts(y, "done");
+                return y;
+                puts("not reached");
+            ''')
+        outputs = []
+        for run in range(2):
+            out = io.StringIO()
+            with redirect_stdout(out), mock.patch.object(parser, 'new', wraps=parser.new) as new:
+                self.assertEqual(main.run_file(path, interpreter=False), 0)
+            outputs.append(out.getvalue())
+            self.assertEqual(new.called, run == 0)
+        self.assertEqual(outputs, ['42\ndone\n', '42\ndone\n'])
+        self.assertEqual([name[-5:] for name in os.listdir(os.path.join(self.tmp.name, cache.DIRECTORY))], ['.mnkc'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,11 +18,15 @@ class CodeTest(unittest.TestCase):
                 OpConstant, 
                 [65534], 
                 [
-                    OpConstant, 
-                    255, 
+                    OpExtendedArg,
+                    255,
+                    OpConstant,
                     254
                 ]
             ),
+            (OpConstant, [254], [OpConstant, 254]),
+            (OpJump, [65536], [OpJump, 0, 1, 0, 0]),
+            (OpArray, [1 << 24], [OpExtendedArg, 1, OpExtendedArg, 0, OpExtendedArg, 0, OpArray, 0]),
         ]
         for t in tests:
             instruction = Make(t[0], *t[1])
@@ -33,8 +37,8 @@ class CodeTest(unittest.TestCase):
                     msg=f'wrong byte at position {i}. want={t[2][i]}, got={instruction[i]}')
     
     def test_instructions_string(self):
-        ins = Instructions(Make(OpConstant, 1) + Make(OpConstant, 2) + Make(OpConstant, 65535))
-        expected = '''0000 OpConstant 1\n0003 OpConstant 2\n0006 OpConstant 65535\n'''
+        ins = Instructions(Make(OpConstant, 1) + Make(OpConstant, 2) + Make(OpConstant, 65535) + Make(OpJump, 70000))
+        expected = '''0000 OpConstant 1\n0002 OpConstant 2\n0004 OpExtendedArg 255\n0006 OpConstant 65535\n0008 OpJump 70000\n'''
         concatted = Instructions()
         concatted.instructions = ins.instructions
         self.assertEqual(str(concatted), expected,
@@ -42,7 +46,11 @@ class CodeTest(unittest.TestCase):
 
     def test_read_operands(self):
         test_struct = namedtuple('test_struct', ['op', 'operands', 'bytesread'])
-        tests = [test_struct(OpConstant, [65535], 2)]
+        tests = [
+            test_struct(OpConstant, [255], 1),
+            test_struct(OpJump, [65536], 4),
+            test_struct(OpGetBuiltin, [255], 1),
+        ]
         for t in tests:
             instruction = Make(t.op, *t.operands)
             defn, err = lookup(t.op)
@@ -53,6 +61,41 @@ class CodeTest(unittest.TestCase):
                 self.assertEqual(int.from_bytes(operands_read[i:], byteorder='big'), want,
                     msg=f'operand wrong. want={want}, got={operands_read}')
     
+    def test_wordcode(self):
+        tests = [
+            (OpConstant, [65534], [OpConstant | 65534 << 8]),
+            (OpAdd, [], [OpAdd]),
+            (OpJump, [1 << 24], [OpExtendedArg | 1 << 8, OpJump]),
+            (OpArray, [(5 << 48) | 7], [OpExtendedArg | 5 << 8, OpExtendedArg, OpArray | 7 << 8]),
+        ]
+        for op, operands, expected in tests:
+            words = Make(op, *operands, wordcode=True)
+            self.assertEqual(list(words), expected)
+            defn, err = lookup(op)
+            self.assertIsNone(err)
+            operands_read, n = read_operands(defn, words[-1:])
+            self.assertEqual(n, 0, msg=f'n wrong. want=0, got={n}')
+            if len(operands) > 0:
+                self.assertEqual(int.from_bytes(operands_read, byteorder='big'), operands[0] & OPERAND_MASK)
+        ins = Instructions(Make(OpConstant, 1, wordcode=True) + Make(OpJump, 1 << 30, wordcode=True) + Make(OpPop, wordcode=True))
+        expected = '0000 OpConstant 1\n0001 OpExtendedArg 64\n0002 OpJump 1073741824\n0003 OpPop\n'
+        self.assertEqual(str(ins), expected,
+            msg=f'instruction wrongly formatted.\nwant=\n{expected}\ngot=\n{str(ins)}')
+
+    def test_decode(self):
+        for wordcode in [False, True]:
+            ins = (Make(OpConstant, 1, wordcode=wordcode) + Make(OpConstant, 300, wordcode=wordcode) +
+                Make(OpAdd, wordcode=wordcode) + Make(OpGetGlobal, 1 << 30, wordcode=wordcode))
+            decoded = [(op, operand) for _, op, operand, _ in decode(ins)]
+            self.assertEqual(decoded, [(OpConstant, 1), (OpConstant, 300), (OpAdd, None), (OpGetGlobal, 1 << 30)])
+            positions = [(pos, end) for pos, _, _, end in decode(ins)]
+            for (_, end), (pos, _) in zip(positions, positions[1:]):
+                self.assertEqual(end, pos)
+            self.assertEqual(positions[-1][1], len(ins))
+        ins = Instructions(Make(OpGetGlobalConstant, 1, 65535) + Make(OpGreaterThanJumpNotTruthy, 9))
+        expected = '0000 OpGetGlobalConstant 1 65535\n0005 OpGreaterThanJumpNotTruthy 9\n'
+        self.assertEqual(str(ins), expected)
+
     def test_make(self):
         test_struct = namedtuple('test_struct', ['op', 'operands', 'expected'])
         tests = [
@@ -114,39 +114,129 @@ class CompilerTest(unittest.TestCase):
                 # 0000
                 Make(OpTrue) +
                 # 0001
-                Make(OpJumpNotTruthy, 10) +
-                # 0004
+                Make(OpJumpNotTruthy, 13) +
+                # 0006
                 Make(OpConstant, 0) +
-                # 0007
-                Make(OpJump, 11) +
-                # 0010
+                # 0008
+                Make(OpJump, 14) +
+                # 0013
                 Make(OpNull) +
-                # 0011; this pop is bc ifs are expressions with an added pop at end
+                # 0014; this pop is bc ifs are expressions with an added pop at end
                 Make(OpPop) +
-                # 0012
-                Make(OpConstant, 1) +
                 # 0015
+                Make(OpConstant, 1) +
+                # 0017
                 Make(OpPop)),
             CompilerTestCase("if (true) { 10 } else { 20 }; 3333;", [10, 20, 3333],
                 # 0000
                 Make(OpTrue) +
                 # 0001
-                Make(OpJumpNotTruthy, 10) +
-                # 0004
+                Make(OpJumpNotTruthy, 13) +
+                # 0006
                 Make(OpConstant, 0) +
-                # 0007
-                Make(OpJump, 13) +
-                # 0010
-                Make(OpConstant, 1) +
+                # 0008
+                Make(OpJump, 15) +
                 # 0013
+                Make(OpConstant, 1) +
+                # 0015
                 Make(OpPop) +
-                # 0014
+                # 0016
                 Make(OpConstant, 2) + 
-                # 0017
+                # 0018
                 Make(OpPop)),
         ]
         self.run_compiler_tests(tests)
     
+    def test_wordcode(self):
+        program = self.parse("if (true) { 10 } else { 20 }; 3333;")
+        compiler = c.new(wordcode=True)
+        err = compiler.compile(program)
+        self.assertIsNone(err, msg=f'compiler error: {err}')
+        bytecode = compiler.bytecode()
+        # jump targets count words, one per instruction
+        expected = (Make(OpTrue, wordcode=True) +
+            Make(OpJumpNotTruthy, 4, wordcode=True) +
+            Make(OpConstant, 0, wordcode=True) +
+            Make(OpJump, 5, wordcode=True) +
+            Make(OpConstant, 1, wordcode=True) +
+            Make(OpPop, wordcode=True) +
+            Make(OpConstant, 2, wordcode=True) +
+            Make(OpPop, wordcode=True))
+        err = self.check_instructions(Instructions(expected), Instructions(bytecode.instructions))
+        self.assertIsNone(err, msg=f'check_instructions failed: {err}')
+        err = self.check_constants([10, 20, 3333], bytecode.constants)
+        self.assertIsNone(err, msg=f'check_constants failed: {err}')
+        # a jump target past the operand bits cannot be patched in place
+        self.assertEqual(compiler.change_operand(3, 1 << OPERAND_BITS),
+            f'operand {1 << OPERAND_BITS} does not fit in OpJump at 3')
+        self.assertIsNone(compiler.change_operand(3, (1 << OPERAND_BITS) - 1))
+        self.assertEqual(len(compiler.bytecode().instructions), len(expected))
+
+    def test_superinstructions(self):
+        tests = [
+            ("let a = 1; a + 2 > 3", [1, 2, 3],
+                Make(OpConstant, 0) +
+                Make(OpSetGetGlobal, 0, 0) +
+                Make(OpConstantAdd, 1) +
+                Make(OpConstant, 2) +
+                Make(OpGreaterThan) +
+                Make(OpPop)),
+            # jump targets move with the code before them
+            ("if (1 > 2) { 3 }; 4 * 5;", [1, 2, 3, 4, 5],
+                # 0000
+                Make(OpConstantConstant, 0, 1) +
+                # 0005
+                Make(OpGreaterThanJumpNotTruthy, 17) +
+                # 0010
+                Make(OpConstant, 2) +
+                # 0012
+                Make(OpJump, 18) +
+                # 0017
+                Make(OpNull) +
+                # 0018
+                Make(OpPop) +
+                # 0019
+                Make(OpConstantConstant, 3, 4) +
+                # 0024
+                Make(OpMul) +
+                # 0025
+                Make(OpPop)),
+            # the alternative's constant is not fused with the next one, which
+            # the consequence jumps to
+            ("(if (true) { 1 } else { 2 }) + 3", [1, 2, 3],
+                # 0000
+                Make(OpTrue) +
+                # 0001
+                Make(OpJumpNotTruthy, 13) +
+                # 0006
+                Make(OpConstant, 0) +
+                # 0008
+                Make(OpJump, 15) +
+                # 0013
+                Make(OpConstant, 1) +
+                # 0015
+                Make(OpConstantAdd, 2) +
+                # 0018
+                Make(OpPop)),
+            # operands too wide for a superinstruction are left alone
+            (f"[{', '.join(str(i) for i in range(70000))}][0]", list(range(70000)) + [0],
+                b''.join(Make(OpConstantConstant, i, i + 1) for i in range(0, 65536, 2)) +
+                b''.join(Make(OpConstant, i) for i in range(65536, 70000)) +
+                Make(OpArray, 70000) +
+                Make(OpConstant, 70000) +
+                Make(OpIndex) +
+                Make(OpPop)),
+        ]
+        for source, constants, expected in tests:
+            compiler = c.new(superinstructions=True)
+            err = compiler.compile(self.parse(source))
+            self.assertIsNone(err, msg=f'compiler error: {err}')
+            bytecode = compiler.bytecode()
+            err = self.check_instructions(Instructions(expected), Instructions(bytecode.instructions))
+            self.assertIsNone(err, msg=f'check_instructions failed: {err}')
+            err = self.check_constants(constants, bytecode.constants)
+            self.assertIsNone(err, msg=f'check_constants failed: {err}')
+
     def test_global_let_statements(self):
         tests = [
             CompilerTestCase(
@@ -376,6 +466,40 @@ class CompilerTest(unittest.TestCase):
         ]
         self.run_compiler_tests(tests)
     
+    def test_assign_index_statements(self):
+        tests = [
+            CompilerTestCase(
+                "let a = [1]; a[0] = 2;",
+                [1, 0, 2],
+                Make(OpConstant, 0) +
+                Make(OpArray, 1) +
+                Make(OpSetGlobal, 0) +
+                Make(OpGetGlobal, 0) +
+                Make(OpConstant, 1) +
+                Make(OpConstant, 2) +
+                Make(OpSetIndex)
+            ),
+        ]
+        self.run_compiler_tests(tests)
+
+    def test_builtins(self):
+        tests = [
+            CompilerTestCase(
+                "len([]); push([], 1);",
+                [1],
+                Make(OpGetBuiltin, 0) +
+                Make(OpArray, 0) +
+                Make(OpCall, 1) +
+                Make(OpPop) +
+                Make(OpGetBuiltin, 3) +
+                Make(OpArray, 0) +
+                Make(OpConstant, 0) +
+                Make(OpCall, 2) +
+                Make(OpPop)
+            ),
+        ]
+        self.run_compiler_tests(tests)
+
     def test_compiler_scopes(self):
         compiler = c.new()
         self.assertEqual(compiler.scope_index, 0, 
@@ -469,5 +593,15 @@ class CompilerTest(unittest.TestCase):
         program = p.parse_program()
         return program
    
+class ArenaCompilerTest(CompilerTest):
+    """
+    Runs every compiler test again on views over an arena AST
+    """
+
+    def parse(self, source):
+        l = lexer.new(source)
+        p = parser.new_arena(l)
+        return p.parse_program().view()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
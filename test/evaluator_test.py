@@ -373,6 +373,7 @@ class EvaluatorTest(unittest.TestCase):
             ('{true: 5}[true]', 5),
             ('{false: 5}[false]', 5),
             ('{true: 5}[true]', 5),
+            ('{0: 5, 1: 6}[2 / 2 - 1]', 5),
         ]
         for t in tests:
             evaluated = self.check_eval(t[0])
@@ -381,5 +382,113 @@ class EvaluatorTest(unittest.TestCase):
             else:
                 self.check_null_object(evaluated)
 
+    def test_vector_builtins(self):
+        tests = [
+            ('vsum(vec([1, 2, 3, 4]))', 10),
+            ('vmean(vec([2, 4, 6]))', 4),
+            ('vmean(vec([]))', None),
+            ('vdot(vec([1, 2, 3]), vec([4, 5, 6]))', 32),
+            ('len(vec([1, 2, 3]))', 3),
+            ('vec([5, 6, 7])[1]', 6),
+            ('vec([5, 6, 7])[3]', None),
+            ('vsum(vmap_add(vec([1, 2, 3]), 10))', 36),
+            ('vsum(vmul(vec([1, 2, 3]), 2))', 12),
+            ('vsum(vmul(vec([1, 2, 3]), vec([1, 2, 3])))', 14),
+            ('vsum(vslice(vec([1, 2, 3, 4]), 1, 3))', 5),
+            ('vsum(vec([1, 2]) + vec([10, 20]))', 33),
+            ('vsum(vec([10, 20]) - vec([1, 2]))', 27),
+            ('vsum(vec([1, 2]) * vec([3, 4]))', 11),
+            ('vsum(2 * vec([1, 2]))', 6),
+            ('varray(vec([1, 2]) + 1)[1]', 3),
+            ('vec([1, true])', "argument to `vec` must only contain INTEGER elements"),
+            ('vec([1, 2]) + vec([1])', "vector length mismatch: 2 and 1"),
+            ('vec([1, 2]) + "a"', "type mismatch: VECTOR + STRING"),
+            ('vdot(vec([1]), 1)', "arguments to `vdot` must be VECTOR, got VECTOR and INTEGER"),
+        ]
+        for t in tests:
+            evaluated = self.check_eval(t[0])
+            if isinstance(t[1], int):
+                self.assertTrue(self.check_integer_object(evaluated, t[1]), msg=t[0])
+            elif isinstance(t[1], str):
+                self.assertTrue(isinstance(evaluated, Error),
+                    msg=f"{t[0]} object is not Error. got={type(evaluated)}")
+                self.assertEqual(evaluated.message, t[1],
+                    msg=f"wrong error message. expected={t[1]}, got={evaluated.message}")
+            else:
+                self.assertTrue(self.check_null_object(evaluated), msg=t[0])
+
+    def test_assign_index_statements(self):
+        tests = [
+            ('let a = [1, 2, 3]; a[1] = 5; a[1]', 5),
+            ('let a = []; a[0] = 1; a[1] = 2; len(a)', 2),
+            ('let a = [[0, 0], [0, 0]]; a[1][0] = 7; a[1][0]', 7),
+            ('let h = {"a": 1}; h["a"] = 2; h["b"] = 3; h["a"] + h["b"]', 5),
+            ('let h = {}; h[0] = 1; h[1] = 2; h[5] = 3; h[0] + h[1] + h[5]', 6),
+            ('let h = {}; h[true] = 1; h[true]', 1),
+            ('let a = [1]; let f = fn(x) { x[0] = 9; }; f(a); a[0]', 9),
+            ('let a = [1]; a[2] = 1', "index out of range: 2"),
+            ('let h = {}; h[fn(x) { x }] = 1', "unusable as hash key: FUNCTION"),
+            ('let s = "abc"; s[0] = "b"', "index assignment not supported: STRING"),
+        ]
+        for t in tests:
+            evaluated = self.check_eval(t[0])
+            if isinstance(t[1], int):
+                self.assertTrue(self.check_integer_object(evaluated, t[1]), msg=t[0])
+            else:
+                self.assertTrue(isinstance(evaluated, Error),
+                    msg=f"{t[0]} object is not Error. got={type(evaluated)}")
+                self.assertEqual(evaluated.message, t[1],
+                    msg=f"wrong error message. expected={t[1]}, got={evaluated.message}")
+
+    def test_lazy_function_bodies(self):
+        tests = [
+            ('let add = fn(x, y) { x + y }; add(2, 3)', 5),
+            ('let f = fn(x) { fn(y) { x * y } }; f(3)(4)', 12),
+            ('let unused = fn() { let = ; }; 7', 7),
+            ('let broken = fn() { let = 1; }; broken()',
+                "parse errors in function body: expected token to be IDENT, got = instead at line 1, column 25; "
+                "no prefix parse function for = found at line 1, column 25"),
+        ]
+        for t in tests:
+            program = parser.new(lexer.new_buffer(t[0]), lazy_bodies=True).parse_program()
+            evaluated = e.Eval(program, e.new_environment())
+            if isinstance(t[1], int):
+                self.assertTrue(self.check_integer_object(evaluated, t[1]), msg=t[0])
+            else:
+                self.assertTrue(isinstance(evaluated, Error),
+                    msg=f"{t[0]} object is not Error. got={type(evaluated)}")
+                self.assertEqual(evaluated.message, t[1])
+
+    def test_set_builtins(self):
+        tests = [
+            ('len(set([1, 2, 2, 3]))', 3),
+            ('has(set([1, "a"]), "a")', True),
+            ('has(set([1, "a"]), 2)', False),
+            ('has(add(set([]), 5), 5)', True),
+            ('has(remove(set([5]), 5), 5)', False),
+            ('let s = set([1]); let t = add(s, 2); has(s, 2)', False),
+            ('let s = set([1]); let t = add(s, 2); has(t, 2)', True),
+            ('let s = set([1]); let t = remove(s, 1); len(s) + len(t)', 1),
+            ('len(union(set([1, 2]), set([2, 3])))', 3),
+            ('len(intersection(set([1, 2]), set([2, 3])))', 1),
+            ('len(difference(set([1, 2, 3]), set([2])))', 2),
+            ('let s = set([1, 2]); len(intersection(s, add(s, 3)))', 2),
+            ('set(1)', "argument to `set` must be ARRAY, got INTEGER"),
+            ('set([fn(x) { x }])', "unusable as set element: FUNCTION"),
+            ('has([1], 1)', "first argument to `has` must be SET, got ARRAY"),
+            ('union(set([]), 1)', "arguments to `union` must be SET, got SET and INTEGER"),
+        ]
+        for t in tests:
+            evaluated = self.check_eval(t[0])
+            if isinstance(t[1], bool):
+                self.assertTrue(self.check_boolean_object(evaluated, t[1]), msg=t[0])
+            elif isinstance(t[1], int):
+                self.assertTrue(self.check_integer_object(evaluated, t[1]), msg=t[0])
+            else:
+                self.assertTrue(isinstance(evaluated, Error),
+                    msg=f"{t[0]} object is not Error. got={type(evaluated)}")
+                self.assertEqual(evaluated.message, t[1],
+                    msg=f"wrong error message. expected={t[1]}, got={evaluated.message}")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
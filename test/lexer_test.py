@@ -1,3 +1,4 @@
+import io
 import unittest
 import sys
 sys.path.append("../src/")
@@ -36,6 +37,89 @@ class LexerTest(unittest.TestCase):
         self.lexer = lexer.new(self.source)
     
     def test_next_token(self):
+        self.check_tokens(self.lexer)
+
+    def test_regex_next_token(self):
+        self.check_tokens(lexer.new_regex(self.source))
+
+    def test_regex_matches_lexer(self):
+        sources = [
+            'x1 = y_2 == "a\nb" != @ \t é',
+            '"unterminated string',
+            '!!==<>=;;',
+            '',
+            '   \n',
+        ]
+        for source in sources:
+            expected = lexer.new(source)
+            actual = lexer.new_regex(source)
+            while True:
+                want = expected.next_token()
+                got = actual.next_token()
+                self.assertEqual(got, want, msg=f'token mismatch for {source!r}')
+                if want.Type == token.EOF:
+                    break
+            self.assertEqual(actual.next_token().Type, token.EOF)
+
+    def test_stream_next_token(self):
+        self.check_tokens(lexer.new_stream(io.StringIO(self.source)))
+        # tokens, strings and multi-byte characters split across chunks
+        for chunk_size in [1, 2, 3, 7]:
+            self.check_tokens(lexer.new_stream(io.StringIO(self.source), chunk_size))
+            self.check_tokens(lexer.new_stream(io.BytesIO(self.source.encode()), chunk_size))
+        source = 'let s = "héllo wörld"; s == "é"'
+        expected = lexer.new(source)
+        actual = lexer.new_stream(io.BytesIO(source.encode()), 1)
+        while True:
+            want = expected.next_token()
+            self.assertEqual(actual.next_token(), want)
+            if want.Type == token.EOF:
+                break
+
+    def test_stream_string_closed_at_chunk_boundary(self):
+        read = []
+        def chunks():
+            for chunk in ['"ab"', ' x'] + [' y'] * 100:
+                read.append(chunk)
+                yield chunk
+        tokens = lexer.scan_stream(chunks())
+        self.assertEqual(next(tokens), token.Token(token.STRING, 'ab'))
+        # the closed string does not wait for another quote
+        self.assertEqual(len(read), 2)
+        self.assertEqual(len(list(tokens)), 101)
+
+    def test_stream_scans_long_tokens_once(self):
+        source = 'let s = "' + 'a' * 100 + '"; ' + 'b' * 100 + ' + ' + '1' * 100
+        scanned = []
+        scan_buffer = lexer.scan_buffer
+        def counting_scan_buffer(buffer, final):
+            scanned.append(len(buffer))
+            return (yield from scan_buffer(buffer, final))
+        lexer.scan_buffer = counting_scan_buffer
+        try:
+            tokens = list(lexer.scan_stream(lexer.read_chunks(io.StringIO(source), 1)))
+        finally:
+            lexer.scan_buffer = scan_buffer
+        self.assertEqual(tokens, list(lexer.scan(source)))
+        # chunks that only extend a string, identifier or integer are not scanned
+        self.assertLess(sum(scanned), 3 * len(source))
+
+    def test_buffer_next_token(self):
+        self.check_tokens(lexer.new_buffer(self.source))
+
+    def test_token_buffer(self):
+        buffer = lexer.tokenize('let s = "ab";\n  s')
+        self.assertEqual(len(buffer), 7)
+        self.assertEqual(list(buffer.kinds), [token.LET, token.IDENT, token.ASSIGN,
+            token.STRING, token.SEMICOLON, token.IDENT, token.EOF])
+        self.assertEqual(buffer.literal(3), "ab")
+        self.assertEqual(buffer[3], token.Token(token.STRING, "ab"))
+        self.assertEqual(buffer.location(0), (1, 1))
+        self.assertEqual(buffer.location(3), (1, 10))
+        self.assertEqual(buffer.location(5), (2, 3))
+        self.assertEqual(token.type_name(buffer.kinds[4]), ";")
+
+    def check_tokens(self, lex):
         tests = [
             (token.LET, "let"),
             (token.IDENT, "five"),
@@ -134,7 +218,7 @@ class LexerTest(unittest.TestCase):
             (token.EOF, ""),
         ]
         for t in tests:
-            tok = self.lexer.next_token()
+            tok = lex.next_token()
             self.assertEqual(tok.Type, t[0], 
                 msg="{} - tokentype wrong. expected={}, got={}".format(t, t[0], tok.Type))
             self.assertEqual(tok.Literal, t[1], 
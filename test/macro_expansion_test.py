@@ -6,6 +6,8 @@ from monkey import lexer
 from monkey import parser
 from monkey.evaluator import evaluator as e
 from monkey.evaluator import macro_expansion
+from monkey import repl
+from monkey import ast
 
 class TestMacros(unittest.TestCase):
 
@@ -73,17 +75,189 @@ class TestMacros(unittest.TestCase):
                 '''
             ),
         ]
-        for t in tests:
-            expected = self.get_parse_program(t[1])
-            program = self.get_parse_program(t[0])
-            env = e.new_environment()
-            macro_expansion.DefineMacros(program, env)
-            expanded = macro_expansion.ExpandMacros(program, env)
-            self.assertEqual(expanded.string(), expected.string(),
-                msg="not equal. want={}, got={}".format(expected.string(), expanded.string()))
+        for use_vm in [False, True]:
+            for t in tests:
+                expected = self.get_parse_program(t[1])
+                program = self.get_parse_program(t[0])
+                env = e.new_environment()
+                macro_expansion.DefineMacros(program, env)
+                expanded = macro_expansion.ExpandMacros(program, env, None, use_vm)
+                self.assertEqual(expanded.string(), expected.string(),
+                    msg="not equal. want={}, got={}".format(expected.string(), expanded.string()))
         # Test this in REPL:
         # let unless = macro( condition, consequence, alternative) { quote( if (!( unquote( condition))) { unquote( consequence); } else { unquote( alternative); }); };
 
+    def test_expand_macros_in_lazy_bodies(self):
+        source = '''
+            let double = macro(x) { quote(unquote(x) * 2); };
+            let f = fn(a) { double(a) };
+            let g = fn(b) { b + 1 };
+        '''
+        program = parser.new(lexer.new_buffer(source), lazy_bodies=True).parse_program()
+        env = e.new_environment()
+        macro_expansion.DefineMacros(program, env)
+        expanded = macro_expansion.ExpandMacros(program, env)
+        f = expanded.statements[0].value.body
+        g = expanded.statements[1].value.body
+        self.assertTrue(f.is_parsed(), msg='body calling a macro was not expanded')
+        self.assertEqual(f.string(), '(a * 2)')
+        self.assertFalse(g.is_parsed(), msg='body without macro calls was parsed')
+
+    def test_define_many_macros(self):
+        source = '''
+            let a = macro() { quote(1) };
+            let x = 1;
+            let b = macro() { quote(2) };
+            let c = macro() { quote(3) };
+            x + a();
+            c();
+        '''
+        env = e.new_environment()
+        program = self.get_parse_program(source)
+        macro_expansion.DefineMacros(program, env)
+        self.assertEqual([s.string() for s in program.statements], ['let x = 1;', '(x + a())', 'c()'])
+        for name in ['a', 'b', 'c']:
+            self.assertTrue(isinstance(env.get(name), object.Macro))
+        # recorded call sites follow the statements that were kept
+        self.assertEqual(program.call_sites['a'], [1])
+        self.assertEqual(program.call_sites['c'], [2])
+        expanded = macro_expansion.ExpandMacros(program, env)
+        self.assertEqual(expanded.string(), 'let x = 1;(x + 1)3')
+
+    def test_macro_call_statements(self):
+        source = '''
+            let m = macro(x) { x };
+            let f = fn(y) { puts(y) };
+            f(1);
+            if (true) { m(2) };
+            puts(m(3));
+            let g = fn() { m(4) };
+        '''
+        env = e.new_environment()
+        program = self.get_parse_program(source)
+        macro_expansion.DefineMacros(program, env)
+        skip = lambda node: False
+        self.assertEqual(macro_expansion.macro_call_statements(program, {'m'}, skip), [2, 3, 4])
+        program.call_sites = None
+        # without recorded sites the statements are scanned; call arguments
+        # are not expanded, so puts(m(3)) is not a site
+        self.assertEqual(macro_expansion.macro_call_statements(program, {'m'}, skip), [2, 4])
+
+    def test_expand_without_macros(self):
+        program = self.get_parse_program('let f = fn(x) { x * 2 }; f(1) + f(2);')
+        statements = list(program.statements)
+        expanded = macro_expansion.ExpandMacros(program, e.new_environment())
+        self.assertIs(expanded, program)
+        self.assertEqual(expanded.statements, statements)
+
+    def test_expansion_cache(self):
+        source = '''
+            let unless = macro(cond, cons, alt) { quote(if (!(unquote(cond))) { unquote(cons); } else { unquote(alt); }); };
+            unless(10 > 5, puts("not greater"), puts("greater"));
+            unless(10 > 5, puts("not greater"), puts("greater"));
+            unless(1 > 5, puts("not greater"), puts("greater"));
+        '''
+        env = e.new_environment()
+        program = self.get_parse_program(source)
+        macro_expansion.DefineMacros(program, env)
+        cache = macro_expansion.ExpansionCache()
+        expanded = macro_expansion.ExpandMacros(program, env, cache)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 2, 2))
+        first, second, third = expanded.statements
+        self.assertEqual(ast.structural_key(first), ast.structural_key(second))
+        self.assertIsNot(first, second, msg='cache hit did not return a fresh copy')
+        self.assertIsNot(first.expression.condition, second.expression.condition)
+        self.assertNotEqual(ast.structural_key(first), ast.structural_key(third))
+        # modifying an expansion leaves the cached one alone
+        first.expression.alternative = None
+        again = self.get_parse_program('unless(10 > 5, puts("not greater"), puts("greater"));')
+        macro_expansion.ExpandMacros(again, env, cache)
+        self.assertEqual(ast.structural_key(again.statements[0]), ast.structural_key(second))
+
+    def test_expansion_cache_redefined_macro(self):
+        cache = macro_expansion.ExpansionCache()
+        env = e.new_environment()
+        results = []
+        for body in ['quote(unquote(x) + 1)', 'quote(unquote(x) * 2)']:
+            program = self.get_parse_program('let m = macro(x) { ' + body + ' }; m(a);')
+            macro_expansion.DefineMacros(program, env)
+            results.append(macro_expansion.ExpandMacros(program, env, cache).string())
+        self.assertEqual(results, ['(a + 1)', '(a * 2)'])
+        self.assertEqual(cache.hits, 0)
+
+    def test_expansion_cache_eviction(self):
+        cache = macro_expansion.ExpansionCache(maxsize=2)
+        env = e.new_environment()
+        program = self.get_parse_program('let m = macro(x) { x }; m(1); m(2); m(1); m(3); m(2);')
+        macro_expansion.DefineMacros(program, env)
+        macro_expansion.ExpandMacros(program, env, cache)
+        # m(1) was used more recently than m(2), so m(3) evicted m(2)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 4, 2))
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+    def test_sessions_cache_expansions_of_pure_macros_only(self):
+        sources = ['let m = macro(x) { quote(unquote(x) + 1) };', 'm(a);', 'm(a);']
+        hits = []
+        for pure_macros in [False, True, True]:
+            session = repl.Session(pure_macros=pure_macros)
+            for source in sources:
+                session.run(self.get_parse_program(source))
+            cache = session.expansion_cache
+            hits.append(None if cache == None else (cache.hits, cache.misses))
+        # each session has a cache of its own
+        self.assertEqual(hits, [None, (1, 1), (1, 1)])
+
+    def test_expand_macros_on_vm(self):
+        source = '''
+            let twice = macro(x) {
+                let pair = quote([unquote(x), unquote(x)]);
+                return quote({"pair": unquote(pair), "size": unquote(len("ab"))});
+            };
+            let same = macro(x) { if (false) { quote(0) } else { quote(unquote(x)) } };
+            twice(a + 1);
+            same(b);
+        '''
+        env = e.new_environment()
+        program = self.get_parse_program(source)
+        macro_expansion.DefineMacros(program, env)
+        expanded = macro_expansion.ExpandMacros(program, env, None, use_vm=True)
+        self.assertEqual([s.string() for s in expanded.statements],
+            ['{pair:[(a + 1), (a + 1)], size:2}', 'b'])
+        self.assertIsNotNone(env.get('twice').compiled, msg='macro body was not compiled')
+
+    def test_expand_macros_on_vm_falls_back_to_evaluator(self):
+        # the VM does not compile function literals, so the body is evaluated
+        source = '''
+            let m = macro(x) { let g = fn(y) { y }; quote(unquote(x)) };
+            m(1);
+            m(2);
+        '''
+        env = e.new_environment()
+        program = self.get_parse_program(source)
+        macro_expansion.DefineMacros(program, env)
+        expanded = macro_expansion.ExpandMacros(program, env, None, use_vm=True)
+        self.assertEqual([s.string() for s in expanded.statements], ['1', '2'])
+        self.assertIsNone(env.get('m').compiled)
+        self.assertIn('compiling macro failed', env.get('m').compile_error)
+
+    def test_compiled_session_expands_macros(self):
+        for vm_macros in [False, True]:
+            session = repl.Session(interpreter=False, vm_macros=vm_macros)
+            results = []
+            for source in ['let double = macro(x) { quote(unquote(x) * 2) };', 'let y = 5;', 'double(y + 1)']:
+                result, err = session.run(self.get_parse_program(source))
+                self.assertIsNone(err)
+                results.append(result)
+            self.assertEqual(results[-1].value, 12)
+            # macro bodies only run on the VM when asked to
+            self.assertEqual(session.macro_env.get('double').compiled != None, vm_macros)
+            # the instructions run are not kept unless asked for
+            self.assertIsNone(session.sections)
+        for source in ['quote()', 'quote(1, 2)']:
+            _, err = session.run(self.get_parse_program(source))
+            self.assertIn('wrong number of arguments to quote', err)
+
     def get_parse_program(self, source):
         l = lexer.new(source)
         p = parser.new(l)
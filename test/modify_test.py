@@ -3,6 +3,8 @@ import sys
 sys.path.append("../src/")
 from monkey import ast
 from monkey.ast import modify
+from monkey import lexer
+from monkey import parser
 
 class ModifyTest(unittest.TestCase):
 
@@ -73,6 +75,10 @@ class ModifyTest(unittest.TestCase):
                     ])
                 )
             ),
+            (
+                ast.AssignIndexStatement(left = one(), index = one(), value = one()), 
+                ast.AssignIndexStatement(left = two(), index = two(), value = two())
+            ),
             (
                 ast.ArrayLiteral(elements=[one(), one()]), 
                 ast.ArrayLiteral(elements=[two(), two()])
@@ -80,7 +86,7 @@ class ModifyTest(unittest.TestCase):
         ]
         for t in tests:
             modified = modify.Modify(t[0], turn_one_into_two)
-            deep_equals = (modified == t[1])
+            deep_equals = (ast.structural_key(modified) == ast.structural_key(t[1]))
             self.assertTrue(deep_equals,
                 'not equal. got={} want={}'.format(modified, t[1]))
         # HashLiteral needs to be tested slightly different
@@ -90,10 +96,91 @@ class ModifyTest(unittest.TestCase):
         })
         hash_literal = modify.Modify(hash_literal, turn_one_into_two)
         for key, value in hash_literal.pairs.items():
-            self.assertTrue(key == two(),
+            self.assertTrue(ast.structural_key(key) == ast.structural_key(two()),
                 'value is not {}. got={}'.format(2, key))
-            self.assertTrue(value == two(),
+            self.assertTrue(ast.structural_key(value) == ast.structural_key(two()),
                 'value is not {}. got={}'.format(2, value))
 
+    def test_modify_writes_back_new_nodes(self):
+        def replace_one(node):
+            """ Returns a new IntegerLiteral of value 2 in place of any 1 """
+            if isinstance(node, ast.IntegerLiteral) and node.value == 1:
+                return ast.IntegerLiteral(value=2)
+            if isinstance(node, ast.Identifier) and node.value == "one":
+                return ast.Identifier(None, "two")
+            return node
+        one = lambda : ast.IntegerLiteral(value=1)
+        two = lambda : ast.IntegerLiteral(value=2)
+        statement = lambda e : ast.ExpressionStatement(expression=e)
+        tests = [
+            (ast.BlockStatement(statements=[one(), one()]), ast.BlockStatement(statements=[two(), two()])),
+            (ast.ArrayLiteral(elements=[one(), two()]), ast.ArrayLiteral(elements=[two(), two()])),
+            (
+                ast.FunctionLiteral(parameters=[ast.Identifier(None, "one")],
+                    body=ast.BlockStatement(statements=[statement(one())])),
+                ast.FunctionLiteral(parameters=[ast.Identifier(None, "two")],
+                    body=ast.BlockStatement(statements=[statement(two())]))
+            ),
+            (ast.HashLiteral(pairs={one(): ast.ArrayLiteral(elements=[one()])}),
+                ast.HashLiteral(pairs={two(): ast.ArrayLiteral(elements=[two()])})),
+            (ast.Program([statement(one()), ast.LetStatement(value=one())]),
+                ast.Program([statement(two()), ast.LetStatement(value=two())])),
+            (one(), two()),
+        ]
+        for t in tests:
+            modified = modify.Modify(t[0], replace_one)
+            self.assertEqual(ast.structural_key(modified), ast.structural_key(t[1]))
+
+    def test_modify_skip(self):
+        def replace_one(node):
+            if isinstance(node, ast.IntegerLiteral) and node.value == 1:
+                return ast.IntegerLiteral(value=2)
+            return node
+        program = ast.Program([
+            ast.ExpressionStatement(expression=ast.IntegerLiteral(value=1)),
+            ast.ExpressionStatement(expression=ast.ArrayLiteral(elements=[ast.IntegerLiteral(value=1)])),
+        ])
+        visited = []
+        def skip(node):
+            visited.append(type(node).__name__)
+            return isinstance(node, ast.ArrayLiteral)
+        modified = modify.Modify(program, replace_one, skip)
+        self.assertEqual(modified.statements[0].expression.value, 2)
+        self.assertEqual(modified.statements[1].expression.elements[0].value, 1)
+        self.assertEqual(visited.count("IntegerLiteral"), 1)
+
+    def test_modify_deep_trees(self):
+        n = 100000
+        program = parser.new_iterative(lexer.new_regex("-" * n + "1")).parse_program()
+        def replace_one(node):
+            if isinstance(node, ast.IntegerLiteral) and node.value == 1:
+                return ast.IntegerLiteral(value=2)
+            return node
+        modified = modify.Modify(program, replace_one)
+        node = modified.statements[0].expression
+        while isinstance(node, ast.PrefixExpression):
+            node = node.right
+        self.assertEqual(node.value, 2)
+        self.assertEqual(sum(1 for _ in modify.Walk(modified)), n + 3)
+
+    def test_walk(self):
+        program = parser.new(lexer.new("let a = [1, {2: 3}]; a[0] + b;")).parse_program()
+        nodes = [type(node).__name__ for node in modify.Walk(program)]
+        self.assertEqual(nodes, ["Program", "LetStatement", "ArrayLiteral", "IntegerLiteral",
+            "HashLiteral", "IntegerLiteral", "IntegerLiteral", "ExpressionStatement",
+            "InfixExpression", "IndexExpression", "Identifier", "IntegerLiteral", "Identifier"])
+
+    def test_copy(self):
+        source = "let a = [1, {2: 3}]; let f = fn(x) { x + a[0] }; f(2);"
+        program = parser.new(lexer.new_buffer(source), lazy_bodies=True).parse_program()
+        copy = modify.Copy(program)
+        body = copy.statements[1].value.body
+        self.assertFalse(body.is_parsed(), msg='copying parsed a lazy body')
+        self.assertIs(body.tokens, program.statements[1].value.body.tokens)
+        self.assertEqual(ast.structural_key(copy), ast.structural_key(program))
+        originals = set(map(id, modify.Walk(program)))
+        self.assertFalse(any(id(node) in originals for node in modify.Walk(copy)),
+            msg='copy shares nodes with the original')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -48,5 +48,81 @@ class ObjectTest(unittest.TestCase):
         if one1.hash_key().value == two1.hash_key().value:
             self.fail("integers with different content have same hash keys")
 
+    def test_hash_layouts(self):
+        record1 = new_hash([String("name"), String("age")], [String("a"), Integer(1)])
+        record2 = new_hash([String("name"), String("age")], [String("b"), Integer(2)])
+        self.assertIsNotNone(record1.shape, msg="string-keyed hash should use a shape")
+        self.assertIs(record1.shape, record2.shape, msg="same keys should share a shape")
+        self.assertEqual(record2.get(String("age")).value, 2)
+        self.assertIsNone(record2.get(String("missing")))
+        self.assertIsNone(record2.get(Integer(0)))
+
+        table = new_hash([Integer(0), Integer(1), Integer(2)], [Integer(5), Integer(6), Integer(7)])
+        self.assertIsNotNone(table.dense, msg="0..n-1 keyed hash should be dense")
+        self.assertEqual(table.get(Integer(2)).value, 7)
+        self.assertIsNone(table.get(Integer(3)))
+        # Integers holding floats are looked up by HashKey, as in a general hash
+        general = new_hash([Integer(0), Integer(1), Integer(2), TRUE], [v for _, v in table.items()] + [TRUE])
+        for key in [Integer(0.0), Integer(2.0), Integer(0.5)]:
+            self.assertIs(table.get(key), general.get(key))
+        self.assertIsNone(new_hash([Integer(0.0)], [Integer(1)]).dense)
+        grown = new_hash([Integer(0)], [Integer(1)])
+        grown.set(Integer(1.0), Integer(2))
+        self.assertIsNone(grown.dense)
+        self.assertEqual(grown.length(), 2)
+
+        mixed = new_hash([Integer(1), String("a"), TRUE], [Integer(1), Integer(2), Integer(3)])
+        self.assertIsNotNone(mixed.general, msg="mixed keys should use the general layout")
+        self.assertEqual(mixed.get(String("a")).value, 2)
+        self.assertEqual(mixed.get(TRUE).value, 3)
+
+        duplicate = new_hash([String("a"), String("a")], [Integer(1), Integer(2)])
+        self.assertIsNotNone(duplicate.general, msg="duplicate keys should use the general layout")
+        self.assertEqual(duplicate.length(), 1)
+        self.assertEqual(duplicate.get(String("a")).value, 2)
+
+        for h in [record1, table, mixed]:
+            self.assertEqual(len(h.pairs), h.length())
+            for key, value in h.items():
+                self.assertIs(h.pairs[key.hash_key()].value, value)
+            # the view is read-only, writes go through set()
+            with self.assertRaises(TypeError):
+                h.pairs[String("b").hash_key()] = HashPair(String("b"), Integer(4))
+        record1.set(String("b"), Integer(4))
+        self.assertEqual(record1.pairs[String("b").hash_key()].value.value, 4)
+
+    def test_set_versions(self):
+        empty = new_set([])
+        versions = [empty]
+        for i in range(10):
+            versions.append(versions[-1].add(Integer(i)))
+        # every older version still sees exactly its own elements, in any order
+        for n in [3, 10, 0, 7, 7, 1]:
+            s = versions[n]
+            self.assertEqual(s.length(), n)
+            self.assertTrue(all(s.contains(Integer(i)) for i in range(n)))
+            self.assertFalse(s.contains(Integer(n)))
+        removed = versions[10].remove(Integer(4))
+        self.assertFalse(removed.contains(Integer(4)))
+        self.assertTrue(versions[10].contains(Integer(4)))
+        self.assertTrue(versions[5].contains(Integer(4)))
+        self.assertIs(versions[10].add(Integer(1)), versions[10],
+            msg="adding an existing element should return the same set")
+
+    def test_set_distant_versions_copy(self):
+        versions = [new_set([])]
+        for i in range(REROOT_LIMIT + 10):
+            versions.append(versions[-1].add(Integer(i)))
+        first, last = versions[1], versions[-1]
+        # the first version is too far back to re-root, so it gets its own dict
+        self.assertEqual(first.length(), 1)
+        self.assertIsNotNone(first.members)
+        self.assertIsNotNone(last.members)
+        self.assertIsNot(first.members, last.members)
+        for s, n in [(last, REROOT_LIMIT + 10), (first, 1), (versions[5], 5), (last, REROOT_LIMIT + 10)]:
+            self.assertEqual(s.length(), n)
+            self.assertTrue(all(s.contains(Integer(i)) for i in range(n)))
+            self.assertFalse(s.contains(Integer(n)))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
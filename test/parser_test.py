@@ -1,4 +1,6 @@
 import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 import sys
 sys.path.append("../src/")
 from monkey.tokens import token
@@ -610,6 +612,137 @@ class ParserTest(unittest.TestCase):
             print('macro body statement is not ast.ExpressionStatement. got={}'.format(type(body_stmt)))
         self.check_infix_expression(body_stmt.expression, 'x', '+', 'y')
 
+    def test_assign_index_statements(self):
+        tests = [
+            ("a[0] = 5;", "a", 0, 5),
+            ("table[key] = x", "table", "key", "x"),
+        ]
+        for t in tests:
+            l = lexer.new(t[0])
+            p = parser.new(l)
+            program = p.parse_program()
+            self.check_parse_errors(p)
+            self.assertEqual(len(program.statements), 1, 
+                msg='program does not have 1 statement. got={}'.format(len(program.statements)))
+            stmt = program.statements[0]
+            self.assertTrue(isinstance(stmt, ast.AssignIndexStatement),
+                msg='stmt is not ast.AssignIndexStatement. got={}'.format(type(stmt)))
+            self.assertTrue(self.check_literal_expression(stmt.left, t[1]))
+            self.assertTrue(self.check_literal_expression(stmt.index, t[2]))
+            self.assertTrue(self.check_literal_expression(stmt.value, t[3]))
+        program = parser.new(lexer.new("m[1][2] = 3 + 4;")).parse_program()
+        self.assertEqual(program.string(), "(m[1])[2] = (3 + 4);")
+
+    def test_parse_statements_incrementally(self):
+        source = 'let x = 1; x + 2; if (x) { [x, 1][0] };'
+        expected = parser.new(lexer.new(source)).parse_program()
+        p = parser.new(lexer.new_regex(source))
+        statements = p.parse_statements()
+        first = next(statements)
+        self.assertTrue(isinstance(first, ast.LetStatement),
+            msg='first statement is not ast.LetStatement. got={}'.format(type(first)))
+        rest = list(statements)
+        self.check_parse_errors(p)
+        self.assertEqual(ast.Program([first] + rest).string(), expected.string())
+
+    def test_parse_error_messages(self):
+        source = 'let x 5;\nlet = 10;'
+        p = parser.new(lexer.new(source))
+        p.parse_program()
+        self.assertEqual(p.errors[:2], [
+            'expected token to be =, got INT instead',
+            'expected token to be IDENT, got = instead',
+        ])
+        p = parser.new(lexer.new_buffer(source))
+        p.parse_program()
+        self.assertEqual(p.errors[:2], [
+            'expected token to be =, got INT instead at line 1, column 7',
+            'expected token to be IDENT, got = instead at line 2, column 5',
+        ])
+
+    def test_reset(self):
+        p = parser.new(lexer.new('let = 1;'))
+        p.parse_program()
+        self.assertEqual(len(p.errors), 2)
+        for source in ['let x = 1 + 2;', '[1, 2][0]', 'a[0] = {"b": !true};']:
+            program = p.reset(lexer.new(source)).parse_program()
+            self.check_parse_errors(p)
+            self.assertEqual(program.string(), parser.new(lexer.new(source)).parse_program().string())
+
+    def test_parse_concurrently(self):
+        sources = ['let x = {} * (y + {});'.format(i, i) for i in range(200)]
+        sources += ['if (a < {}) {{ [a, {}][1] }} else {{ -b }}'.format(i, i) for i in range(200)]
+        expected = [parser.new(lexer.new(source)).parse_program().string() for source in sources]
+
+        def parse(source):
+            p = parser.new(lexer.new(source))
+            program = p.parse_program()
+            return program.string(), p.errors
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(parse, sources))
+        self.assertEqual([r[0] for r in results], expected)
+        self.assertEqual([r[1] for r in results], [[]] * len(sources))
+
+    def test_register_parse_fns(self):
+        p = parser.new(lexer.new('%'))
+        p.register_prefix(token.ILLEGAL, lambda p: ast.StringLiteral(p.cur_token, p.cur_token.Literal))
+        program = p.parse_program()
+        self.check_parse_errors(p)
+        self.assertEqual(program.string(), '%')
+        # other parsers keep the shared tables
+        self.assertNotIn(token.ILLEGAL, parser.new(lexer.new('')).prefix_parse_fns)
+
+    def test_lazy_function_bodies(self):
+        source = 'let f = fn(x) { let y = { "a": [x] }; if (y) { return fn() { y }; } }; f(1) + g;'
+        eager = parser.new(lexer.new_buffer(source)).parse_program()
+        p = parser.new(lexer.new_buffer(source), lazy_bodies=True)
+        program = p.parse_program()
+        self.check_parse_errors(p)
+        self.assertEqual(len(program.statements), 2)
+        body = program.statements[0].value.body
+        self.assertIsInstance(body, ast.LazyBlockStatement)
+        self.assertFalse(body.is_parsed())
+        self.assertEqual(program.statements[1].string(), eager.statements[1].string())
+        self.assertEqual(body.statements[0].string(), eager.statements[0].value.body.statements[0].string())
+        self.assertTrue(body.is_parsed())
+        self.assertEqual(body.errors, [])
+        # nested functions stay lazy until their own bodies are needed
+        inner = body.statements[1].expression.consequence.statements[0].return_value.body
+        self.assertIsInstance(inner, ast.LazyBlockStatement)
+        self.assertFalse(inner.is_parsed())
+        # errors inside a body are only found when it is parsed
+        p = parser.new(lexer.new_buffer('let f = fn() { let = 1; };'), lazy_bodies=True)
+        body = p.parse_program().statements[0].value.body
+        self.check_parse_errors(p)
+        body.statements
+        self.assertEqual(body.errors[0], 'expected token to be IDENT, got = instead at line 1, column 20')
+
+    def test_arena_parser(self):
+        sources = [
+            'let x = 1 + 2 * 3 - -4 / (5 + a[1][2]); return !true == false;',
+            'if (a < b) { let c = fn(x, y) { x + y; }; c(1, 2) } else { [1, 2 * 3, {"a": 1, 2: [3]}] }',
+            'a[1] = {"k": if (x) { 1 }}; let m = macro(a, b) { quote(unquote(a)) }; add(1, 2)(3)[4]; {}; [];',
+            'let = 5; let x 5; (1 + ; {1 2}; [1, 2; f(1 2); if (x { 1 }; a[1; fn x {}; }',
+        ]
+        for source in sources:
+            expected = parser.new(lexer.new(source))
+            program = expected.parse_program()
+            p = parser.new_arena(lexer.new(source))
+            nodes = p.parse_program()
+            self.assertEqual(p.errors, expected.errors)
+            self.assertEqual(ast.structural_key(nodes.to_node()), ast.structural_key(program), msg=source)
+            # over a TokenBuffer the columns are read without building Tokens
+            expected = parser.new(lexer.new_buffer(source))
+            program = expected.parse_program()
+            l = lexer.new_buffer(source)
+            l.buffer.token = None
+            p = parser.new_arena(l)
+            self.assertIsInstance(p, parser.BufferArenaParser)
+            nodes = p.parse_program()
+            self.assertEqual(p.errors, expected.errors)
+            self.assertEqual(ast.structural_key(nodes.to_node()), ast.structural_key(program), msg=source)
+
     def check_parse_errors(self, p):
         errors = p.errors
         if len(errors) == 0:
@@ -619,5 +752,39 @@ class ParserTest(unittest.TestCase):
             print('parser error: {}'.format(e))
         self.fail()
 
+class IterativeParserTest(ParserTest):
+    """
+    Runs every parser test again with parser.new building IterativeParsers
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(parser, 'new', parser.new_iterative)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_deep_nesting(self):
+        n = 100000
+        tests = [
+            ('(' * n + '1' + ')' * n, ast.IntegerLiteral, None),
+            ('-' * n + '1', ast.PrefixExpression, 'right'),
+            ('1' + ' + (1' * n + ')' * n, ast.InfixExpression, 'right'),
+            ('[' * n + ']' * n, ast.ArrayLiteral, None),
+            ('if (x) {' * n + '1' + '}' * n, ast.IfExpression, None),
+        ]
+        for source, node_type, child in tests:
+            p = parser.new(lexer.new_regex(source))
+            program = p.parse_program()
+            self.check_parse_errors(p)
+            self.assertEqual(len(program.statements), 1)
+            node = program.statements[0].expression
+            self.assertIsInstance(node, node_type)
+            if child == None:
+                continue
+            depth = 0
+            while isinstance(node, node_type):
+                node = getattr(node, child)
+                depth += 1
+            self.assertEqual(depth, n)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
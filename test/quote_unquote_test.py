@@ -5,6 +5,7 @@ from monkey.object import *
 from monkey import lexer
 from monkey import parser
 from monkey.evaluator import evaluator as e
+from monkey.evaluator import quote_unquote
 
 class TestQuote(unittest.TestCase):
 
@@ -57,6 +58,39 @@ class TestQuote(unittest.TestCase):
             self.assertEqual(quote.node.string(), t[1], 
                 'not equal. got={} want={}'.format(quote.node.string(), t[1]))
 
+    def test_unquote_values(self):
+        tests = [
+            ('quote(unquote("a" + "b"))', 'ab'),
+            ('quote(unquote([1, 2 * 3, [true]]))', '[1, 6, [true]]'),
+            ('quote(unquote({"a": 1, 2: [3]}))', '{a:1, 2:[3]}'),
+            ('let f = fn(x) { quote(unquote(x) + {unquote(x): [unquote(x * 2)]}) }; f(1); f(2)',
+                '(2 + {2:[4]})'),
+            # the spliced key equals the literal one
+            ('let a = 2; let b = 5; quote({unquote(a): 1, 2: unquote(b)})', '{2:1, 2:5}'),
+        ]
+        for source, expected in tests:
+            quote = self.check_eval(source)
+            self.assertTrue(isinstance(quote, Quote),
+                f'expected Quote. got={type(quote)} {quote}')
+            self.assertEqual(quote.node.string(), expected)
+
+    def test_unquote_paths(self):
+        program = parser.new(lexer.new('if (unquote(a)) { [1, unquote(b)] } else { {unquote(c): 2} }')).parse_program()
+        paths = quote_unquote.unquote_paths(program.statements[0].expression)
+        self.assertEqual(paths, [
+            [('condition', None)],
+            [('consequence', None), ('statements', 0), ('expression', None), ('elements', 1)],
+            [('alternative', None), ('statements', 0), ('expression', None), ('pairs', 0)],
+        ])
+        call = parser.new(lexer.new('unquote(a)')).parse_program().statements[0].expression
+        self.assertEqual(quote_unquote.unquote_paths(call), [[]])
+        self.assertFalse(quote_unquote.is_unquote_call(call.function))
+
+    def test_unquote_sites_are_bounded(self):
+        for i in range(quote_unquote.UNQUOTE_SITES_SIZE + 10):
+            self.check_eval(f'quote(unquote({i}))')
+        self.assertEqual(len(quote_unquote.unquote_sites), quote_unquote.UNQUOTE_SITES_SIZE)
+
 if __name__ == '__main__':
     unittest.main()
     
\ No newline at end of file
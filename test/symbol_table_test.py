@@ -32,5 +32,18 @@ class SymbolTableTest(unittest.TestCase):
             self.assertIsNotNone(result, msg=f'name {sym.name} is not resolvable')
             self.assertEqual(result, sym, msg=f'expected {sym.name} to resolve to {sym}, got={result}')
 
+    def test_define_resolve_builtins(self):
+        g = s.new_symbol_table()
+        expected = [
+            s.Symbol(name='a', scope=s.BUILTIN_SCOPE, index=0),
+            s.Symbol(name='c', scope=s.BUILTIN_SCOPE, index=1),
+        ]
+        for i, sym in enumerate(expected):
+            g.define_builtin(i, sym.name)
+        for sym in expected:
+            result = g.resolve(sym.name)
+            self.assertEqual(result, sym, msg=f'expected {sym.name} to resolve to {sym}, got={result}')
+        self.assertEqual(g.define('x').index, 0, msg='builtins should not take global slots')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
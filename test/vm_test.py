@@ -7,9 +7,11 @@ from monkey.lexer import lexer
 from monkey.ast import ast
 from monkey.parser import parser
 from monkey.object import *
+from monkey.object import vector
 from monkey.code import *
 from monkey.compiler import compiler as c
 from monkey.vm import vm as v
+from monkey import repl
 
 VmTestCase = namedtuple('VmTestCase', 'input expected')
 
@@ -93,6 +95,8 @@ class VMTest(unittest.TestCase):
             VmTestCase("if (1 > 2) { 10 }", Null), 
             VmTestCase("if (false) { 10 }", Null),
             VmTestCase("if ((if (false) { 10 })) { 10 } else { 20 }", 20),
+            VmTestCase("if (false) { true } else { false }", False),
+            VmTestCase("if (1 > 2) { true } else { 1; 2; 3; 4; 5; 6; 7; 8; 9; 10; 11; 12; 13; 14; 15; 16; 17; 18; 19; 20; 21; 22; 23; 24; 25; 26; 27; 28; 29; 30; 31; 32; 33; 34; 35; 36; 37; 38; 39; 40; 41; 42; 43; 44; 45; 46; 47; 48; 49; 50; 51; 52; 53; 54; 55; 56; 57; 58; 59; 60; 61; 62; 63; 64; 65; 66; 67; 68; 69; 70 }; 5", 5),
         ]
         self.run_vm_tests(tests)
     
@@ -136,13 +140,250 @@ class VMTest(unittest.TestCase):
             VmTestCase("{1: 1, 2: 2}[2]", 2),
             VmTestCase("{1: 1}[0]", Null),
             VmTestCase("{}[0]", Null),
+            VmTestCase("{0: 5, 1: 6}[2 / 2 - 1]", 5),
         ]
         self.run_vm_tests(tests)
 
+    def test_assign_index_statements(self):
+        tests = [
+            VmTestCase('let a = [1, 2, 3]; a[1] = 5; a[1]', 5),
+            VmTestCase('let a = []; a[0] = 1; a[1] = 2; len(a)', 2),
+            VmTestCase('let a = [[0, 0], [0, 0]]; a[1][0] = 7; a[1][0]', 7),
+            VmTestCase('let h = {"a": 1}; h["a"] = 2; h["b"] = 3; h["a"] + h["b"]', 5),
+            VmTestCase('let h = {}; h[0] = 1; h[1] = 2; h[5] = 3; h[0] + h[1] + h[5]', 6),
+        ]
+        self.run_vm_tests(tests)
+        program = self.parse('let a = [1]; a[2] = 1')
+        comp = self.new_compiler()
+        comp.compile(program)
+        err = v.new(comp.bytecode()).run()
+        self.assertEqual(err, 'index out of range: 2')
+
+    def test_builtin_functions(self):
+        tests = [
+            VmTestCase('len("")', 0),
+            VmTestCase('len("four")', 4),
+            VmTestCase('len([1, 2, 3])', 3),
+            VmTestCase('first([1, 2, 3])', 1),
+            VmTestCase('last([1, 2, 3])', 3),
+            VmTestCase('len(push([], 1))', 1),
+            VmTestCase('has(set([1, 2]), 2)', True),
+            VmTestCase('!has(set([1, 2]), 3)', True),
+            VmTestCase('len(union(set([1, 2]), set([2, 3])))', 3),
+            VmTestCase('has(remove(add(set([]), "a"), "a"), "a")', False),
+            VmTestCase('vsum(vec([1, 2]) * 2)', 6),
+        ]
+        self.run_vm_tests(tests)
+
+    def test_vector_arithmetic(self):
+        tests = [
+            (OpAdd, vector.new_vector([1, 2]), vector.new_vector([10, 20]), [11, 22]),
+            (OpSub, vector.new_vector([10, 20]), vector.new_vector([1, 2]), [9, 18]),
+            (OpMul, vector.new_vector([1, 2]), vector.new_vector([3, 4]), [3, 8]),
+            (OpMul, Integer(3), vector.new_vector([1, 2]), [3, 6]),
+            (OpAdd, vector.new_vector([1, 2]), Integer(1), [2, 3]),
+            # results past int64 are exact with either backend
+            (OpAdd, vector.new_vector([2**63 - 1, 1]), Integer(1), [2**63, 2]),
+            (OpSub, vector.new_vector([-2**63]), Integer(1), [-2**63 - 1]),
+            (OpMul, vector.new_vector([2**62]), vector.new_vector([4]), [2**64]),
+            (OpAdd, vector.new_vector([2**63]), vector.new_vector([1]), [2**63 + 1]),
+            (OpMul, Integer(2**64), vector.new_vector([1, -1]), [2**64, -2**64]),
+        ]
+        for op, left, right, expected in tests:
+            bytecode = c.Bytecode(
+                self.make(OpConstant, 0) + self.make(OpConstant, 1) + self.make(op) + self.make(OpPop),
+                [left, right]
+            )
+            vm = v.new(bytecode)
+            err = vm.run()
+            self.assertIsNone(err, msg=f'vm error: {err}')
+            result = vm.last_popped_stack_element()
+            self.assertTrue(isinstance(result, vector.Vector),
+                msg=f'object is not Vector. got={type(result)} {result}')
+            self.assertEqual(vector.to_list(result), expected)
+        bytecode = c.Bytecode(
+            self.make(OpConstant, 0) + self.make(OpConstant, 1) + self.make(OpAdd) + self.make(OpPop),
+            [vector.new_vector([1, 2]), vector.new_vector([1])]
+        )
+        err = v.new(bytecode).run()
+        self.assertEqual(err, 'vector length mismatch: 2 and 1')
+        big = vector.new_vector([2**63 - 1, 2**63 - 1])
+        self.assertEqual(vector.total(big), 2**64 - 2)
+        self.assertEqual(vector.dot(big, big), (2 * (2**63 - 1)**2, None))
+
+    def test_quote_unquote(self):
+        tests = [
+            ('quote(5 + x)', '(5 + x)'),
+            ('quote(unquote(4 + 4) + 8)', '(8 + 8)'),
+            ('let q = quote(a * b); quote(unquote(q) - unquote("s" + "t"))', '((a * b) - st)'),
+            ('quote([unquote([1, true]), unquote({"k": 2})])', '[[1, true], {k:2}]'),
+        ]
+        for source, expected in tests:
+            comp = self.new_compiler()
+            err = comp.compile(self.parse(source))
+            self.assertIsNone(err, msg=f'compiler error: {err}')
+            vm = v.new(comp.bytecode())
+            err = vm.run()
+            self.assertIsNone(err, msg=f'vm error: {err}')
+            result = vm.last_popped_stack_element()
+            self.assertTrue(isinstance(result, Quote), msg=f'object is not Quote. got={type(result)}')
+            self.assertEqual(result.node.string(), expected)
+
+    def test_top_level_return(self):
+        self.run_vm_tests([VmTestCase('1; return 2; 3', 2)])
+
+    def test_extended_operands(self):
+        constants = [Integer(i) for i in range(300)]
+        bytecode = c.Bytecode(
+            self.make(OpConstant, 299) + self.make(OpSetGlobal, 70000) + self.make(OpGetGlobal, 70000) + self.make(OpPop),
+            constants
+        )
+        vm = v.new(bytecode)
+        err = vm.run()
+        self.assertIsNone(err, msg=f'vm error: {err}')
+        self.check_expected_object(299, vm.last_popped_stack_element())
+        self.assertGreater(len(vm.global_vars), 70000)
+
+    def test_large_programs(self):
+        elements = ', '.join(str(i) for i in range(70000))
+        self.run_vm_tests([
+            VmTestCase(f'let a = [{elements}]; len(a) + a[69999]', 139999),
+        ])
+
+    def test_quickening(self):
+        tests = [
+            (OpAdd, (Integer(1), Integer(2)), 'OpAddInt', 3, (String('a'), String('b')), 'ab'),
+            (OpAdd, (String('a'), String('b')), 'OpAddStr', 'ab', (Integer(1), Integer(2)), 3),
+            (OpGreaterThan, (Integer(2), Integer(1)), 'OpGreaterThanInt', True, (Integer(3), TRUE), True),
+            (OpIndex, (Array([Integer(7)]), Integer(0)), 'OpIndexArrayInt', 7,
+                (new_hash([Integer(0)], [Integer(5)]), Integer(0)), 5),
+            (OpIndex, (new_hash([String('k')], [Integer(4)]), String('k')), 'OpIndexHashStr', 4,
+                (Array([Integer(9)]), Integer(0)), 9),
+        ]
+        for op, operands, specialized, expected, other_operands, other_expected in tests:
+            instructions = (self.make(OpGetGlobal, 0) + self.make(OpGetGlobal, 1) +
+                self.make(op) + self.make(OpPop))
+            bytecode = c.Bytecode(instructions, [])
+            # the first run is not counted
+            for i in range(1 + v.QUICKEN_AFTER):
+                vm = v.new_with_global_store(bytecode, list(operands))
+                self.assertIsNone(vm.run())
+                self.check_expected_object(expected, vm.last_popped_stack_element())
+            self.assertEqual(vm.specializations, {specialized: 1})
+            self.assertEqual(bytecode.sites.runs, 1 + v.QUICKEN_AFTER)
+            self.assertIn(specialized, str(Instructions(instructions)))
+            vm = v.new_with_global_store(bytecode, list(operands))
+            self.assertIsNone(vm.run())
+            self.check_expected_object(expected, vm.last_popped_stack_element())
+            # a guard failure goes back to the generic instruction
+            vm = v.new_with_global_store(bytecode, list(other_operands))
+            self.assertIsNone(vm.run())
+            self.check_expected_object(other_expected, vm.last_popped_stack_element())
+            self.assertEqual(vm.deoptimizations, {specialized: 1})
+            self.assertNotIn(specialized, str(Instructions(instructions)))
+
+    def test_inline_caches(self):
+        # the HashKey of each key is built on the first run only
+        source = 'let g = {"a": 1, 2: 3}; let k = "a"; g["a"] + g[2] + g[k] + g[k]'
+        comp = c.new(superinstructions=True)
+        err = comp.compile(self.parse(source))
+        self.assertIsNone(err, msg=f'compiler error: {err}')
+        bytecode = comp.bytecode()
+        for hits, misses in [(0, 4), (4, 0)]:
+            vm = v.new(bytecode)
+            self.assertIsNone(vm.run())
+            self.check_expected_object(6, vm.last_popped_stack_element())
+            self.assertEqual((vm.cache_hits, vm.cache_misses), (hits, misses))
+        # a key equal to the cached one hits, and a different one misses
+        bytecode = c.Bytecode(self.make(OpGetGlobal, 0) + self.make(OpGetGlobal, 1) +
+            self.make(OpIndex) + self.make(OpPop), [])
+        h = new_hash([String('a'), Integer(2)], [Integer(1), Integer(3)])
+        hits = []
+        for key, expected in [(String('a'), 1), (String('a'), 1), (Integer(2), 3), (String('b'), None)]:
+            vm = v.new_with_global_store(bytecode, [h, key])
+            vm.quicken = False
+            self.assertIsNone(vm.run())
+            if expected == None:
+                self.assertIs(vm.last_popped_stack_element(), v.NULL)
+            else:
+                self.check_expected_object(expected, vm.last_popped_stack_element())
+            hits.append(vm.cache_hits)
+        self.assertEqual(hits, [0, 1, 0, 0])
+        # hashes with shapes do not use the cache
+        comp = c.new(superinstructions=True)
+        comp.compile(self.parse('let h = {"a": 1}; h["a"]'))
+        vm = v.new(comp.bytecode())
+        self.assertIsNone(vm.run())
+        self.assertEqual((vm.cache_hits, vm.cache_misses), (0, 0))
+        # the slots are kept on the Bytecode, which only gets them when needed
+        bytecode = comp.bytecode()
+        vm = v.new(bytecode)
+        vm.quicken = False
+        vm.inline_caches = False
+        self.assertIsNone(vm.run())
+        self.assertIsNone(bytecode.sites)
+        self.assertIsNone(v.new(bytecode).run())
+        self.assertIsInstance(bytecode.sites, v.Sites)
+        # nothing is counted for quickening on a first run
+        self.assertIsNone(bytecode.sites.counts)
+
+    def test_unboxed_integers(self):
+        # ints on the stack and in globals, Integers once handed out
+        comp = self.new_compiler()
+        comp.compile(self.parse('let a = 2; let b = [a + 1, len("ab")]; let h = {a: a}; -a * 3'))
+        vm = v.new(comp.bytecode())
+        self.assertIsNone(vm.run())
+        self.assertIs(type(vm.global_vars[0]), int)
+        self.assertEqual([type(e) for e in vm.global_vars[1].elements], [Integer, Integer])
+        self.assertEqual([(type(k), type(v)) for k, v in vm.global_vars[2].items()], [(Integer, Integer)])
+        self.check_expected_object(-6, vm.last_popped_stack_element())
+        # divisions give floats, which stay boxed
+        tests = [
+            VmTestCase("1 == true", True),
+            VmTestCase("!0", False),
+            VmTestCase("let a = [1]; a[0] + a[0]", 2),
+            VmTestCase('let h = {1: 2}; h[1] * h[1]', 4),
+            VmTestCase("7 / 2 > 3", True),
+        ]
+        self.run_vm_tests(tests)
+        comp = self.new_compiler()
+        comp.compile(self.parse('let d = 7 / 2; d + 1'))
+        vm = v.new(comp.bytecode())
+        self.assertIsNone(vm.run())
+        self.assertEqual(vm.last_popped_stack_element().value, 4.5)
+        # ints are reported as Integers in errors
+        errors = [
+            ('1(2)', 'calling non-builtin: INTEGER'),
+            ('5[0]', 'index operator not supported: INTEGER'),
+            ('let x = 3; x[1]', 'index operator not supported: INTEGER'),
+            ('let a = 1; a[0] = 2', 'index assignment not supported: INTEGER'),
+            ('-"a"', 'unsupported type for negation: STRING'),
+            ('1 + "a"', 'unsupported types for binary operation: INTEGER STRING'),
+        ]
+        for source, expected in errors:
+            comp = self.new_compiler()
+            err = comp.compile(self.parse(source))
+            self.assertIsNone(err, msg=f'compiler error: {err}')
+            self.assertEqual(v.new(comp.bytecode()).run(), expected)
+        # macro expansion can put a float in an Integer constant
+        session = repl.Session(interpreter=False)
+        for source in ['let m = macro() { quote(unquote(5 / 2)) };', 'let r = m();']:
+            _, err = session.run(self.parse(source))
+            self.assertIsNone(err)
+        result, err = session.run(self.parse('r + 1'))
+        self.assertIsNone(err)
+        self.assertEqual(result.value, 3.5)
+
+    def new_compiler(self):
+        return c.new()
+
+    def make(self, op, *operands):
+        return Make(op, *operands)
+
     def run_vm_tests(self, tests):
         for t in tests:
             program = self.parse(t.input)
-            comp = c.new()
+            comp = self.new_compiler()
             err = comp.compile(program)
             self.assertIsNone(err, msg=f'compiler error: {err}')
             vm = v.new(comp.bytecode())
@@ -206,6 +447,25 @@ class VMTest(unittest.TestCase):
         p = parser.new(l)
         program = p.parse_program()
         return program
-   
+
+class WordcodeVMTest(VMTest):
+    """
+    Runs every VM test again on wordcode instructions
+    """
+
+    def new_compiler(self):
+        return c.new(wordcode=True)
+
+    def make(self, op, *operands):
+        return Make(op, *operands, wordcode=True)
+
+class SuperinstructionVMTest(VMTest):
+    """
+    Runs every VM test again with the superinstruction pass
+    """
+
+    def new_compiler(self):
+        return c.new(superinstructions=True)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file